@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Asset Audit for The Anchor Pub
+Finds images in content/blog and public/images that nothing references, and
+ones heavier than the per-image target, ranked by bytes. References come from
+the blog markdown and front matter, content/ data files and the app/,
+components/ and lib/ sources. Orphans can be pruned or moved aside
+"""
+
+import argparse
+import os
+import re
+import shutil
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from bundle_budget import ASSET_REFERENCE, IMAGE_FILES, ROUTE_PREFIX, megabytes, scan_tree
+from image_derivatives import TARGET_BYTES
+from repo_paths import ROOT_DIR
+
+# Folders whose files are served, and the URL prefix each is served under
+ASSET_DIRS = {
+    os.path.join("content", "blog"): ROUTE_PREFIX,
+    os.path.join("public", "images"): "/images/",
+}
+
+# Site sources that may name an asset, and the file types worth reading in each
+SOURCE_DIRS = {
+    "app": (".ts", ".tsx", ".js", ".jsx", ".mdx", ".css"),
+    "components": (".ts", ".tsx", ".js", ".jsx", ".mdx", ".css"),
+    "lib": (".ts", ".tsx", ".js", ".jsx"),
+    "content": (".md", ".mdx", ".json", ".yaml", ".yml"),
+}
+
+# /images/... paths in code, including ones built at runtime: a template literal
+# (`/images/x/${folder}/...`) or a bare folder ('public/images/page-headers')
+# that lib/ lists with readdirSync. Both make everything below them reachable
+IMAGE_PATH = re.compile(r"(?:public)?/images/[^'\"`\s)<>\[\]]*")
+
+# kind is one of: file, prefix
+Reference = namedtuple("Reference", "kind path source")
+
+# status is one of: orphan, oversized, ok
+Audited = namedtuple("Audited", "path size status")
+
+
+def _source_files(root):
+    """Every file under the SOURCE_DIRS that could mention an asset"""
+    files = []
+    for name, extensions in SOURCE_DIRS.items():
+        for path, _ in scan_tree(os.path.join(root, name)) if os.path.isdir(os.path.join(root, name)) else ():
+            if path.endswith(extensions):
+                files.append(path)
+    files.sort()
+    return files
+
+
+def _resolve(ref, root, base_dir):
+    """Absolute file path a reference points at, or None when it is off-site or unresolvable"""
+    ref = unquote(ref.split("://", 1)[-1].split("?", 1)[0].split("#", 1)[0])
+    for folder, prefix in ASSET_DIRS.items():
+        if prefix in ref:
+            return os.path.normpath(os.path.join(root, folder, ref.split(prefix, 1)[1]))
+        if ("public/" + prefix.strip("/")) in ref:
+            rest = ref.split("public/" + prefix.strip("/"), 1)[1].lstrip("/")
+            return os.path.normpath(os.path.join(root, folder, rest))
+    if ref.startswith("/") or base_dir is None or "." not in os.path.basename(ref):
+        return None
+    return os.path.normpath(os.path.join(base_dir, ref))
+
+
+def references_in(path, root):
+    """References made by one source file: exact files and runtime-built folder prefixes"""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    # Relative paths only mean something next to a post's markdown
+    base_dir = os.path.dirname(path) if path.endswith((".md", ".mdx")) else None
+    found = []
+    for ref in ASSET_REFERENCE.findall(text):
+        target = _resolve(ref, root, base_dir)
+        if target is not None:
+            found.append(Reference("file", target, path))
+    for ref in IMAGE_PATH.findall(text):
+        dynamic = "${" in ref
+        ref = ref.split("${", 1)[0]
+        if not dynamic and ref.lower().endswith(IMAGE_FILES):
+            continue
+        target = _resolve(ref if dynamic else ref.rstrip("/") + "/", root, None)
+        if target is None:
+            continue
+        # `/images/a/b-${x}.jpg` reaches everything in /images/a, not just /images/a/b-*
+        if dynamic and not ref.endswith("/"):
+            target = os.path.dirname(target)
+        found.append(Reference("prefix", target, path))
+    return found
+
+
+def collect_references(root=ROOT_DIR, workers=None):
+    """(referenced files, reachable folder prefixes) across every source"""
+    files = set()
+    prefixes = set()
+    sources = _source_files(root)
+    with ThreadPoolExecutor(workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        for refs in pool.map(lambda p: references_in(p, root), sources):
+            for ref in refs:
+                (files if ref.kind == "file" else prefixes).add(ref.path)
+    return files, prefixes
+
+
+def audit(root=ROOT_DIR, oversized=TARGET_BYTES, workers=None):
+    """Every image under the asset folders, with its status, biggest first"""
+    files, prefixes = collect_references(root, workers)
+    prefixes = tuple(sorted(p.rstrip(os.sep) + os.sep for p in prefixes))
+    results = []
+    for folder in ASSET_DIRS:
+        directory = os.path.join(root, folder)
+        if not os.path.isdir(directory):
+            continue
+        for path, size in scan_tree(directory):
+            if not path.lower().endswith(IMAGE_FILES):
+                continue
+            path = os.path.normpath(path)
+            if path not in files and not path.startswith(prefixes):
+                status = "orphan"
+            elif size > oversized:
+                status = "oversized"
+            else:
+                status = "ok"
+            results.append(Audited(path, size, status))
+    results.sort(key=lambda a: (-a.size, a.path))
+    return results
+
+
+def remove_orphans(orphans, root, move_to=None):
+    """Delete orphans, or move them under move_to keeping their paths; returns bytes freed"""
+    freed = 0
+    for asset in orphans:
+        if move_to:
+            dest = os.path.join(move_to, os.path.relpath(asset.path, root))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.move(asset.path, dest)
+        else:
+            os.remove(asset.path)
+        freed += asset.size
+    return freed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report unreferenced and oversized images")
+    parser.add_argument("--root", default=ROOT_DIR, help="repository root (default: this checkout)")
+    parser.add_argument("--max-kb", type=int, default=TARGET_BYTES // 1024,
+                        help=f"flag referenced images bigger than this (default {TARGET_BYTES // 1024})")
+    parser.add_argument("--top", type=int, default=20, help="how many of each kind to list (0 for all)")
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument("--prune", action="store_true", help="delete unreferenced images")
+    action.add_argument("--move-to", metavar="DIR", help="move unreferenced images here instead of deleting")
+    parser.add_argument("--workers", type=int, help="reader threads (default: 4 per core)")
+    args = parser.parse_args(argv)
+
+    root = os.path.abspath(args.root)
+    results = audit(root, args.max_kb * 1024, args.workers)
+    orphans = [a for a in results if a.status == "orphan"]
+    heavy = [a for a in results if a.status == "oversized"]
+    limit = args.top or None
+
+    print(f"🔍 {len(results)} images, {megabytes(sum(a.size for a in results))}")
+    print(f"\n⚠️ {len(orphans)} unreferenced ({megabytes(sum(a.size for a in orphans))}):")
+    for asset in orphans[:limit]:
+        print(f"  {megabytes(asset.size):>9}  {os.path.relpath(asset.path, root)}")
+    print(f"\n⚠️ {len(heavy)} referenced but over {args.max_kb} KB ({megabytes(sum(a.size for a in heavy))}):")
+    for asset in heavy[:limit]:
+        print(f"  {megabytes(asset.size):>9}  {os.path.relpath(asset.path, root)}")
+    if heavy:
+        print("  Run image_derivatives.py on these to get them under budget")
+
+    if args.prune or args.move_to:
+        freed = remove_orphans(orphans, root, args.move_to)
+        verb = f"Moved to {args.move_to}" if args.move_to else "Deleted"
+        print(f"\n🗑 {verb}: {len(orphans)} files, {megabytes(freed)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for The Anchor Pub tooling
+Generates synthetic fixtures (redirect sets in the config/redirects and
+content/blog formats, and image trees named the way the renamers expect),
+runs the redirect checker and the image renamer against them in fresh
+processes, and records wall time, peak memory and syscall counts. Results
+are compared with a saved baseline so regressions show up as numbers
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import namedtuple
+
+from check_redirects import EXTRA_REDIRECT_FILES, REDIRECT_FILES, ROOT_DIR
+
+UTILS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+BASELINE_PATH = os.path.join(UTILS_DIR, "benchmark-baseline.json")
+
+REDIRECT_SIZES = (1000, 10000, 100000)
+IMAGE_SIZES = (1000, 5000)
+
+# A workload is a regression when it gets this much slower or bigger than the baseline
+DEFAULT_TOLERANCE = 0.25
+
+# Synthetic photos: a JPEG signature followed by noise, so hashing and copying
+# see realistic bytes without the fixture costing gigabytes
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+IMAGE_BYTES = (4 * 1024, 48 * 1024)
+
+# Share of identical files in an image fixture (re-exported photos)
+DUPLICATE_SHARE = 0.05
+
+# Runs a script in this process and leaves its resource use in a JSON file.
+# Peak RSS is the larger of this process's peak and that of its largest reaped
+# child: RUSAGE_CHILDREN.ru_maxrss is a per-process maximum, not a sum, so the
+# combined footprint of a worker pool is not measured
+RUNNER = """
+import json, os, resource, runpy, sys
+stats_path, script = sys.argv[1], sys.argv[2]
+sys.argv = sys.argv[2:]
+sys.path.insert(0, os.path.dirname(script))
+code = 0
+try:
+    runpy.run_path(script, run_name="__main__")
+except SystemExit as exit:
+    code = exit.code if isinstance(exit.code, int) else (0 if exit.code is None else 1)
+except BaseException:
+    import traceback
+    traceback.print_exc()
+    code = 1
+finally:
+    io = {}
+    try:
+        with open("/proc/self/io") as f:
+            io = dict(line.split(": ") for line in f.read().splitlines())
+    except OSError:
+        pass
+    rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    with open(stats_path, "w") as f:
+        json.dump({"rss_kb": rss, "syscr": int(io.get("syscr", 0)), "syscw": int(io.get("syscw", 0)),
+                   "exit": code}, f)
+os._exit(code)
+"""
+
+# name, script, args(fixture, scratch), setup(fixture, scratch) run before each repeat
+Workload = namedtuple("Workload", "name script args setup")
+
+# syscalls is the strace total when strace is installed, otherwise None;
+# io_syscalls counts the main process's read and write calls from /proc;
+# rss_mb is the peak of the main process or its largest single child;
+# exit_code is the first non-zero exit over the repeats, or 0
+Result = namedtuple("Result", "name wall_s rss_mb syscalls io_syscalls exit_code")
+
+
+def _slug(rng, words=3):
+    vocabulary = ("anchor", "quiz", "night", "drag", "bingo", "tequila", "sunday", "roast", "garden",
+                  "heathrow", "stanwell", "moor", "pizza", "party", "christmas", "music", "live", "beer")
+    return "-".join(rng.choice(vocabulary) for _ in range(words))
+
+
+def redirect_rules(count, seed=1):
+    """count synthetic rules shaped like ours: mostly literal blog moves, some chains and :slug/:path* patterns"""
+    rng = random.Random(seed)
+    rules = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.03:
+            rules.append({"source": f"/category-{i}/:slug", "destination": "/blog/:slug", "permanent": True})
+        elif roll < 0.05:
+            rules.append({"source": f"/archive-{i}/:path*", "destination": "/blog", "permanent": True})
+        elif roll < 0.10 and rules:
+            # A chain: point at a source that itself redirects
+            target = rng.choice(rules)["source"]
+            if ":" not in target:
+                rules.append({"source": f"/blog/{_slug(rng)}-{i}", "destination": target, "permanent": True})
+                continue
+            rules.append({"source": f"/blog/{_slug(rng)}-{i}", "destination": "/blog", "permanent": True})
+        elif roll < 0.20:
+            rules.append({"source": f"/drinks/{_slug(rng, 2)}-{i}", "destination": "/drinks", "permanent": False})
+        elif roll < 0.25:
+            rules.append({"source": f"/event-details/{_slug(rng)}-{i}", "destination": "/whats-on",
+                          "statusCode": 301})
+        else:
+            rules.append({"source": f"/blog/{_slug(rng)}-{i}", "destination": f"/blog/post-{i}",
+                          "permanent": True})
+    return rules
+
+
+def write_redirect_fixture(root, count, seed=1):
+    """A repository skeleton holding count rules across the served files and content/blog/redirects.json"""
+    rules = redirect_rules(count, seed)
+    os.makedirs(root, exist_ok=True)
+    # The tracking parameters the middleware strips are read from the real one
+    shutil.copyfile(os.path.join(ROOT_DIR, "middleware.ts"), os.path.join(root, "middleware.ts"))
+    # One rule in twenty lives in the unserved blog file, the rest are spread over the served ones
+    extra = rules[::20]
+    served = [rule for i, rule in enumerate(rules) if i % 20]
+    share = -(-len(served) // len(REDIRECT_FILES))
+    for n, file in enumerate(REDIRECT_FILES):
+        path = os.path.join(root, file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(served[n * share:(n + 1) * share], f, indent=2)
+    for file in EXTRA_REDIRECT_FILES:
+        path = os.path.join(root, file)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"redirects": extra}, f, indent=2)
+    return root
+
+
+def write_image_fixture(root, count, seed=1):
+    """assets/images with count photos named like real exports: numbered shoots and iPhone UUIDs"""
+    rng = random.Random(seed)
+    base = os.path.join(root, "assets", "images")
+    folders = {name: os.path.join(base, name) for name in ("events", "food", "venue", "garden")}
+    for folder in folders.values():
+        os.makedirs(folder, exist_ok=True)
+
+    written = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.25:
+            folder, name = "events", f"Nikki Manfadge - {i:02d}.jpg"
+        elif roll < 0.45:
+            folder, name = "events", f"Tequila Tasting Night - {i:02d}.jpg"
+        elif roll < 0.75:
+            folder, name = "events", f"{str(uuid.UUID(int=rng.getrandbits(128))).upper()}.jpg"
+        elif roll < 0.90:
+            folder, name = "food", f"{str(uuid.UUID(int=rng.getrandbits(128))).upper()}_1_105_c.jpeg"
+        elif roll < 0.97:
+            folder, name = "venue", f"IMG_{i:04d}.jpg"
+        else:
+            folder, name = "garden", f"garden-{i}.jpg"
+        path = os.path.join(folders[folder], name)
+        if written and rng.random() < DUPLICATE_SHARE:
+            shutil.copyfile(rng.choice(written), path)
+        else:
+            with open(path, "wb") as f:
+                f.write(JPEG_HEADER + rng.randbytes(rng.randint(*IMAGE_BYTES)))
+        written.append(path)
+    return base
+
+
+def _fresh(path):
+    def setup(fixture, scratch):
+        shutil.rmtree(os.path.join(scratch, path), ignore_errors=True)
+    return setup
+
+
+def workloads(redirect_sizes=REDIRECT_SIZES, image_sizes=IMAGE_SIZES):
+    """Every (fixture kind, size, Workload) to run"""
+    found = []
+    for size in redirect_sizes:
+        found.append(("redirects", size, Workload(
+            f"redirects-check-{size}", "check_redirects.py",
+            lambda fixture, scratch: ["--root", fixture], None)))
+        found.append(("redirects", size, Workload(
+            f"redirects-compile-{size}", "check_redirects.py",
+            lambda fixture, scratch: ["--root", fixture, "--compile", os.path.join(scratch, "compiled.json"),
+                                      "--max-kb", "1000000"], None)))
+    for size in image_sizes:
+        args = lambda fixture, scratch: ["--source", fixture, "--dest", os.path.join(scratch, "renamed"),
+                                         "--mode", "copy"]
+        found.append(("images", size, Workload(f"images-ingest-{size}", "rename-all-images.py", args,
+                                               _fresh("renamed"))))
+        # Straight after a full run, so every file is a manifest hit
+        found.append(("images", size, Workload(f"images-rerun-{size}", "rename-all-images.py", args, None)))
+    return found
+
+
+def _strace_total(path):
+    """Total calls from an strace -c summary"""
+    with open(path) as f:
+        for line in f:
+            parts = line.split()
+            if parts and parts[-1] == "total":
+                return int(parts[3])
+    return None
+
+
+def run_once(workload, fixture, scratch, strace=None):
+    """(wall seconds, stats dict) for one run of a workload in a fresh interpreter"""
+    stats_path = os.path.join(scratch, "stats.json")
+    command = [sys.executable, "-c", RUNNER, stats_path, os.path.join(UTILS_DIR, workload.script)]
+    command += workload.args(fixture, scratch)
+    if strace:
+        command = [strace, "-f", "-c", "-q", "-o", os.path.join(scratch, "strace.txt")] + command
+    started = time.perf_counter()
+    subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=scratch, check=False)
+    wall = time.perf_counter() - started
+    with open(stats_path) as f:
+        stats = json.load(f)
+    if strace:
+        stats["syscalls"] = _strace_total(os.path.join(scratch, "strace.txt"))
+    return wall, stats
+
+
+def measure(workload, fixture, scratch, repeat=3):
+    """Result for a workload: median wall time and the largest peak RSS over repeat runs"""
+    walls = []
+    peaks = []
+    exit_code = 0
+    for _ in range(repeat):
+        if workload.setup:
+            workload.setup(fixture, scratch)
+        wall, stats = run_once(workload, fixture, scratch)
+        walls.append(wall)
+        peaks.append(stats["rss_kb"])
+        exit_code = exit_code or stats["exit"]
+    # Syscalls are counted in a separate run: strace slows everything it watches
+    syscalls = None
+    strace = shutil.which("strace")
+    if strace:
+        if workload.setup:
+            workload.setup(fixture, scratch)
+        _, traced = run_once(workload, fixture, scratch, strace)
+        syscalls = traced.get("syscalls")
+    return Result(workload.name, round(statistics.median(walls), 4), round(max(peaks) / 1024, 1), syscalls,
+                  stats["syscr"] + stats["syscw"], exit_code)
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)["results"]
+    except (FileNotFoundError, ValueError, KeyError):
+        return {}
+
+
+def save_baseline(results, path=BASELINE_PATH):
+    data = {
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "results": {r.name: r._asdict() for r in results},
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+
+
+def failures(results):
+    """Results whose workload exited non-zero: their figures measure a crash, not the work"""
+    return [result for result in results if result.exit_code]
+
+
+def regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """(name, measure, before, after) for every figure that grew by more than tolerance"""
+    found = []
+    for result in results:
+        before = baseline.get(result.name)
+        if not before:
+            continue
+        for field in ("wall_s", "rss_mb", "syscalls", "io_syscalls"):
+            old, new = before.get(field), getattr(result, field)
+            if old and new is not None and new > old * (1 + tolerance):
+                found.append((result.name, field, old, new))
+    return found
+
+
+def _change(new, old):
+    if not old or new is None:
+        return ""
+    return f"{(new - old) / old * 100:+.0f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the redirect and image tools on synthetic fixtures")
+    parser.add_argument("--redirects", default=",".join(map(str, REDIRECT_SIZES)),
+                        help="comma-separated rule counts ('' to skip)")
+    parser.add_argument("--images", default=",".join(map(str, IMAGE_SIZES)),
+                        help="comma-separated image counts ('' to skip)")
+    parser.add_argument("--only", help="run only workloads whose name contains this")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per workload (median wall time is kept)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline file to compare with")
+    parser.add_argument("--save", action="store_true", help="write these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"allowed growth before a regression is reported (default {DEFAULT_TOLERANCE})")
+    parser.add_argument("--keep", metavar="DIR", help="build fixtures here and keep them (default: a temp folder)")
+    args = parser.parse_args(argv)
+
+    sizes = lambda text: tuple(int(n) for n in text.split(",") if n)
+    work = [w for w in workloads(sizes(args.redirects), sizes(args.images))
+            if not args.only or args.only in w[2].name]
+    workdir = args.keep or tempfile.mkdtemp(prefix="anchor-bench-")
+    baseline = load_baseline(args.baseline)
+    if not shutil.which("strace"):
+        print("⚠️ strace not found: only read/write syscalls of the main process are counted")
+
+    results = []
+    fixtures = {}
+    try:
+        for kind, size, workload in work:
+            fixture = fixtures.get((kind, size))
+            if fixture is None:
+                root = os.path.join(workdir, f"{kind}-{size}")
+                if not os.path.exists(root):
+                    print(f"📦 Generating {kind} fixture with {size} entries...")
+                    (write_redirect_fixture if kind == "redirects" else write_image_fixture)(root, size)
+                fixture = fixtures[(kind, size)] = (
+                    root if kind == "redirects" else os.path.join(root, "assets", "images"))
+            scratch = os.path.join(workdir, "scratch", f"{kind}-{size}")
+            os.makedirs(scratch, exist_ok=True)
+            result = measure(workload, fixture, scratch, args.repeat)
+            results.append(result)
+            before = baseline.get(result.name, {})
+            syscalls = result.syscalls if result.syscalls is not None else result.io_syscalls
+            print(f"  {result.name:<26} {result.wall_s:>8.3f}s {_change(result.wall_s, before.get('wall_s')):>5}"
+                  f"  {result.rss_mb:>7.1f} MB {_change(result.rss_mb, before.get('rss_mb')):>5}"
+                  f"  {syscalls:>9} syscalls"
+                  + (f"  (exit {result.exit_code})" if result.exit_code else ""))
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    failed = failures(results)
+    for result in failed:
+        print(f"❌ {result.name}: exited with {result.exit_code}")
+    if args.save:
+        if failed:
+            print(f"\nNot saving a baseline with {len(failed)} failed workloads")
+            return 1
+        save_baseline(results, args.baseline)
+        print(f"\n📄 Baseline saved to {args.baseline}")
+        return 0
+    # A crash finishes early, so only workloads that succeeded are compared
+    slower = regressions([r for r in results if not r.exit_code], baseline, args.tolerance)
+    for name, field, old, new in slower:
+        print(f"❌ {name}: {field} {old} → {new}")
+    if not baseline:
+        print("\nNo baseline yet; run with --save to record one")
+    elif not slower and not failed:
+        print(f"\n✓ No regressions beyond {args.tolerance:.0%}")
+    return 1 if slower or failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Blog Image Manifest for The Anchor Pub
+Builds AVIF/WebP derivatives at each responsive width for every image a blog
+post references, and writes content/blog-images.json: for each image its
+intrinsic size, a tiny inline placeholder and the variants, ready to become
+<img width height srcset>. Images whose content hash hasn't changed are
+skipped, and variants of images no post uses any more are removed
+
+Requires Pillow: pip install pillow
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from bundle_budget import BLOG_DIR, ROUTE_PREFIX, referenced_assets
+from image_derivatives import (
+    TARGET_BYTES, WIDTHS, _require_pillow, available_formats, derive, stem_clashes
+)
+from image_ingest import file_digest
+from repo_paths import ROOT_DIR
+
+MANIFEST_PATH = os.path.join(ROOT_DIR, "content", "blog-images.json")
+
+# Source sizes, mtimes and hashes live next to the manifest, like the blog index cache
+CACHE_NAME = ".blog-images-cache.sqlite"
+
+# Served as static files from the CDN, outside the blog function's bundle
+OUTPUT_DIR = os.path.join(ROOT_DIR, "public", "images", "blog")
+OUTPUT_PREFIX = "/images/blog/"
+
+# Bump when the manifest's shape changes; every image is rebuilt
+MANIFEST_VERSION = 1
+
+# Browsers that take neither fall back to the original in src
+FORMATS = ("avif", "webp")
+
+# Placeholder: a blurred thumbnail this wide, inlined as a data URI
+PLACEHOLDER_WIDTH = 16
+PLACEHOLDER_QUALITY = 30
+
+
+def placeholder(source):
+    """(width, height, data URI) for an image, upright, read at reduced size where the format allows"""
+    Image, ImageOps, _ = _require_pillow()
+    with Image.open(source) as opened:
+        width, height = opened.size
+        # Orientations 5-8 are quarter turns, which swap the sides
+        if opened.getexif().get(0x0112, 1) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEG can decode straight to a fraction of full size
+        opened.draft("RGB", (PLACEHOLDER_WIDTH * 8, PLACEHOLDER_WIDTH * 8))
+        image = ImageOps.exif_transpose(opened).convert("RGB")
+    image.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 4), Image.Resampling.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, "WEBP", quality=PLACEHOLDER_QUALITY)
+    return width, height, "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def site_path(path, blog_dir=BLOG_DIR):
+    return ROUTE_PREFIX + os.path.relpath(path, blog_dir).replace(os.sep, "/")
+
+
+def build_entry(source, digest, blog_dir, out_root, formats, widths=WIDTHS, target=TARGET_BYTES):
+    """Manifest entry for one image, writing its derivatives; None if Pillow can't decode it"""
+    relative = os.path.relpath(os.path.dirname(source), blog_dir)
+    out_dir = os.path.join(out_root, relative)
+    Image, _, _ = _require_pillow()
+    try:
+        width, height, data_uri = placeholder(source)
+    except (OSError, Image.DecompressionBombError):
+        return None
+    derivatives = derive(source, out_dir, widths, formats, target=target)
+    if not derivatives:
+        return None
+
+    variants = []
+    srcset = {}
+    for result in sorted(derivatives, key=lambda d: (FORMATS.index(d.format), d.width)):
+        src = OUTPUT_PREFIX + os.path.relpath(result.path, out_root).replace(os.sep, "/")
+        variants.append({
+            "src": src,
+            "format": result.format,
+            "width": result.width,
+            "height": round(height * result.width / width),
+            "bytes": result.size,
+        })
+        srcset.setdefault(result.format, []).append(f"{src} {result.width}w")
+    return {
+        "hash": digest,
+        "width": width,
+        "height": height,
+        "bytes": os.path.getsize(source),
+        "placeholder": data_uri,
+        "variants": variants,
+        "srcset": {fmt: ", ".join(items) for fmt, items in srcset.items()},
+    }
+
+
+class DigestCache:
+    """Content hashes from the last run, reused while a source's size and mtime are unchanged"""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sources (source TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)"
+        )
+        self.rows = {row[0]: row for row in self.db.execute("SELECT source, size, mtime_ns, digest FROM sources")}
+        self.used = {}
+
+    def digest(self, source):
+        st = os.stat(source)
+        row = self.rows.get(source)
+        if row and row[1] == st.st_size and row[2] == st.st_mtime_ns:
+            digest = row[3]
+        else:
+            digest = file_digest(source)
+        self.used[source] = (source, st.st_size, st.st_mtime_ns, digest)
+        return digest
+
+    def save(self):
+        """Keep only the sources looked up this run"""
+        with self.db:
+            self.db.execute("DELETE FROM sources")
+            self.db.executemany("INSERT INTO sources VALUES (?, ?, ?, ?)", self.used.values())
+
+    def close(self):
+        self.db.close()
+
+
+def _build(task):
+    return task[0], build_entry(*task)
+
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return manifest.get("images", {}) if manifest.get("version") == MANIFEST_VERSION else {}
+
+
+def _variant_path(variant, out_root):
+    return os.path.join(out_root, variant["src"][len(OUTPUT_PREFIX):])
+
+
+def prune_variants(previous, images, out_root):
+    """Delete files of previous variants that no image in the new manifest uses; returns how many"""
+    out_root = os.path.normpath(out_root)
+    kept = {_variant_path(v, out_root) for entry in images.values() for v in entry["variants"]}
+    removed = 0
+    for entry in previous.values():
+        for variant in entry.get("variants", ()):
+            path = _variant_path(variant, out_root)
+            if path in kept or not os.path.exists(path):
+                continue
+            os.unlink(path)
+            removed += 1
+            # Drop the post's folder too once nothing is left in it
+            folder = os.path.dirname(path)
+            while folder != out_root and os.path.isdir(folder) and not os.listdir(folder):
+                os.rmdir(folder)
+                folder = os.path.dirname(folder)
+    return removed
+
+
+def _current(entry, digest, out_root):
+    """True when a previous entry still describes this content and its files are all there"""
+    return entry is not None and entry.get("hash") == digest and all(
+        os.path.exists(_variant_path(v, out_root)) for v in entry["variants"]
+    )
+
+
+def update_manifest(blog_dir=BLOG_DIR, out_root=OUTPUT_DIR, manifest_path=MANIFEST_PATH,
+                    formats=FORMATS, workers=None):
+    """(images, built, skipped, failed, pruned): rebuild derivatives for images whose content changed"""
+    formats = available_formats(formats)
+    markdown = []
+    with os.scandir(blog_dir) as it:
+        for entry in it:
+            path = os.path.join(entry.path, "index.md")
+            if entry.is_dir() and os.path.isfile(path):
+                markdown.append(path)
+    sources = sorted(p for p in referenced_assets(blog_dir, markdown) if os.path.isfile(p))
+    clashes = stem_clashes(
+        (source, os.path.join(out_root, os.path.relpath(os.path.dirname(source), blog_dir))) for source in sources
+    )
+    if clashes:
+        raise SystemExit("❌ These images would overwrite each other's derivatives; rename one of each pair:\n"
+                         + "\n".join(f"  {site_path(a, blog_dir)} and {site_path(b, blog_dir)}" for a, b in clashes))
+
+    previous = load_manifest(manifest_path)
+    images = {}
+    tasks = []
+    cache = DigestCache(os.path.join(os.path.dirname(manifest_path), CACHE_NAME))
+    try:
+        digests = {source: cache.digest(source) for source in sources}
+        cache.save()
+    finally:
+        cache.close()
+    for source in sources:
+        key = site_path(source, blog_dir)
+        digest = digests[source]
+        if _current(previous.get(key), digest, out_root):
+            images[key] = previous[key]
+            continue
+        # derive() trusts outputs newer than the source, which a checkout can fake; clear them
+        for variant in previous.get(key, {}).get("variants", ()):
+            stale = _variant_path(variant, out_root)
+            if os.path.exists(stale):
+                os.unlink(stale)
+        tasks.append((source, digest, blog_dir, out_root, formats))
+
+    failed = []
+    workers = min(workers or os.cpu_count() or 1, len(tasks) or 1)
+    if workers == 1:
+        results = map(_build, tasks)
+    else:
+        pool = ProcessPoolExecutor(workers)
+        results = pool.map(_build, tasks, chunksize=4)
+    try:
+        for source, entry in results:
+            if entry is None:
+                failed.append(source)
+            else:
+                images[site_path(source, blog_dir)] = entry
+                print(f"  ✓ {site_path(source, blog_dir)} ({len(entry['variants'])} variants)")
+    finally:
+        if workers > 1:
+            pool.shutdown()
+
+    pruned = prune_variants(previous, images, out_root)
+    manifest = {"version": MANIFEST_VERSION, "images": dict(sorted(images.items()))}
+    partial = manifest_path + ".part"
+    with open(partial, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+        f.write("\n")
+    os.replace(partial, manifest_path)
+    return images, len(tasks) - len(failed), len(sources) - len(tasks), failed, pruned
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build blog image derivatives and their srcset manifest")
+    parser.add_argument("--blog-dir", default=BLOG_DIR, help="content/blog folder")
+    parser.add_argument("--out", default=OUTPUT_DIR, help=f"where derivatives go (served as {OUTPUT_PREFIX})")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="manifest to write")
+    parser.add_argument("--workers", type=int, help="encoder processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    images, built, skipped, failed, pruned = update_manifest(args.blog_dir, args.out, args.manifest, workers=args.workers)
+    original = sum(entry["bytes"] for entry in images.values())
+    # What a desktop browser now downloads: the widest variant in its best format
+    smallest = 0
+    for entry in images.values():
+        widest = max(v["width"] for v in entry["variants"])
+        smallest += min(v["bytes"] for v in entry["variants"] if v["width"] == widest)
+    print(f"\n📄 {len(images)} images in {os.path.relpath(args.manifest, ROOT_DIR)}: "
+          f"{built} built, {skipped} unchanged, {pruned} unused variants removed")
+    if images:
+        print(f"   Largest variants {smallest / 1024 / 1024:.1f} MB vs originals {original / 1024 / 1024:.1f} MB")
+    for source in failed:
+        print(f"  ⚠️ Could not decode {os.path.relpath(source, args.blog_dir)}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Blog Index Builder for The Anchor Pub
+Compiles the front matter of every content/blog/*/index.md into one small
+JSON index: posts by slug, tags, date order and old Wix URLs. Only posts
+that changed since the last build are parsed again
+
+Requires PyYAML: pip install pyyaml
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+from repo_paths import ROOT_DIR
+
+BLOG_DIR = os.path.join(ROOT_DIR, "content", "blog")
+
+# Outside content/blog so it isn't bundled into the blog asset function
+INDEX_PATH = os.path.join(ROOT_DIR, "content", "blog-index.json")
+
+# Parse state lives next to the index, like the ingest manifest does
+CACHE_NAME = ".blog-index-cache.sqlite"
+
+# Bump when the shape of the index changes
+INDEX_VERSION = 1
+
+# Below this many changed posts a process pool costs more than it saves
+PARALLEL_THRESHOLD = 32
+
+
+def _require_yaml():
+    try:
+        import yaml
+    except ImportError:
+        raise SystemExit("❌ PyYAML is required to read front matter: pip install pyyaml")
+    return yaml
+
+
+def split_front_matter(text):
+    """(front matter, body) the way gray-matter splits them; front matter is "" if absent"""
+    if not text.startswith("---"):
+        return "", text
+    end = text.find("\n---", 3)
+    if end == -1:
+        return "", text
+    body_start = text.find("\n", end + 4)
+    return text[3:end], text[body_start + 1:] if body_start != -1 else ""
+
+
+def _plain(value):
+    """YAML values as JSON-friendly ones (dates become ISO strings)"""
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    return value
+
+
+def parse_post(path):
+    """Front matter of one index.md as a dict, with the same defaults lib/markdown.ts applies"""
+    yaml = _require_yaml()
+    with open(path, encoding="utf-8") as f:
+        front, _ = split_front_matter(f.read())
+    try:
+        data = yaml.safe_load(front) or {}
+    except yaml.YAMLError as error:
+        return {"error": str(error).splitlines()[0]}
+    if not isinstance(data, dict):
+        return {"error": "front matter is not a mapping"}
+
+    post = {
+        "title": data.get("title") or "",
+        "description": (data.get("description") or "").strip(),
+        "date": _plain(data.get("date")) or "",
+        "author": data.get("author") or "",
+        "keywords": _plain(data.get("keywords") or []),
+        "tags": _plain(data.get("tags") or []),
+        "featured": bool(data.get("featured")),
+        "hero": data.get("hero") or "",
+        "images": _plain(data.get("images") or []),
+    }
+    # Only present on some posts; left out rather than stored empty
+    for key in ("oldUrl", "canonical", "slug"):
+        if data.get(key):
+            post[key] = str(data[key])
+    return post
+
+
+def _parse(args):
+    slug, path = args
+    return slug, parse_post(path)
+
+
+def old_url_path(url):
+    """Lower-cased path of an oldUrl, the form redirect sources are matched in"""
+    path = urlsplit(url).path if "://" in url else url.split("?", 1)[0]
+    return path.rstrip("/").lower() or "/"
+
+
+class BlogIndexCache:
+    """Last build's parse results, keyed by slug and checked by size, mtime and content hash"""
+
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS posts ("
+            " slug TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT, data TEXT)"
+        )
+        self.rows = {row[0]: row for row in self.db.execute("SELECT slug, size, mtime_ns, digest, data FROM posts")}
+
+    def lookup(self, slug, st):
+        """Cached post if the file's size and mtime are unchanged"""
+        row = self.rows.get(slug)
+        if row and row[1] == st.st_size and row[2] == st.st_mtime_ns:
+            return json.loads(row[4])
+        return None
+
+    def lookup_digest(self, slug, digest, st):
+        """Cached post if only the mtime changed (checkout, touch); refreshes the stored mtime"""
+        row = self.rows.get(slug)
+        if row and row[3] == digest:
+            self.rows[slug] = (slug, st.st_size, st.st_mtime_ns, digest, row[4])
+            return json.loads(row[4])
+        return None
+
+    def store(self, slug, st, digest, post):
+        self.rows[slug] = (slug, st.st_size, st.st_mtime_ns, digest, json.dumps(post))
+
+    def save(self, slugs):
+        self.rows = {slug: row for slug, row in self.rows.items() if slug in slugs}
+        with self.db:
+            self.db.execute("DELETE FROM posts")
+            self.db.executemany("INSERT INTO posts VALUES (?, ?, ?, ?, ?)", self.rows.values())
+
+    def close(self):
+        self.db.close()
+
+
+def _digest(path):
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=20).hexdigest()
+
+
+def collect_posts(blog_dir=BLOG_DIR, cache=None, workers=None):
+    """({slug: post}, parsed count) for every post folder, parsing only what changed"""
+    found = []
+    with os.scandir(blog_dir) as it:
+        for entry in it:
+            path = os.path.join(entry.path, "index.md")
+            if entry.is_dir() and os.path.isfile(path):
+                found.append((entry.name, path, os.stat(path)))
+
+    posts = {}
+    stale = []
+    for slug, path, st in found:
+        post = cache.lookup(slug, st) if cache else None
+        if post is None and cache:
+            digest = _digest(path)
+            post = cache.lookup_digest(slug, digest, st)
+        if post is None:
+            stale.append((slug, path, st))
+        else:
+            posts[slug] = post
+
+    tasks = [(slug, path) for slug, path, _ in stale]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) >= PARALLEL_THRESHOLD:
+        with ProcessPoolExecutor(workers) as pool:
+            parsed = list(pool.map(_parse, tasks, chunksize=8))
+    else:
+        parsed = [_parse(task) for task in tasks]
+
+    for (slug, path, st), (_, post) in zip(stale, parsed):
+        posts[slug] = post
+        if cache:
+            cache.store(slug, st, _digest(path), post)
+    if cache:
+        cache.save(set(posts))
+    return posts, len(stale)
+
+
+def build_index(posts):
+    """The compiled index: posts, newest-first order, tag and oldUrl lookups"""
+    valid = {slug: post for slug, post in posts.items() if "error" not in post}
+    # Same order as getAllBlogPosts: newest first (slug breaks ties so output is stable)
+    order = sorted(valid, key=lambda slug: (str(valid[slug]["date"]), slug))
+    order.reverse()
+
+    tags = {}
+    old_urls = {}
+    for slug in order:
+        for tag in valid[slug]["tags"]:
+            tags.setdefault(str(tag), []).append(slug)
+        if valid[slug].get("oldUrl"):
+            old_urls.setdefault(old_url_path(valid[slug]["oldUrl"]), slug)
+
+    return {
+        "version": INDEX_VERSION,
+        "posts": {slug: valid[slug] for slug in sorted(valid)},
+        "order": order,
+        "tags": dict(sorted(tags.items())),
+        "oldUrls": dict(sorted(old_urls.items())),
+    }
+
+
+def load_index(path=INDEX_PATH):
+    """A previously written index, or None if it's missing or from another version"""
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return index if index.get("version") == INDEX_VERSION else None
+
+
+def update_index(blog_dir=BLOG_DIR, output=INDEX_PATH, full=False, workers=None):
+    """Bring the index file up to date; returns (index, parsed count, errors)"""
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    cache_path = os.path.join(directory, CACHE_NAME)
+    if full and os.path.exists(cache_path):
+        os.unlink(cache_path)
+    cache = BlogIndexCache(cache_path)
+    try:
+        posts, parsed = collect_posts(blog_dir, cache, workers)
+    finally:
+        cache.close()
+
+    index = build_index(posts)
+    data = json.dumps(index, separators=(",", ":"), ensure_ascii=False)
+    # Rewrite only on change so the file's mtime (and any build cache keyed on it) stays put
+    try:
+        with open(output, encoding="utf-8") as f:
+            unchanged = f.read() == data
+    except FileNotFoundError:
+        unchanged = False
+    if not unchanged:
+        with open(output + ".part", "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(output + ".part", output)
+    errors = {slug: post["error"] for slug, post in posts.items() if "error" in post}
+    return index, parsed, errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile blog front matter into one JSON index")
+    parser.add_argument("--blog-dir", default=BLOG_DIR, help="content/blog folder")
+    parser.add_argument("--output", default=INDEX_PATH, help="where to write the index")
+    parser.add_argument("--full", action="store_true", help="ignore the cache and parse every post")
+    parser.add_argument("--workers", type=int, help="parser processes for large rebuilds (default: all cores)")
+    args = parser.parse_args(argv)
+
+    index, parsed, errors = update_index(args.blog_dir, args.output, args.full, args.workers)
+    print(f"✓ {len(index['posts'])} posts indexed ({parsed} parsed, {len(index['posts']) + len(errors) - parsed} cached)")
+    print(f"  {len(index['tags'])} tags, {len(index['oldUrls'])} old URLs")
+    print(f"📄 {args.output} ({os.path.getsize(args.output) // 1024} KB)")
+    for slug, error in sorted(errors.items()):
+        print(f"  ❌ {slug}: {error}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Old URL Reconciliation for The Anchor Pub
+Checks every blog post's oldUrl (its address on the old Wix site) against
+the redirects the site actually serves, and writes the one-hop rules that
+are missing
+"""
+
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from blog_index import build_index, collect_posts, old_url_path
+from redirect_matcher import RedirectMatcher
+from url_replay import ORIGIN, Resolver
+
+# status is one of: ok, chain, not-found, wrong-slug, loop, shared
+Reconciled = namedtuple("Reconciled", "slug old_path expected status replay hint")
+
+PROBLEMS = ("not-found", "wrong-slug", "chain", "loop", "shared")
+
+
+def _path(url):
+    return (urlsplit(url).path.rstrip("/") or "/").lower()
+
+
+def reconcile(index, rules, tracking_params, unserved=()):
+    """One Reconciled per post with an oldUrl, in slug order
+
+    index is a compiled blog index (its oldUrls table already maps each old
+    path to its post); rules are the served redirects. unserved rules (such
+    as content/blog/redirects.json) are only used to explain a miss.
+    """
+    resolver = Resolver(rules, tracking_params)
+    extra = RedirectMatcher(unserved) if unserved else None
+    slugs = {slug.lower() for slug in index["posts"]}
+
+    results = []
+    for slug in sorted(index["posts"]):
+        post = index["posts"][slug]
+        if not post.get("oldUrl"):
+            continue
+        old_path = urlsplit(post["oldUrl"]).path.rstrip("/") or "/"
+        expected = f"/blog/{slug}"
+        replay = resolver.resolve(ORIGIN + old_path)
+        final = _path(replay.final)
+
+        owner = index["oldUrls"].get(old_url_path(post["oldUrl"]))
+        if owner != slug:
+            # Two posts claim the same old URL; it can only ever lead to one of them
+            results.append(Reconciled(slug, old_path, expected, "shared", replay, f"also the oldUrl of {owner}"))
+            continue
+
+        if replay.status in ("loop", "too-many-hops"):
+            status = "loop"
+        elif final == expected.lower():
+            status = "ok" if replay.hops <= 1 else "chain"
+        elif replay.hops == 0 or (final.startswith("/blog/") and final[len("/blog/"):] not in slugs):
+            status = "not-found"
+        else:
+            status = "wrong-slug"
+
+        hint = None
+        if status != "ok" and extra is not None:
+            match = extra.match(old_path)
+            if match is not None:
+                hint = f"only {match.rule.file} handles it, and that file isn't served"
+        results.append(Reconciled(slug, old_path, expected, status, replay, hint))
+    return results
+
+
+def missing_rules(results):
+    """One-hop next.config.js entries for every old URL that doesn't already land in one hop"""
+    entries = []
+    seen = set()
+    for result in results:
+        if result.status in ("ok", "shared") or result.old_path.lower() in seen:
+            continue
+        seen.add(result.old_path.lower())
+        entries.append({"source": result.old_path, "destination": result.expected, "permanent": True})
+    return entries
+
+
+def load_blog_index(blog_dir):
+    """Compiled index built straight from the posts (no cache, nothing written)"""
+    posts, _ = collect_posts(blog_dir)
+    return build_index(posts)
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Blog Bundle Budget for The Anchor Pub
+vercel.json ships content/blog/** inside the app/content/blog/[...path] function,
+so every byte there counts against the serverless size limit. This reports
+what each post costs, which assets nothing links to, and what the bundle
+would weigh once the images are optimised
+"""
+
+import argparse
+import os
+import re
+import sys
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote
+
+from image_derivatives import TARGET_BYTES, WIDTHS
+from repo_paths import ROOT_DIR
+
+BLOG_DIR = os.path.join(ROOT_DIR, "content", "blog")
+
+# Vercel's limit for an uncompressed serverless function
+DEFAULT_BUDGET_MB = 250
+
+IMAGE_FILES = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".avif", ".heic")
+
+# Anything in index.md that looks like an image path: front matter (hero, images),
+# markdown ![](...) and <img src="..."> all reduce to this
+ASSET_REFERENCE = re.compile(r"[\w@%+.~/-]+\.(?:jpe?g|png|gif|webp|avif|heic)\b", re.IGNORECASE)
+
+# Site path the blog route serves these files under
+ROUTE_PREFIX = "/content/blog/"
+
+# Prediction model: photos served no wider than the largest derivative, as
+# WebP at ~0.12 bytes per pixel (measured on our event photos), never over
+# the per-image target and never bigger than today
+MAX_WIDTH = max(WIDTHS)
+WEBP_BYTES_PER_PIXEL = 0.12
+
+Asset = namedtuple("Asset", "post path size referenced")
+Post = namedtuple("Post", "slug bytes assets unreferenced predicted")
+
+
+def scan_tree(directory):
+    """(path, size) of every regular file under directory, using scandir's cached stat
+
+    Symlinks are neither followed nor listed, so asset_audit --prune never
+    deletes through one
+    """
+    files = []
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files.append((entry.path, entry.stat(follow_symlinks=False).st_size))
+    return files
+
+
+def scan_blog(blog_dir=BLOG_DIR, workers=None):
+    """{top-level name: [(path, size)]} for content/blog, one scandir task per post"""
+    with os.scandir(blog_dir) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    tree = {}
+    posts = []
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            posts.append(entry)
+        elif entry.is_file(follow_symlinks=False):
+            tree[entry.name] = [(entry.path, entry.stat().st_size)]
+    with ThreadPoolExecutor(workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        for entry, files in zip(posts, pool.map(lambda e: scan_tree(e.path), posts)):
+            tree[entry.name] = files
+    return tree
+
+
+def referenced_assets(blog_dir, markdown_paths):
+    """Absolute paths of every blog file mentioned by any of the markdown files"""
+    referenced = set()
+    for path in markdown_paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        post_dir = os.path.dirname(path)
+        for ref in ASSET_REFERENCE.findall(text):
+            # Markdown links escape spaces and the like, as asset_audit's references do
+            ref = unquote(ref.split("://", 1)[-1])
+            if ROUTE_PREFIX in ref:
+                target = os.path.join(blog_dir, ref.split(ROUTE_PREFIX, 1)[1])
+            elif ref.startswith("/"):
+                # /images/... lives in public/, outside the bundle
+                continue
+            else:
+                target = os.path.join(post_dir, ref)
+            referenced.add(os.path.normpath(target))
+    return referenced
+
+
+def predict_size(path, size):
+    """Expected bytes for an image after resizing and WebP encoding; the file's own size if unknown"""
+    try:
+        from PIL import Image
+    except ImportError:
+        return min(size, TARGET_BYTES)
+    try:
+        # Only the header is read here
+        with Image.open(path) as image:
+            width, height = image.size
+    except OSError:
+        return size
+    if width > MAX_WIDTH:
+        width, height = MAX_WIDTH, height * MAX_WIDTH / width
+    return min(size, TARGET_BYTES, int(width * height * WEBP_BYTES_PER_PIXEL))
+
+
+def analyse(blog_dir=BLOG_DIR, workers=None):
+    """(posts, assets): cost per post, biggest first, and every file in the bundle"""
+    tree = scan_blog(blog_dir, workers)
+    markdown = [path for files in tree.values() for path, _ in files if path.endswith(".md")]
+    referenced = referenced_assets(blog_dir, markdown)
+
+    assets = []
+    for name, files in tree.items():
+        for path, size in files:
+            is_image = path.lower().endswith(IMAGE_FILES)
+            used = not is_image or os.path.normpath(path) in referenced
+            assets.append(Asset(name, path, size, used))
+
+    images = [a for a in assets if a.referenced and a.path.lower().endswith(IMAGE_FILES)]
+    with ThreadPoolExecutor(workers or min(32, (os.cpu_count() or 1) * 4)) as pool:
+        predicted = dict(zip(
+            (a.path for a in images),
+            pool.map(lambda a: predict_size(a.path, a.size), images),
+        ))
+
+    posts = {}
+    for asset in assets:
+        post = posts.setdefault(asset.post, Post(asset.post, 0, 0, 0, 0))
+        # Unreferenced files would be pruned, so they predict to nothing
+        after = predicted.get(asset.path, asset.size) if asset.referenced else 0
+        posts[asset.post] = post._replace(
+            bytes=post.bytes + asset.size,
+            assets=post.assets + 1,
+            unreferenced=post.unreferenced + (0 if asset.referenced else asset.size),
+            predicted=post.predicted + after,
+        )
+    return sorted(posts.values(), key=lambda p: (-p.bytes, p.slug)), assets
+
+
+def megabytes(size):
+    """size in bytes as "12.3 MB" for the reports"""
+    return f"{size / 1024 / 1024:.1f} MB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the blog function bundle against a size budget")
+    parser.add_argument("--blog-dir", default=BLOG_DIR, help="content/blog folder")
+    parser.add_argument("--budget-mb", type=float, default=DEFAULT_BUDGET_MB,
+                        help=f"fail when the bundle is bigger than this (default {DEFAULT_BUDGET_MB})")
+    parser.add_argument("--check", choices=["current", "optimised"], default="current",
+                        help="which size the budget applies to")
+    parser.add_argument("--top", type=int, default=15, help="how many of the heaviest posts to list")
+    parser.add_argument("--unreferenced", action="store_true", help="list every unreferenced asset")
+    parser.add_argument("--workers", type=int, help="scan threads (default: 4 per core)")
+    args = parser.parse_args(argv)
+
+    posts, assets = analyse(args.blog_dir, args.workers)
+    total = sum(p.bytes for p in posts)
+    unused = sum(p.unreferenced for p in posts)
+    predicted = sum(p.predicted for p in posts)
+    budget = int(args.budget_mb * 1024 * 1024)
+
+    print(f"📦 content/blog bundle: {megabytes(total)} in {len(assets)} files across {len(posts)} posts")
+    print("\n🔍 Heaviest posts:")
+    for post in posts[:args.top]:
+        extra = f"  ({megabytes(post.unreferenced)} unreferenced)" if post.unreferenced else ""
+        print(f"  {megabytes(post.bytes):>9} → {megabytes(post.predicted):>8}  {post.slug}{extra}")
+
+    orphans = [a for a in assets if not a.referenced]
+    print(f"\n⚠️ {len(orphans)} assets no index.md references ({megabytes(unused)})")
+    for asset in sorted(orphans, key=lambda a: -a.size)[:None if args.unreferenced else 10]:
+        print(f"  {megabytes(asset.size):>9}  {os.path.relpath(asset.path, args.blog_dir)}")
+
+    print(f"\nCurrent:                {megabytes(total)}")
+    print(f"Without unreferenced:   {megabytes(total - unused)}")
+    print(f"Optimised (predicted):  {megabytes(predicted)}  (≤{MAX_WIDTH}px WebP, ≤{TARGET_BYTES // 1024} KB each)")
+    print(f"Budget:                 {megabytes(budget)}")
+
+    checked = total if args.check == "current" else predicted
+    if checked > budget:
+        print(f"\n❌ {args.check} bundle is {megabytes(checked - budget)} over budget")
+        return 1
+    print(f"\n✓ {args.check} bundle is within budget ({megabytes(budget - checked)} to spare)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,70 +1,46 @@
-import json
+#!/usr/bin/env python3
+"""
+Redirect Checker for The Anchor Pub
+Loads every redirect rule the site ships and reports chains, loops and
+problematic patterns
+"""
+
+import argparse
 import glob
+import json
+import os
+import sys
+import time
+from collections import namedtuple
 
-# Load all redirects
-all_redirects = {}
-redirect_files = glob.glob('*redirects.json') + glob.glob('content/blog/redirects.json')
+from blog_reconcile import PROBLEMS, load_blog_index, missing_rules, reconcile
+from redirect_analyser import find_dead_rules, flatten
+from redirect_compiler import MAX_ARTIFACT_BYTES, compile_rules, serialise, verify
+from redirect_graph import RedirectGraph
+from redirect_minimiser import by_file, minimise
+from redirect_matcher import RedirectMatcher
+from repo_paths import ROOT_DIR
+import run_report
+from site_routes import RouteTable
+from url_replay import detect_format, display, iter_urls, load_tracking_params, replay, summarise
 
-for file in redirect_files:
-    try:
-        with open(file, 'r') as f:
-            data = json.load(f)
-            # Handle different formats
-            if isinstance(data, list):
-                redirects = data
-            elif isinstance(data, dict) and 'redirects' in data:
-                redirects = data['redirects']
-            else:
-                continue
-                
-            for redirect in redirects:
-                if 'source' in redirect and 'destination' in redirect:
-                    all_redirects[redirect['source']] = redirect['destination']
-    except:
-        pass
-
-# Find chains
-print("=== REDIRECT CHAINS ===")
-chains_found = False
-for source, destination in all_redirects.items():
-    if destination in all_redirects:
-        print(f"Chain: {source} -> {destination} -> {all_redirects[destination]}")
-        chains_found = True
-        
-if not chains_found:
-    print("No redirect chains found")
-
-# Find loops
-print("\n=== REDIRECT LOOPS ===")
-loops_found = False
-for source, destination in all_redirects.items():
-    if destination in all_redirects and all_redirects[destination] == source:
-        print(f"Loop: {source} <-> {destination}")
-        loops_found = True
-        
-if not loops_found:
-    print("No redirect loops found")
-
-# Find problematic patterns
-print("\n=== PROBLEMATIC PATTERNS ===")
-
-# Check for redirects to the same URL
-print("\nRedirects to self:")
-for source, destination in all_redirects.items():
-    if source == destination:
-        print(f"Self-redirect: {source} -> {destination}")
-
-# Check for very similar URLs that might cause issues
-print("\nSimilar source/destination:")
-for source, destination in all_redirects.items():
-    # Remove trailing slashes for comparison
-    clean_source = source.rstrip('/')
-    clean_dest = destination.rstrip('/')
-    if clean_source == clean_dest and source \!= destination:
-        print(f"Trailing slash issue: {source} -> {destination}")
-
-# Find URLs mentioned in GSC errors
-gsc_errors = [
+# Same order next.config.js spreads them into redirects()
+REDIRECT_FILES = [
+    "config/redirects/wix-redirects.json",
+    "config/redirects/blog-redirects.json",
+    "config/redirects/tag-redirects.json",
+    "config/redirects/legacy-redirects.json",
+    "config/redirects/drinks-redirects.json",
+    "config/redirects/additional-redirects.json",
+]
+
+# Maintained next to the blog content rather than in next.config.js
+EXTRA_REDIRECT_FILES = [
+    "content/blog/redirects.json",
+]
+
+# URLs reported in Google Search Console coverage errors
+GSC_ERRORS = [
     "/whats-on",
     "/pizza-tuesday",
     "/drinks",
@@ -74,24 +50,416 @@ gsc_errors = [
     "/find-us",
     "/private-parties",
     "/about-us",
-    "/airport-parking"
+    "/airport-parking",
 ]
 
-print("\n=== GSC ERROR URLS IN REDIRECTS ===")
-for url in gsc_errors:
-    if url in all_redirects:
-        print(f"Source: {url} -> {all_redirects[url]}")
-    
-    # Check if it's a destination
-    destinations = [dest for src, dest in all_redirects.items() if dest == url]
-    if destinations:
-        print(f"Destination: {len(destinations)} redirects point to {url}")
-        # Show first 5 examples
-        count = 0
-        for src, dest in all_redirects.items():
-            if dest == url and count < 5:
+Redirect = namedtuple("Redirect", "source destination permanent status_code file order")
+
+
+def redirect_files(root=ROOT_DIR):
+    """Every redirect file in evaluation order, including ones next.config.js doesn't list yet"""
+    files = [f for f in REDIRECT_FILES if os.path.exists(os.path.join(root, f))]
+    known = set(files)
+    for path in sorted(glob.glob(os.path.join(root, "config", "redirects", "*.json"))):
+        relative = os.path.relpath(path, root)
+        if relative not in known:
+            files.append(relative)
+    files.extend(f for f in EXTRA_REDIRECT_FILES if os.path.exists(os.path.join(root, f)))
+    return files
+
+
+def load_redirects(root=ROOT_DIR, files=None):
+    """Load every redirect rule as an ordered list of Redirect tuples"""
+    rules = []
+    for file in files or redirect_files(root):
+        try:
+            with open(os.path.join(root, file), "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as error:
+            print(f"⚠️  Skipping {file}: {error}")
+            continue
+
+        # Handle different formats
+        if isinstance(data, dict) and "redirects" in data:
+            data = data["redirects"]
+        if not isinstance(data, list):
+            print(f"⚠️  Skipping {file}: no redirect list found")
+            continue
+
+        for redirect in data:
+            if "source" in redirect and "destination" in redirect:
+                permanent = redirect.get("permanent", True)
+                rules.append(Redirect(
+                    source=redirect["source"],
+                    destination=redirect["destination"],
+                    permanent=permanent,
+                    # Next.js answers permanent rules with 308 and temporary ones with 307
+                    status_code=redirect.get("statusCode") or (308 if permanent else 307),
+                    file=file,
+                    order=len(rules),
+                ))
+    return rules
+
+
+def served_rules(rules):
+    """Only the rules next.config.js actually serves"""
+    return [r for r in rules if r.file in REDIRECT_FILES]
+
+
+def print_report(graph, show_all=False):
+    """Print the chain, loop and pattern sections and return the chains"""
+    print("=== REDIRECT CHAINS ===")
+    chains = sorted(graph.chains(), key=lambda r: (-r.hops, r.source))
+    for chain in chains:
+        print(f"Chain ({chain.hops} hops): {' -> '.join(chain.path)}")
+    if not chains:
+        print("No redirect chains found")
+
+    print("\n=== REDIRECT LOOPS ===")
+    for cycle in graph.cycles:
+        print(f"Loop: {' -> '.join(cycle + [cycle[0]])}")
+    members = {node for cycle in graph.cycles for node in cycle}
+    for feeder in graph.loops():
+        if feeder.source in members:
+            continue
+        print(f"Leads into loop: {' -> '.join(feeder.path)}")
+    if not graph.cycles:
+        print("No redirect loops found")
+
+    print("\n=== PROBLEMATIC PATTERNS ===")
+
+    # Check for redirects to the same URL
+    print("\nRedirects to self:")
+    for source, destination in graph.edges.items():
+        if source == destination:
+            print(f"Self-redirect: {source} -> {destination}")
+
+    # Check for very similar URLs that might cause issues
+    print("\nSimilar source/destination:")
+    for source, destination in graph.edges.items():
+        # Remove trailing slashes for comparison
+        if source.rstrip("/") == destination.rstrip("/") and source != destination:
+            print(f"Trailing slash issue: {source} -> {destination}")
+
+    print("\n=== GSC ERROR URLS IN REDIRECTS ===")
+    by_destination = graph.sources_by_destination()
+    for url in GSC_ERRORS:
+        resolution = graph.resolve(url)
+        if resolution:
+            print(f"Source: {url} -> {resolution.final} ({resolution.hops} hops)")
+
+        # Check if it's a destination
+        sources = by_destination.get(url, [])
+        if sources:
+            print(f"Destination: {len(sources)} redirects point to {url}")
+            # Show first 5 examples
+            for src in sources[:5]:
                 print(f"  {src} -> {url}")
-                count += 1
-        if len(destinations) > 5:
-            print(f"  ... and {len(destinations) - 5} more")
+            if len(sources) > 5:
+                print(f"  ... and {len(sources) - 5} more")
+
+    if show_all:
+        print("\n=== FINAL DESTINATIONS ===")
+        for source in graph.edges:
+            resolution = graph.resolved[source]
+            final = resolution.final if resolution.final is not None else "(loop)"
+            print(f"{source} -> {final} [{resolution.hops if resolution.hops is not None else '∞'}]")
+    return chains
+
+
+def print_matches(matcher, urls):
+    """Bulk mode: print the rule each URL hits and where it is sent"""
+    matched = 0
+    total = 0
+    for url, match in matcher.match_many(urls):
+        total += 1
+        if match is None:
+            print(f"{url}\t-")
+            continue
+        matched += 1
+        print(f"{url}\t{match.destination}\t{match.rule.file}#{match.rule.source}")
+    return matched, total
+
+
+def run_replay(args, rules):
+    """Stream an export of URLs through every redirect layer and print per-URL results"""
+    tracking_params = load_tracking_params(args.root)
+    fmt = args.format or ("lines" if args.replay == "-" else detect_format(args.replay))
+    stream = sys.stdin if args.replay == "-" else open(args.replay, "r", newline="", encoding="utf-8", errors="replace")
+    out = open(args.output, "w") if args.output else sys.stdout
+    started = time.perf_counter()
+    try:
+        results = replay(iter_urls(stream, fmt), served_rules(rules), tracking_params, workers=args.workers)
+        counts, hops = summarise(results, out)
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - started
+
+    total = sum(counts.values())
+    print(f"\n=== REPLAY SUMMARY ({total} URLs in {elapsed:.2f}s) ===", file=sys.stderr)
+    for status, count in counts.most_common():
+        print(f"{status}: {count}", file=sys.stderr)
+    print("Hops: " + ", ".join(f"{h}={hops[h]}" for h in sorted(hops)), file=sys.stderr)
+    return 1 if counts["loop"] or counts["too-many-hops"] else 0
+
+
+def print_dead_rules(rules):
+    """Report rules that can never fire, grouped by why"""
+    dead = find_dead_rules(rules)
+    sections = [
+        ("duplicate", "EXACT DUPLICATES"),
+        ("conflict", "CONFLICTING RULES (same source, different destination)"),
+        ("shadowed", "SHADOWED BY AN EARLIER RULE"),
+        ("trailing-slash", "UNREACHABLE TRAILING-SLASH SOURCES"),
+    ]
+    for kind, title in sections:
+        found = [d for d in dead if d.kind == kind]
+        print(f"\n=== {title} ({len(found)}) ===")
+        for d in found:
+            line = f"{d.rule.file}: {d.rule.source} -> {d.rule.destination}"
+            if d.by is not None:
+                line += f"  [first: {d.by.file}: {d.by.source} -> {d.by.destination}]"
+            print(line)
+    return dead
+
+
+def write_flattened(rules, path):
+    """Write the deduplicated, one-hop rule list next.config.js can spread directly"""
+    entries, loops = flatten(rules)
+    with open(path, "w") as f:
+        json.dump(entries, f, indent=2)
+        f.write("\n")
+    print(f"Wrote {len(entries)} rules ({len(rules)} before) to {path}")
+    for rule in loops:
+        print(f"⚠️  Left as-is because it loops: {rule.source} -> {rule.destination}")
+
+
+def run_reconcile(args, rules):
+    """Compare every post's oldUrl with where the served redirects send it"""
+    tracking_params = load_tracking_params(args.root)
+    served = served_rules(rules)
+    unserved = [r for r in rules if r.file not in REDIRECT_FILES]
+    index = load_blog_index(os.path.join(args.root, "content", "blog"))
+    results = reconcile(index, served, tracking_params, unserved)
+
+    titles = {
+        "not-found": "OLD URLS THAT 404",
+        "wrong-slug": "OLD URLS THAT LAND ON THE WRONG PAGE",
+        "chain": "OLD URLS THAT TAKE MORE THAN ONE HOP",
+        "loop": "OLD URLS THAT LOOP",
+        "shared": "OLD URLS CLAIMED BY MORE THAN ONE POST",
+    }
+    for status in PROBLEMS:
+        found = [result for result in results if result.status == status]
+        if not found:
+            continue
+        print(f"\n=== {titles[status]} ({len(found)}) ===")
+        for result in found:
+            landed = display(result.replay.final)
+            print(f"{result.old_path} -> {landed} ({result.replay.hops} hops), should be {result.expected}")
+            if result.hint:
+                print(f"  ↳ {result.hint}")
+
+    ok = sum(1 for result in results if result.status == "ok")
+    print(f"\n{ok}/{len(results)} old URLs reach their post in one hop")
+
+    entries = missing_rules(results)
+    if args.write_missing:
+        with open(args.write_missing, "w") as f:
+            json.dump(entries, f, indent=2)
+            f.write("\n")
+        # Replay with the new rules ahead of everything else to prove they close every gap
+        generated = [
+            Redirect(e["source"], e["destination"], True, 308, args.write_missing, i - len(entries))
+            for i, e in enumerate(entries)
+        ]
+        left = [r for r in reconcile(index, generated + served, tracking_params) if r.status not in ("ok", "shared")]
+        print(f"Wrote {len(entries)} one-hop rules to {args.write_missing}; "
+              f"{len(left)} problems remain with them in place")
+        print(f"  Add them at the top of {REDIRECT_FILES[0]} so no earlier rule answers first")
+    elif entries:
+        print(f"Run with --write-missing FILE to generate the {len(entries)} missing one-hop rules")
+    return 1 if any(result.status in ("not-found", "wrong-slug", "loop") for result in results) else 0
+
+
+def write_compiled(args, rules):
+    """Compile the served rules into one lookup file, prove it equivalent, and check its size"""
+    served = served_rules(rules)
+    artifact, loops = compile_rules(served, load_tracking_params(args.root))
+    data = serialise(artifact)
+    mismatches = verify(json.loads(data), served)
+    limit = int(args.max_kb * 1024)
+
+    with open(args.compile, "w", encoding="utf-8") as f:
+        f.write(data)
+        f.write("\n")
+    print(f"Wrote {args.compile}: {len(artifact['literals'])} literal sources, "
+          f"{len(artifact['rules'])} patterns, {len(data) / 1024:.1f} KB (version {artifact['version']})")
+    for rule in loops:
+        print(f"⚠️  Left as-is because it loops: {rule.source} -> {rule.destination}")
+    for url, expected, got in mismatches[:20]:
+        print(f"❌ {url}: rules give {expected}, compiled gives {got}")
+
+    failed = False
+    if mismatches:
+        print(f"❌ {len(mismatches)} URLs resolve differently from the rules")
+        failed = True
+    if len(data) > limit:
+        print(f"❌ {len(data) / 1024:.1f} KB is over the {args.max_kb:g} KB limit")
+        failed = True
+    return 1 if failed else 0
+
+
+def write_minimised(args, rules):
+    """Write smaller, equivalent copies of the served rule files into a folder"""
+    served = served_rules(rules)
+    routes = RouteTable(args.root)
+    sitemaps = [os.path.join(args.root, "public", "sitemap-priority.xml")]
+    minimised, changes, mismatches = minimise(served, routes, load_tracking_params(args.root), sitemap_paths=sitemaps)
+
+    for kind, title in (("dead", "DROPPED: NEVER FIRE"), ("redundant", "DROPPED: A LATER PATTERN ANSWERS THE SAME"),
+                        ("folded", "FOLDED INTO PATTERNS")):
+        found = [c for c in changes if c.kind == kind]
+        if not found:
+            continue
+        print(f"\n=== {title} ({sum(len(c.rules) for c in found)} rules) ===")
+        for change in found:
+            if kind == "folded":
+                print(f"{change.replacement.file}: {len(change.rules)} rules -> "
+                      f"{change.replacement.source} -> {change.replacement.destination}")
+            else:
+                rule = change.rules[0]
+                print(f"{rule.file}: {rule.source} -> {rule.destination}")
+
+    os.makedirs(args.minimise, exist_ok=True)
+    before = {}
+    for rule in served:
+        before[rule.file] = before.get(rule.file, 0) + 1
+    entries = by_file(minimised)
+    print()
+    for file in REDIRECT_FILES:
+        if file not in before:
+            continue
+        path = os.path.join(args.minimise, os.path.basename(file))
+        with open(path, "w") as f:
+            json.dump(entries.get(file, []), f, indent=2)
+            f.write("\n")
+        print(f"{file}: {before[file]} -> {len(entries.get(file, []))} rules ({path})")
+    print(f"Total: {len(served)} -> {len(minimised)} rules")
+
+    if mismatches:
+        print(f"❌ {len(mismatches)} known URLs resolve differently")
+        return 1
+    print("✓ Every known URL resolves exactly as before")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check redirect rules for chains, loops and problems")
+    parser.add_argument("--root", default=ROOT_DIR, help="repository root (default: this checkout)")
+    parser.add_argument("--all", action="store_true", help="list the final destination and hop count of every source")
+    parser.add_argument("--match", nargs="+", metavar="URL",
+                        help="print the first rule each URL matches ('-' reads URLs from stdin)")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="resolve every URL in a CSV/NDJSON/sitemap/log export ('-' for stdin)")
+    parser.add_argument("--format", choices=["lines", "csv", "ndjson", "sitemap"],
+                        help="export format for --replay (default: from the file extension)")
+    parser.add_argument("--workers", type=int, help="worker processes for --replay (default: all cores)")
+    parser.add_argument("--output", help="write --replay results here instead of stdout")
+    parser.add_argument("--analyse", action="store_true",
+                        help="report duplicate, conflicting and shadowed rules")
+    parser.add_argument("--flatten", metavar="FILE",
+                        help="write the served rules deduplicated with every chain collapsed to one hop")
+    parser.add_argument("--compile", metavar="FILE",
+                        help="write the served rules as one precomputed lookup file for the middleware")
+    parser.add_argument("--max-kb", type=float, default=MAX_ARTIFACT_BYTES / 1024,
+                        help=f"size limit for --compile (default {MAX_ARTIFACT_BYTES // 1024})")
+    parser.add_argument("--minimise", metavar="DIR",
+                        help="write equivalent, smaller copies of the served rule files into DIR")
+    parser.add_argument("--reconcile", action="store_true",
+                        help="check every blog post's oldUrl reaches the post in one hop")
+    parser.add_argument("--write-missing", metavar="FILE",
+                        help="with --reconcile, write the missing one-hop rules here")
+    parser.add_argument("--report", metavar="FILE",
+                        help="also write a JSON-lines run report with per-phase timings (summary on stderr)")
+    args = parser.parse_args(argv)
+
+    report = run_report.RunReport(args.report, "check_redirects", root=args.root,
+                                  argv=sys.argv[1:] if argv is None else list(argv))
+    code = 1
+    try:
+        code = run(args, report)
+    finally:
+        report.close(code)
+    if args.report:
+        print("\n".join(run_report.render(run_report.summarise(args.report))), file=sys.stderr)
+    return code
+
+
+def run(args, report):
+    """Carry out whichever mode the arguments ask for and return the exit code"""
+    started = time.perf_counter()
+    with report.phase("load"):
+        rules = load_redirects(args.root)
+    per_file = {}
+    for rule in rules:
+        per_file[rule.file] = per_file.get(rule.file, 0) + 1
+    for file, count in per_file.items():
+        report.file("load", "loaded", os.path.getsize(os.path.join(args.root, file)), file, rules=count)
+    report.count("rules", len(rules))
+
+    if args.replay:
+        with report.phase("replay"):
+            return run_replay(args, rules)
+
+    if args.reconcile:
+        with report.phase("reconcile"):
+            return run_reconcile(args, rules)
+
+    if args.compile:
+        with report.phase("compile"):
+            return write_compiled(args, rules)
+
+    if args.minimise:
+        with report.phase("minimise"):
+            return write_minimised(args, rules)
+
+    if args.analyse or args.flatten:
+        with report.phase("analyse"):
+            if args.analyse:
+                report.count("dead", len(print_dead_rules(rules)))
+            if args.flatten:
+                write_flattened(served_rules(rules), args.flatten)
+        print(f"\nDone in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return 0
+
+    with report.phase("match"):
+        matcher = RedirectMatcher(rules)
+    if args.match:
+        urls = (line.strip() for line in sys.stdin) if args.match == ["-"] else args.match
+        with report.phase("match"):
+            matched, total = print_matches(matcher, (url for url in urls if url))
+        report.count("matched", matched)
+        report.count("urls", total)
+        elapsed = time.perf_counter() - started
+        print(f"{matched}/{total} URLs matched a redirect in {elapsed:.2f}s", file=sys.stderr)
+        return 0
+
+    with report.phase("graph"):
+        graph = RedirectGraph(rules, matcher)
+    elapsed = (time.perf_counter() - started) * 1000
+
+    with report.phase("report"):
+        chains = print_report(graph, show_all=args.all)
+    report.count("chains", len(chains))
+    report.count("loops", len(graph.cycles))
+
+    print(f"\n{len(rules)} rules from {len({r.file for r in rules})} files checked in {elapsed:.1f} ms")
+    return 1 if graph.cycles else 0
+
 
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Event Photo Clustering for The Anchor Pub
+Groups photos into shoots by when and where they were taken, reading only
+the EXIF headers, and names each shoot's category from the event on that
+night: a date→category calendar file, or events exported from the what's-on
+API. Lets UUID-named phone photos be filed without opening them by hand
+
+Requires Pillow: pip install pillow (and pillow-heif for HEIC)
+"""
+
+import argparse
+import json
+import math
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+from image_ingest import IMAGE_EXTENSIONS, NameIndex, scan_images
+
+# A longer pause than this between two photos starts a new shoot
+DEFAULT_GAP = timedelta(minutes=90)
+
+# Photos further apart than this (metres) are never the same shoot
+DEFAULT_RADIUS = 500
+
+# Photos taken before 6am belong to the previous evening's event
+NIGHT_ROLLOVER = timedelta(hours=6)
+
+# The pub, from the site's LocalBusiness schema
+PUB_LOCATION = (51.462509, -0.502067)
+
+# EXIF tags: the Exif and GPS sub-IFDs, capture time, and GPS fields
+EXIF_IFD = 0x8769
+GPS_IFD = 0x8825
+DATE_TIME = 0x0132
+DATE_TIME_ORIGINAL = 0x9003
+GPS_LATITUDE_REF, GPS_LATITUDE, GPS_LONGITUDE_REF, GPS_LONGITUDE = 1, 2, 3, 4
+
+EXIF_TIME_FORMAT = "%Y:%m:%d %H:%M:%S"
+
+# Words in an exported event's slug or name, and the photo category they mean
+EVENT_KEYWORDS = [
+    ("drag", "drag-shows"),
+    ("nikki", "drag-shows"),
+    ("tequila", "tequila-tasting"),
+    ("bingo", "bingo"),
+    ("karaoke", "karaoke"),
+    ("quiz", "quiz-nights"),
+    ("pursuit", "quiz-nights"),
+    ("coronation", "british-celebrations"),
+    ("jubilee", "british-celebrations"),
+    ("st-george", "british-celebrations"),
+    ("vj-day", "british-celebrations"),
+    ("ve-day", "british-celebrations"),
+]
+
+# Name the renamers give a photo filed by the night it was taken: category, running number
+NIGHT_NAME = "the-anchor-stanwell-moor-{}-{:03d}.jpg"
+
+Capture = namedtuple("Capture", "path taken latitude longitude")
+
+# night is the date of the evening the shoot belongs to; latitude/longitude
+# are the mean of the photos that have them, or None
+Cluster = namedtuple("Cluster", "night start end captures latitude longitude")
+
+
+def _require_pillow():
+    try:
+        from PIL import Image
+    except ImportError:
+        raise SystemExit("❌ Pillow is required to read EXIF: pip install pillow")
+    return Image
+
+
+def _degrees(value, ref):
+    """Decimal degrees from an EXIF (degrees, minutes, seconds) triple"""
+    try:
+        d, m, s = (float(part) for part in value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+    degrees = d + m / 60 + s / 3600
+    return -degrees if ref in ("S", "W") else degrees
+
+
+def read_capture(path):
+    """Capture time and position from a photo's EXIF header; pixels are never decoded"""
+    Image = _require_pillow()
+    from image_derivatives import register_heif
+
+    register_heif()
+    try:
+        # open() only parses the header; the image data is read on first access, which never comes
+        with Image.open(path) as image:
+            exif = image.getexif()
+            details = exif.get_ifd(EXIF_IFD)
+            gps = exif.get_ifd(GPS_IFD)
+    except (OSError, SyntaxError, ValueError):
+        return Capture(path, None, None, None)
+
+    taken = None
+    stamp = details.get(DATE_TIME_ORIGINAL) or exif.get(DATE_TIME)
+    if isinstance(stamp, str):
+        try:
+            taken = datetime.strptime(stamp.strip("\x00 "), EXIF_TIME_FORMAT)
+        except ValueError:
+            pass
+    latitude = longitude = None
+    if GPS_LATITUDE in gps and GPS_LONGITUDE in gps:
+        latitude = _degrees(gps[GPS_LATITUDE], gps.get(GPS_LATITUDE_REF))
+        longitude = _degrees(gps[GPS_LONGITUDE], gps.get(GPS_LONGITUDE_REF))
+        if latitude is None or longitude is None:
+            latitude = longitude = None
+    return Capture(path, taken, latitude, longitude)
+
+
+def read_captures(paths, workers=None):
+    """Capture for every path, header parsing spread over a process pool"""
+    paths = list(paths)
+    workers = min(workers or os.cpu_count() or 1, len(paths) or 1)
+    if workers == 1:
+        return [read_capture(path) for path in paths]
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(read_capture, paths, chunksize=32))
+
+
+def distance(a, b):
+    """Metres between two (latitude, longitude) points"""
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+def _cluster(captures):
+    located = [(c.latitude, c.longitude) for c in captures if c.latitude is not None]
+    latitude = sum(p[0] for p in located) / len(located) if located else None
+    longitude = sum(p[1] for p in located) / len(located) if located else None
+    start = captures[0].taken
+    return Cluster((start - NIGHT_ROLLOVER).date(), start, captures[-1].taken, captures, latitude, longitude)
+
+
+def cluster(captures, gap=DEFAULT_GAP, radius=DEFAULT_RADIUS):
+    """(clusters, undated): one sort by time, then one sweep that cuts on long pauses or moves
+
+    A photo joins the current shoot if it was taken within gap of the
+    previous one and, when both have a position, within radius of the last
+    located photo. Photos with no capture time can't be placed.
+    """
+    dated = sorted((c for c in captures if c.taken is not None), key=lambda c: (c.taken, c.path))
+    undated = [c for c in captures if c.taken is None]
+    clusters = []
+    current = []
+    last_position = None
+    for capture in dated:
+        position = (capture.latitude, capture.longitude) if capture.latitude is not None else None
+        moved = position is not None and last_position is not None and distance(position, last_position) > radius
+        if current and (capture.taken - current[-1].taken > gap or moved):
+            clusters.append(_cluster(current))
+            current = []
+            last_position = None
+        current.append(capture)
+        if position is not None:
+            last_position = position
+    if current:
+        clusters.append(_cluster(current))
+    return clusters, undated
+
+
+def event_category(event):
+    """Photo category for an exported what's-on event, from words in its slug or name"""
+    text = " ".join(str(event.get(field) or "") for field in ("slug", "name")).lower().replace(" ", "-")
+    for keyword, category in EVENT_KEYWORDS:
+        if keyword in text:
+            return category
+    return None
+
+
+def load_calendar(path):
+    """{date: category} from a calendar file
+
+    Either a JSON object of "YYYY-MM-DD": "category", or events exported
+    from the what's-on API (a list, or an object with "events") whose
+    startDate gives the night and whose slug or name gives the category.
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict) and "events" not in data:
+        return {date.fromisoformat(day): category for day, category in data.items()}
+    calendar = {}
+    for event in data["events"] if isinstance(data, dict) else data:
+        category = event_category(event)
+        if category and event.get("startDate"):
+            calendar.setdefault(datetime.fromisoformat(event["startDate"].replace("Z", "+00:00")).date(), category)
+    return calendar
+
+
+def categorise(paths, calendar, workers=None, gap=DEFAULT_GAP, radius=DEFAULT_RADIUS):
+    """{path: category} for photos whose shoot falls on a night in the calendar, at the pub"""
+    clusters, _ = cluster(read_captures(paths, workers), gap, radius)
+    found = {}
+    for shoot in clusters:
+        category = calendar.get(shoot.night)
+        if category is None:
+            continue
+        # A shoot we know was somewhere else isn't that night's event
+        if shoot.latitude is not None and distance((shoot.latitude, shoot.longitude), PUB_LOCATION) > radius:
+            continue
+        for capture in shoot.captures:
+            found[capture.path] = category
+    return found
+
+
+def categorise_unknown(paths, calendar, manifest, workers=None):
+    """(found, reused): categorise, but only reading photos the renamer's manifest doesn't know
+
+    A photo unchanged since the last run keeps the night it was matched to
+    then, read back from the folder and name it was given; one that was
+    named some other way stays uncategorised. reused counts the photos
+    answered from the manifest.
+    """
+    known = {}
+    unread = []
+    for path in paths:
+        dest = manifest.previous_dest(path, os.stat(path))
+        if dest is None:
+            unread.append(path)
+            continue
+        category = os.path.basename(os.path.dirname(dest))
+        if NameIndex.family(os.path.basename(dest)) == NameIndex.family(NIGHT_NAME.format(category, 1)):
+            known[path] = category
+    found = categorise(unread, calendar, workers) if unread else {}
+    found.update(known)
+    return found, len(paths) - len(unread)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Group event photos into shoots by capture time and place")
+    parser.add_argument("folders", nargs="+", help="folders of photos")
+    parser.add_argument("--calendar", help="date→category JSON, or events exported from the what's-on API")
+    parser.add_argument("--gap-minutes", type=int, default=int(DEFAULT_GAP.total_seconds() // 60),
+                        help="pause that starts a new shoot")
+    parser.add_argument("--radius", type=int, default=DEFAULT_RADIUS, help="metres a shoot may span")
+    parser.add_argument("--workers", type=int, help="reader processes (default: all cores)")
+    args = parser.parse_args()
+
+    paths = [entry.path for folder in args.folders for entry in scan_images(folder, IMAGE_EXTENSIONS)]
+    calendar = load_calendar(args.calendar) if args.calendar else {}
+    clusters, undated = cluster(read_captures(paths, args.workers), timedelta(minutes=args.gap_minutes),
+                                args.radius)
+
+    matched = 0
+    for shoot in clusters:
+        category = calendar.get(shoot.night)
+        where = ""
+        if shoot.latitude is not None:
+            away = distance((shoot.latitude, shoot.longitude), PUB_LOCATION)
+            where = " at the pub" if away <= args.radius else f" {away / 1000:.1f} km away"
+            if away > args.radius:
+                category = None
+        label = f"→ {category}" if category else "→ needs review"
+        matched += len(shoot.captures) if category else 0
+        print(f"\n📸 {shoot.night} {shoot.start:%H:%M}-{shoot.end:%H:%M}{where}: "
+              f"{len(shoot.captures)} photos {label}")
+        for capture in shoot.captures[:3]:
+            print(f"  {os.path.basename(capture.path)}")
+        if len(shoot.captures) > 3:
+            print(f"  ... and {len(shoot.captures) - 3} more")
+    if undated:
+        print(f"\n⚠️ {len(undated)} photos have no capture time")
+    print(f"\n{len(paths)} photos in {len(clusters)} shoots, {matched} categorised from the calendar")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Duplicate Photo Detection for The Anchor Pub
+Finds exact and near-identical images (burst frames from event shoots) with
+perceptual hashes, so they can be reported or skipped before copying
+
+Requires Pillow and NumPy: pip install pillow numpy
+"""
+
+import argparse
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from image_ingest import IMAGE_EXTENSIONS, file_digest, scan_images
+
+# Default Hamming distance (out of 64 bits) for two photos to count as the same shot
+PHASH_THRESHOLD = 8
+DHASH_THRESHOLD = 10
+
+ImageHash = namedtuple("ImageHash", "path digest phash dhash pixels size")
+
+
+def _require_imaging():
+    try:
+        import numpy
+        from PIL import Image
+    except ImportError as error:
+        raise SystemExit(f"❌ {error.name} is required for duplicate detection: pip install pillow numpy")
+    return numpy, Image
+
+
+def _thumbnails(task):
+    """(path, digest, small, tiny, pixels): content hash and greyscale 32x32 and 9x8 thumbnails
+
+    task is (path, digest); the digest is only worked out here, in the
+    worker, when the caller doesn't already know it. JPEGs are decoded at
+    reduced size.
+
+    Returns None thumbnails for files Pillow can't decode or refuses as
+    decompression bombs, which then only take part in exact (content hash)
+    matching.
+    """
+    numpy, Image = _require_imaging()
+    path, digest = task
+    if digest is None:
+        digest = file_digest(path)
+    try:
+        with Image.open(path) as image:
+            pixels = image.width * image.height
+            # JPEG draft mode decodes at 1/2, 1/4 or 1/8 scale: far less work than a full decode
+            image.draft("L", (64, 64))
+            grey = image.convert("L")
+            small = numpy.asarray(grey.resize((32, 32), Image.Resampling.BILINEAR), dtype=numpy.uint8)
+            tiny = numpy.asarray(grey.resize((9, 8), Image.Resampling.BILINEAR), dtype=numpy.uint8)
+    except (OSError, Image.DecompressionBombError):
+        return path, digest, None, None, 0
+    return path, digest, small, tiny, pixels
+
+
+def _dct_matrix(numpy, n):
+    k = numpy.arange(n)
+    matrix = numpy.cos(numpy.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n))
+    matrix[0] *= 1 / numpy.sqrt(2)
+    return matrix * numpy.sqrt(2 / n)
+
+
+def _pack(numpy, bits):
+    """Pack an (N, 64) boolean array into N Python ints"""
+    packed = numpy.packbits(bits.astype(numpy.uint8), axis=1)
+    return [int.from_bytes(row.tobytes(), "big") for row in packed]
+
+
+def perceptual_hashes(smalls, tinies):
+    """pHash and dHash for a whole batch at once
+
+    pHash: 2-D DCT of each 32x32 thumbnail (two batched matrix products),
+    low 8x8 frequencies compared with their median. dHash: each pixel of the
+    9x8 thumbnail compared with its right-hand neighbour.
+    """
+    numpy, _ = _require_imaging()
+    if not smalls:
+        return [], []
+    stack = numpy.stack(smalls).astype(numpy.float32)
+    dct = _dct_matrix(numpy, 32).astype(numpy.float32)
+    freq = numpy.einsum("ij,njk,lk->nil", dct, stack, dct)[:, :8, :8].reshape(len(smalls), 64)
+    median = numpy.median(freq[:, 1:], axis=1, keepdims=True)
+    phashes = _pack(numpy, freq > median)
+
+    tiny = numpy.stack(tinies).astype(numpy.int16)
+    dhashes = _pack(numpy, (tiny[:, :, 1:] > tiny[:, :, :-1]).reshape(len(tinies), 64))
+    return phashes, dhashes
+
+
+def hash_images(paths, workers=None, cache=None):
+    """ImageHash for every path; decoding runs in a process pool
+
+    With a cache (the ingest Manifest), sources whose size and mtime match
+    the last run reuse their stored hashes instead of being read again, and
+    new hashes are recorded there. Content hashes are worked out in the pool
+    alongside the thumbnails.
+    """
+    paths = list(paths)
+    stats = {path: os.stat(path) for path in paths}
+    known = {}
+    if cache is not None:
+        for path in paths:
+            stored = cache.image_hash(path, stats[path])
+            if stored is not None:
+                known[path] = ImageHash(path, *stored, stats[path].st_size)
+    # The content hash ingest stored for an unchanged source saves reading it again
+    todo = [(path, cache.known_digest(path, stats[path]) if cache is not None else None)
+            for path in paths if path not in known]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(todo) < 2:
+        thumbs = [_thumbnails(task) for task in todo]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            thumbs = list(pool.map(_thumbnails, todo, chunksize=8))
+    decoded = [t for t in thumbs if t[2] is not None]
+    phashes, dhashes = perceptual_hashes([t[2] for t in decoded], [t[3] for t in decoded])
+    perceptual = {t[0]: pair for t, pair in zip(decoded, zip(phashes, dhashes))}
+    for path, digest, _, _, pixels in thumbs:
+        phash, dhash = perceptual.get(path, (None, None))
+        known[path] = ImageHash(path, digest, phash, dhash, pixels, stats[path].st_size)
+        if cache is not None:
+            cache.record_image_hash(path, stats[path], *known[path][1:5])
+    return [known[path] for path in paths]
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance"""
+
+    def __init__(self):
+        self.root = None
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = (value, item, {})
+            return
+        node = self.root
+        while True:
+            distance = (node[0] ^ value).bit_count()
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = (value, item, {})
+                return
+            node = child
+
+    def search(self, value, radius):
+        """Items within radius of value"""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = (node[0] ^ value).bit_count()
+            if distance <= radius:
+                found.append(node[1])
+            for d, child in node[2].items():
+                if distance - radius <= d <= distance + radius:
+                    stack.append(child)
+        return found
+
+
+def _near(a, b, phash_threshold, dhash_threshold):
+    if a.digest == b.digest:
+        return True
+    if a.phash is None or b.phash is None:
+        return False
+    return ((a.phash ^ b.phash).bit_count() <= phash_threshold
+            and (a.dhash ^ b.dhash).bit_count() <= dhash_threshold)
+
+
+def group_duplicates(hashes, phash_threshold=PHASH_THRESHOLD, dhash_threshold=DHASH_THRESHOLD):
+    """Groups of identical or near-identical images, best copy first
+
+    Exact copies share a content hash. Near duplicates are found by a
+    BK-tree search on pHash and confirmed with dHash, and linked with
+    union-find, so the cost is close to linear in the number of photos.
+
+    Linking is transitive (A≈B≈C joins A and C however far apart they are),
+    so each linked set is then split around keepers: best copy first, every
+    image joins the first keeper it is itself close to, or becomes a keeper.
+    Every image in a group is therefore close to the group's first.
+    """
+    parent = list(range(len(hashes)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(a, b):
+        a, b = find(a), find(b)
+        if a != b:
+            parent[max(a, b)] = min(a, b)
+
+    by_digest = {}
+    tree = BKTree()
+    for i, h in enumerate(hashes):
+        if h.digest in by_digest:
+            union(i, by_digest[h.digest])
+            continue
+        by_digest[h.digest] = i
+        if h.phash is None:
+            continue
+        for j in tree.search(h.phash, phash_threshold):
+            if (hashes[j].dhash ^ h.dhash).bit_count() <= dhash_threshold:
+                union(i, j)
+        tree.add(h.phash, i)
+
+    linked = {}
+    for i in range(len(hashes)):
+        linked.setdefault(find(i), []).append(hashes[i])
+
+    groups = []
+    for members in linked.values():
+        if len(members) < 2:
+            continue
+        # Keep the highest-resolution, largest file of each group
+        clusters = []
+        for h in sorted(members, key=lambda h: (-h.pixels, -h.size, h.path)):
+            for cluster in clusters:
+                if _near(cluster[0], h, phash_threshold, dhash_threshold):
+                    cluster.append(h)
+                    break
+            else:
+                clusters.append([h])
+        groups.extend(cluster for cluster in clusters if len(cluster) > 1)
+    return groups
+
+
+def find_duplicates(paths, workers=None, cache=None, **thresholds):
+    """Map of every redundant image path to the copy worth keeping"""
+    redundant = {}
+    for group in group_duplicates(hash_images(paths, workers, cache), **thresholds):
+        for h in group[1:]:
+            redundant[h.path] = group[0].path
+    return redundant
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find duplicate and near-duplicate photos")
+    parser.add_argument("folders", nargs="+", help="folders of images to compare")
+    parser.add_argument("--threshold", type=int, default=PHASH_THRESHOLD,
+                        help=f"maximum pHash distance out of 64 bits (default {PHASH_THRESHOLD})")
+    parser.add_argument("--workers", type=int, help="decode processes (default: all cores)")
+    args = parser.parse_args()
+
+    paths = [entry.path for folder in args.folders for entry in scan_images(folder, IMAGE_EXTENSIONS)]
+    groups = group_duplicates(hash_images(paths, args.workers), phash_threshold=args.threshold)
+
+    wasted = 0
+    for group in groups:
+        print(f"\n✓ keep {os.path.basename(group[0].path)}")
+        for h in group[1:]:
+            wasted += h.size
+            print(f"  ✗ {os.path.basename(h.path)}")
+    print(f"\n{len(paths)} images, {sum(len(g) - 1 for g in groups)} duplicates in {len(groups)} groups "
+          f"({wasted / 1024 / 1024:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main()
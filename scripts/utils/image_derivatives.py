@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Web Derivatives for The Anchor Pub
+Turns renamed photos into web-ready files: optional 1:1 square crop,
+responsive widths, and JPEG/WebP/AVIF variants each encoded at the highest
+quality that still fits the size budget (binary search, not one fixed setting).
+Also converts originals browsers can't show (iPhone HEIC) to JPEG or WebP
+
+Requires Pillow: pip install pillow (and pillow-heif for HEIC)
+"""
+
+import argparse
+import io
+import os
+from collections import namedtuple
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from image_ingest import IMAGE_EXTENSIONS, scan_images
+
+# "Optimize file sizes (target: <200KB)"
+TARGET_BYTES = 200 * 1024
+
+# A subset of next.config.js deviceSizes
+WIDTHS = (640, 1080, 1920)
+
+FORMATS = ("avif", "webp", "jpeg")
+
+# Quality search range; below MIN_QUALITY artefacts show, so we accept going over budget
+MIN_QUALITY = 40
+MAX_QUALITY = 90
+
+EXTENSIONS = {"jpeg": ".jpg", "webp": ".webp", "avif": ".avif"}
+
+# Per-format encoder settings that don't affect the quality search
+ENCODER_OPTIONS = {
+    "jpeg": {"optimize": True, "progressive": True},
+    "webp": {"method": 4},
+    # speed 8 is several times faster than the default with little size cost
+    "avif": {"speed": 8},
+}
+
+# Full-size conversions of originals keep nearly all the detail for later editing
+TRANSCODE_QUALITY = 88
+
+# EXIF Orientation values that turn the photo on its side, swapping width and height
+EXIF_ORIENTATION = 0x0112
+ROTATED = (5, 6, 7, 8)
+
+Derivative = namedtuple("Derivative", "source path width format quality size over_budget")
+
+
+def _require_pillow():
+    try:
+        from PIL import Image, ImageOps, features
+    except ImportError:
+        raise SystemExit("❌ Pillow is required for derivatives: pip install pillow")
+    return Image, ImageOps, features
+
+
+def register_heif():
+    """Let Pillow open HEIC files when pillow-heif is installed; False otherwise"""
+    try:
+        from pillow_heif import register_heif_opener
+    except ImportError:
+        return False
+    register_heif_opener()
+    return True
+
+
+def available_formats(formats=FORMATS):
+    """Formats this Pillow build can write"""
+    _, _, features = _require_pillow()
+    return tuple(f for f in formats if f == "jpeg" or features.check(f))
+
+
+def encode_to_budget(image, fmt, target=TARGET_BYTES):
+    """(bytes, quality, over_budget) for the best quality that fits target"""
+    options = ENCODER_OPTIONS.get(fmt, {})
+
+    def encode(quality):
+        buffer = io.BytesIO()
+        image.save(buffer, fmt.upper(), quality=quality, **options)
+        return buffer.getvalue()
+
+    # Most resized photos fit at full quality, which settles it in one encode
+    data = encode(MAX_QUALITY)
+    if len(data) <= target:
+        return data, MAX_QUALITY, False
+
+    best = None
+    lo, hi = MIN_QUALITY, MAX_QUALITY - 1
+    while lo <= hi:
+        quality = (lo + hi) // 2
+        data = encode(quality)
+        if len(data) <= target:
+            best = (data, quality, False)
+            lo = quality + 1
+        else:
+            hi = quality - 1
+    if best is None:
+        best = (encode(MIN_QUALITY), MIN_QUALITY, True)
+    return best
+
+
+def output_path(source, out_dir, width, fmt, square=False):
+    stem = os.path.splitext(os.path.basename(source))[0]
+    suffix = "-square" if square else ""
+    return os.path.join(out_dir, f"{stem}{suffix}-{width}{EXTENSIONS[fmt]}")
+
+
+def stem_clashes(jobs):
+    """[(first, second)] for (source, out_dir) jobs whose derivatives would share names
+
+    Outputs are named from the source's stem alone, so hero.jpg and hero.png
+    in one folder would overwrite each other's files.
+    """
+    owners = {}
+    clashes = []
+    for source, out_dir in jobs:
+        stem = os.path.splitext(os.path.basename(source))[0].lower()
+        key = (os.path.normpath(out_dir), stem)
+        if key in owners:
+            clashes.append((owners[key], source))
+        else:
+            owners[key] = source
+    return clashes
+
+
+def derive(source, out_dir, widths=WIDTHS, formats=FORMATS, square=False, target=TARGET_BYTES):
+    """Write every derivative of one image; outputs newer than the source are kept as they are
+
+    Only the header is read to work out which outputs are due, so a rerun
+    with nothing stale never decodes the photo. Returns an empty list for
+    files Pillow can't decode or refuses as decompression bombs.
+    """
+    Image, ImageOps, _ = _require_pillow()
+    register_heif()
+    os.makedirs(out_dir, exist_ok=True)
+    source_mtime = os.stat(source).st_mtime_ns
+    results = []
+
+    try:
+        with Image.open(source) as opened:
+            width, height = opened.size
+            if opened.getexif().get(EXIF_ORIENTATION) in ROTATED:
+                width, height = height, width
+            if square:
+                width = height = min(width, height)
+            # Never upscale: widths wider than the photo collapse to its own width
+            sizes = sorted({min(w, width) for w in widths})
+            planned = [(w, fmt, output_path(source, out_dir, w, fmt, square)) for w in sizes for fmt in formats]
+            kept = {}
+            for _, _, path in planned:
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if st.st_mtime_ns >= source_mtime:
+                    kept[path] = st.st_size
+            if len(kept) < len(planned):
+                image = ImageOps.exif_transpose(opened)
+                image = image.convert("RGB")
+    except (OSError, Image.DecompressionBombError):
+        return results
+    if len(kept) == len(planned):
+        return [Derivative(source, path, w, fmt, None, kept[path], False) for w, fmt, path in planned]
+
+    if square:
+        side = min(image.size)
+        image = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+
+    for width in sizes:
+        resized = image
+        if width < image.width:
+            resized = image.resize((width, round(image.height * width / image.width)), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            path = output_path(source, out_dir, width, fmt, square)
+            if path in kept:
+                results.append(Derivative(source, path, width, fmt, None, kept[path], False))
+                continue
+            data, quality, over = encode_to_budget(resized, fmt, target)
+            with open(path, "wb") as f:
+                f.write(data)
+            results.append(Derivative(source, path, width, fmt, quality, len(data), over))
+    return results
+
+
+def transcode(source, dest, fmt, quality=TRANSCODE_QUALITY):
+    """Re-encode source as fmt at full size, turned upright; False if it can't be decoded
+
+    Decompression bombs count as undecodable, so the ingestor copies them as
+    they are instead of the whole batch stopping.
+
+    The EXIF block (capture time, camera) and colour profile are kept, minus
+    the orientation tag, which no longer applies once the pixels are rotated.
+    The file is written under a temporary name and moved into place, so an
+    interrupted run never leaves half an image behind.
+    """
+    Image, ImageOps, _ = _require_pillow()
+    register_heif()
+    partial = dest + ".part"
+    try:
+        with Image.open(source) as opened:
+            image = ImageOps.exif_transpose(opened)
+        exif = image.getexif()
+        exif.pop(0x0112, None)
+        if fmt == "jpeg" and image.mode not in ("RGB", "L"):
+            # JPEG has no alpha: flatten transparent PNGs onto white
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", rgba.size, "white")
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        options = dict(ENCODER_OPTIONS.get(fmt, {}), quality=quality, exif=exif.tobytes())
+        if image.info.get("icc_profile"):
+            options["icc_profile"] = image.info["icc_profile"]
+        image.save(partial, fmt.upper(), **options)
+    except (OSError, KeyError, ValueError, Image.DecompressionBombError):
+        if os.path.exists(partial):
+            os.unlink(partial)
+        return False
+    os.replace(partial, dest)
+    return True
+
+
+def _transcode(task):
+    return transcode(*task)
+
+
+def transcode_many(tasks, workers=None):
+    """Run (source, dest, format) transcodes in order, yielding True or False for each
+
+    Each worker holds one decoded photo at a time and at most two tasks per
+    worker are queued, so memory stays bounded however many files come in.
+    Yields False for everything if Pillow isn't installed.
+    """
+    tasks = list(tasks)
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        yield from (False for _ in tasks)
+        return
+
+    workers = min(workers or os.cpu_count() or 1, len(tasks) or 1)
+    if workers == 1:
+        for task in tasks:
+            yield _transcode(task)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.submit(_transcode, task))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _derive(args):
+    return derive(*args)
+
+
+def generate(jobs, widths=WIDTHS, formats=FORMATS, square=False, target=TARGET_BYTES, workers=None):
+    """Derive every (source, out_dir) job across a process pool; yields per-image result lists"""
+    formats = available_formats(formats)
+    tasks = [(source, out_dir, widths, formats, square, target) for source, out_dir in jobs]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            yield _derive(task)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(_derive, tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate responsive WebP/AVIF/JPEG derivatives")
+    parser.add_argument("folders", nargs="+", help="folders of images")
+    parser.add_argument("--out", required=True, help="where to write the derivatives")
+    parser.add_argument("--square", action="store_true", help="centre-crop to 1:1 first")
+    parser.add_argument("--widths", default=",".join(map(str, WIDTHS)), help="comma-separated widths")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="comma-separated formats")
+    parser.add_argument("--target-kb", type=int, default=TARGET_BYTES // 1024, help="size budget per file")
+    parser.add_argument("--workers", type=int, help="encoder processes (default: all cores)")
+    args = parser.parse_args()
+
+    # Several folders each get their own subfolder so same-named photos don't collide
+    jobs = []
+    for folder in args.folders:
+        out_dir = args.out
+        if len(args.folders) > 1:
+            out_dir = os.path.join(args.out, os.path.basename(os.path.normpath(folder)))
+        jobs.extend((entry.path, out_dir) for entry in scan_images(folder, IMAGE_EXTENSIONS))
+    clashes = stem_clashes(jobs)
+    if clashes:
+        raise SystemExit("❌ These images would overwrite each other's derivatives; rename one of each pair:\n"
+                         + "\n".join(f"  {a} and {b}" for a, b in clashes))
+    widths = tuple(int(w) for w in args.widths.split(","))
+    formats = tuple(args.formats.split(","))
+
+    written = 0
+    total = 0
+    for results in generate(jobs, widths, formats, args.square, args.target_kb * 1024, args.workers):
+        for result in results:
+            total += result.size
+            if result.quality is not None:
+                written += 1
+                flag = "  ⚠️ over budget" if result.over_budget else ""
+                print(f"  ✓ {os.path.basename(result.path)} q{result.quality} {result.size // 1024} KB{flag}")
+    print(f"\n{written} derivatives written for {len(jobs)} images ({total / 1024 / 1024:.1f} MB total)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,540 @@
+#!/usr/bin/env python3
+"""
+Image Ingestion Engine for The Anchor Pub
+Shared scanning, hashing and copying for the rename scripts: directories are
+streamed with os.scandir, files are hashed and placed by a thread pool, and
+identical photos are stored once
+"""
+
+import errno
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from repo_paths import ROOT_DIR
+from run_report import RunReport
+
+# Where photos are dropped and where renamed copies go by default
+ASSETS_DIR = os.path.join(ROOT_DIR, "assets", "images")
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".heic", ".png")
+
+# Event shoots exported from Photos / Lightroom, and iPhone UUID names
+SERIES_PATTERNS = [
+    ("nikki-manfadge", re.compile(r"Nikki Manfadge - (\d+)")),
+    ("tequila-tasting", re.compile(r"Tequila Tasting Night - (\d+)")),
+]
+UUID_PATTERN = re.compile(r"[A-F0-9]{8}-[A-F0-9]{4}")
+
+# Linux FICLONE ioctl: copy-on-write clone on btrfs/XFS
+FICLONE = 0x40049409
+
+# Block size for hashing and copying
+CHUNK_SIZE = 1024 * 1024
+
+# Kept in the output folder so each destination tracks its own state
+MANIFEST_NAME = ".ingest-manifest.sqlite"
+
+# Leading bytes of the formats photos arrive in; ISO-BMFF files (HEIC, AVIF) are told apart by brand
+MAGIC_NUMBERS = [(b"\xff\xd8\xff", "jpeg"), (b"\x89PNG\r\n\x1a\n", "png"), (b"GIF8", "gif")]
+HEIF_BRANDS = {b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"mif1", b"msf1"}
+AVIF_BRANDS = {b"avif", b"avis"}
+
+# The format an output file name promises
+EXTENSION_FORMATS = {
+    ".jpg": "jpeg", ".jpeg": "jpeg", ".png": "png", ".gif": "gif",
+    ".webp": "webp", ".heic": "heic", ".heif": "heic", ".avif": "avif",
+}
+
+# Trailing "-007" counters and "-3fa9c2" disambiguators on generated names
+NAME_SUFFIX = re.compile(r"(-\d+|-v\d+|-[0-9a-f]{6,})+$")
+
+# Running number in a generated name, before any "-3fa9c2" disambiguator
+NAME_NUMBER = re.compile(r"-(\d+)(?:-[0-9a-f]{6,})?\.\w+$")
+
+Job = namedtuple("Job", "source dest label")
+Result = namedtuple("Result", "job action size digest")
+
+# The name and path of a source file, for code written against scan_images' entries
+SourceEntry = namedtuple("SourceEntry", "name path")
+
+
+def match_series(filename):
+    """(series, number) for a numbered event shoot, or (None, None)"""
+    for series, pattern in SERIES_PATTERNS:
+        match = pattern.match(filename)
+        if match:
+            return series, int(match.group(1))
+    return None, None
+
+
+def uuid_stem(filename):
+    """Upper-case UUID an iPhone export is named after, or None"""
+    stem = filename.split("_")[0].split(".")[0].upper()
+    return stem if UUID_PATTERN.match(stem) else None
+
+
+def scan_images(directory, extensions=IMAGE_EXTENSIONS):
+    """Image entries in a directory, sorted by name, from a single scandir pass"""
+    try:
+        with os.scandir(directory) as it:
+            entries = [e for e in it if e.is_file() and e.name.lower().endswith(extensions)]
+    except FileNotFoundError:
+        return []
+    entries.sort(key=lambda e: e.name)
+    return entries
+
+
+def source_entries(paths):
+    """Entries for a given list of files, shaped and sorted like scan_images'"""
+    return sorted((SourceEntry(os.path.basename(path), path) for path in paths), key=lambda e: e.name)
+
+
+def sniff_format(path):
+    """Real format of an image from its first bytes, whatever its extension says, or None"""
+    with open(path, "rb") as f:
+        head = f.read(32)
+    for magic, fmt in MAGIC_NUMBERS:
+        if head.startswith(magic):
+            return fmt
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    if head[4:8] == b"ftyp":
+        major = head[8:12]
+        compatible = {head[i:i + 4] for i in range(16, len(head) - 3, 4)}
+        # AVIF files list mif1 too, so the AVIF brands win
+        if major in AVIF_BRANDS or (major not in HEIF_BRANDS and compatible & AVIF_BRANDS):
+            return "avif"
+        if major in HEIF_BRANDS or compatible & HEIF_BRANDS:
+            return "heic"
+    return None
+
+
+def needs_transcode(source, dest):
+    """Target format when source's real format doesn't match dest's extension, else None"""
+    wanted = EXTENSION_FORMATS.get(os.path.splitext(dest)[1].lower())
+    actual = sniff_format(source)
+    if wanted is None or actual is None or actual == wanted:
+        return None
+    return wanted
+
+
+def warn_unconverted(ingestor):
+    """Point out sources that went out under a misleading extension because they couldn't be decoded"""
+    if ingestor.unconverted:
+        print(f"  ⚠️ {len(ingestor.unconverted)} images could not be converted and were copied as they are "
+              "(HEIC needs: pip install pillow pillow-heif)")
+
+
+def file_digest(path):
+    """BLAKE2b content hash of a file"""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _reflink(source, dest):
+    import fcntl
+
+    with open(source, "rb") as src, open(dest, "wb") as dst:
+        fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    shutil.copystat(source, dest)
+
+
+def place_file(source, dest, mode="auto"):
+    """Put source at dest, returning how it was done
+
+    auto    reflink where the filesystem supports it, otherwise copy
+    reflink same as auto
+    link    hard link (shares the inode, so never edit the output in place)
+    copy    plain copy with metadata
+    """
+    if os.path.lexists(dest):
+        os.unlink(dest)
+
+    if mode == "link":
+        try:
+            os.link(source, dest)
+            return "link"
+        except OSError as error:
+            if error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP):
+                raise
+
+    if mode in ("auto", "reflink") and sys.platform.startswith("linux"):
+        try:
+            _reflink(source, dest)
+            return "reflink"
+        except (OSError, ImportError):
+            if os.path.lexists(dest):
+                os.unlink(dest)
+
+    shutil.copy2(source, dest)
+    return "copy"
+
+
+class Manifest:
+    """What was ingested last time: source size/mtime/hash and where it went
+
+    With full set every source is hashed and placed again, but the rows are
+    kept, so names stay owned and outputs of vanished sources are still pruned.
+    """
+
+    def __init__(self, path, full=False):
+        self.path = path
+        self.full = full
+        self.db = sqlite3.connect(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " source TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+            " digest TEXT, dest TEXT)"
+        )
+        self.rows = {row[0]: row for row in self.db.execute("SELECT source, size, mtime_ns, digest, dest FROM files")}
+        # Perceptual hashes for duplicate detection (hex, or NULL for files Pillow can't decode)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS image_hashes ("
+            " source TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+            " digest TEXT, phash TEXT, dhash TEXT, pixels INTEGER)"
+        )
+        self.hashes = {row[0]: row for row in self.db.execute("SELECT * FROM image_hashes")}
+        # Only rows that changed are written back, so a small batch doesn't rewrite the whole table
+        self.dirty = set()
+        self.deleted = set()
+        self.dirty_hashes = set()
+
+    def unchanged(self, job, st):
+        """Digest of a source whose size, mtime and destination all match the last run"""
+        row = None if self.full else self.rows.get(job.source)
+        if row and row[1] == st.st_size and row[2] == st.st_mtime_ns and row[4] == job.dest:
+            return row[3]
+        return None
+
+    def known_digest(self, source, st):
+        """Digest from the last run if the source itself hasn't changed"""
+        row = None if self.full else self.rows.get(source)
+        if row and row[1] == st.st_size and row[2] == st.st_mtime_ns:
+            return row[3]
+        return None
+
+    def image_hash(self, source, st):
+        """(digest, phash, dhash, pixels) from the last run if the source hasn't changed, else None"""
+        row = None if self.full else self.hashes.get(source)
+        if row and row[1] == st.st_size and row[2] == st.st_mtime_ns:
+            phash, dhash = (None if value is None else int(value, 16) for value in row[4:6])
+            return row[3], phash, dhash, row[6]
+        return None
+
+    def record_image_hash(self, source, st, digest, phash, dhash, pixels):
+        phash, dhash = (None if value is None else f"{value:016x}" for value in (phash, dhash))
+        row = (source, st.st_size, st.st_mtime_ns, digest, phash, dhash, pixels)
+        if self.hashes.get(source) != row:
+            self.hashes[source] = row
+            self.dirty_hashes.add(source)
+
+    def seen(self, source, st):
+        """Whether a source was ingested last time exactly as it is now"""
+        row = self.rows.get(source)
+        return bool(row) and row[1] == st.st_size and row[2] == st.st_mtime_ns
+
+    def previous_dest(self, source, st):
+        """Where a source went last time if it hasn't changed since (always None with full)"""
+        if self.full or not self.seen(source, st):
+            return None
+        return self.rows[source][4]
+
+    def _set(self, source, row):
+        if self.rows.get(source) != row:
+            self.rows[source] = row
+            self.dirty.add(source)
+            self.deleted.discard(source)
+
+    def record(self, job, st, digest):
+        self._set(job.source, (job.source, st.st_size, st.st_mtime_ns, digest, job.dest))
+
+    def mark_stale(self, source):
+        """Keep the row (so the output name stays claimed) but process the source again next run"""
+        row = self.rows.get(source)
+        if row:
+            self._set(source, row[:2] + (-1,) + row[3:])
+
+    def forget(self, source):
+        if self.rows.pop(source, None) is not None:
+            self.deleted.add(source)
+            self.dirty.discard(source)
+        self.hashes.pop(source, None)
+        self.dirty_hashes.discard(source)
+
+    def save(self):
+        with self.db:
+            deleted = [(source,) for source in self.deleted]
+            self.db.executemany("DELETE FROM files WHERE source = ?", deleted)
+            self.db.executemany("DELETE FROM image_hashes WHERE source = ?", deleted)
+            self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)",
+                                [self.rows[source] for source in self.dirty])
+            self.db.executemany("INSERT OR REPLACE INTO image_hashes VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                [self.hashes[source] for source in self.dirty_hashes])
+        self.dirty.clear()
+        self.deleted.clear()
+        self.dirty_hashes.clear()
+
+    def close(self):
+        self.db.close()
+
+
+class NameIndex:
+    """Hands out unique, stable output names without probing the filesystem
+
+    Each destination folder is listed once (one scandir) the first time it
+    is used; after that every claim is a dictionary lookup under a lock, so
+    parallel workers can share one index. A source keeps the name it was
+    given last time (from the manifest) whatever name it asks for now,
+    with only the extension following the request, and a clash is
+    resolved with a suffix derived from the source file name rather than
+    from run order, so names never shuffle between runs.
+
+    A file already on disk that no manifest row owns (the first run against
+    an existing output tree, or one whose manifest was lost) goes to the
+    source with the same content; only a different photo gets a suffix.
+    """
+
+    def __init__(self, manifest=None):
+        self.lock = threading.Lock()
+        self.taken = {}
+        self.previous = {}
+        self.owners = {}
+        # Paths of unowned files on disk, by (directory, lower-case name), and source digests worked out for them
+        self.unowned = {}
+        self.digests = {}
+        if manifest is not None:
+            for source, row in manifest.rows.items():
+                self.previous[source] = row[4]
+                self.owners[row[4]] = source
+
+    def _folder(self, directory):
+        names = self.taken.get(directory)
+        if names is None:
+            names = {}
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        owner = self.owners.get(entry.path)
+                        names[entry.name.lower()] = owner
+                        if owner is None and entry.is_file():
+                            self.unowned[directory, entry.name.lower()] = entry.path
+            except FileNotFoundError:
+                pass
+            self.taken[directory] = names
+        return names
+
+    def _free(self, directory, names, name, source):
+        """Whether name can go to source: unclaimed, already its own, or an unowned copy of the same photo"""
+        key = name.lower()
+        owner = names.get(key, source)
+        if owner is None and (directory, key) in self.unowned:
+            path = self.unowned[directory, key]
+            if source not in self.digests:
+                self.digests[source] = file_digest(source)
+            if os.path.getsize(path) == os.path.getsize(source) and file_digest(path) == self.digests[source]:
+                del self.unowned[directory, key]
+                owner = source
+        return owner == source
+
+    @staticmethod
+    def family(name):
+        stem, ext = os.path.splitext(name)
+        return NAME_SUFFIX.sub("", stem).lower() + ext.lower()
+
+    def claim(self, directory, name, source):
+        """Reserve a file name in directory for source and return it"""
+        with self.lock:
+            names = self._folder(directory)
+
+            previous = self.previous.get(source)
+            if previous and os.path.dirname(previous) == directory:
+                # The extension decides what the file is converted to, so that follows the request
+                kept = os.path.splitext(os.path.basename(previous))[0] + os.path.splitext(name)[1]
+                if self._free(directory, names, kept, source):
+                    names[kept.lower()] = source
+                    return kept
+
+            if self._free(directory, names, name, source):
+                names[name.lower()] = source
+                return name
+
+            stem, ext = os.path.splitext(name)
+            key = hashlib.blake2b(os.path.basename(source).encode(), digest_size=16).hexdigest()
+            for length in range(6, len(key) + 1, 2):
+                candidate = f"{stem}-{key[:length]}{ext}"
+                if self._free(directory, names, candidate, source):
+                    names[candidate.lower()] = source
+                    return candidate
+            raise ValueError(f"No free name for {source} in {directory}")
+
+
+class Ingestor:
+    """Hashes and places a batch of jobs across a thread pool
+
+    Jobs whose sources have identical content are written once; later
+    copies are hard-linked to the first output (or copied if linking is
+    not possible), so a burst of duplicate exports costs no extra space.
+
+    A source whose real format (from its magic bytes) doesn't match the
+    output's extension, typically an iPhone HEIC queued as ".jpg", is
+    transcoded in a process pool instead of copied.
+
+    With a manifest, sources whose size and mtime match the last run are
+    neither hashed nor copied, and outputs whose sources have disappeared
+    (or been renamed) are removed.
+
+    Hashing, copying and transcoding are timed as the hash, copy and
+    encode phases of the run report, with one file line per source hashed
+    and per output placed.
+    """
+
+    def __init__(self, mode="auto", workers=None, manifest=None, transcode_workers=None, report=None):
+        self.mode = mode
+        # Placement is I/O bound, so use more threads than cores
+        self.workers = workers or min(32, (os.cpu_count() or 1) * 4)
+        # Decoding is CPU and memory bound: one process per core
+        self.transcode_workers = transcode_workers
+        self.manifest = manifest
+        self.report = report or RunReport()
+        # What the last run removed or couldn't convert; reset by each run
+        self.removed = []
+        self.unconverted = []
+
+    def _hash(self, job):
+        return file_digest(job.source)
+
+    def _place(self, job, digest):
+        os.makedirs(os.path.dirname(job.dest), exist_ok=True)
+        action = place_file(job.source, job.dest, self.mode)
+        return Result(job, action, os.path.getsize(job.dest), digest)
+
+    def _transcode(self, items):
+        """Convert (job, digest, format) items; sources Pillow can't decode are copied as they are"""
+        try:
+            from image_derivatives import transcode_many
+        except ImportError:
+            transcode_many = None
+        if transcode_many is None:
+            self.unconverted.extend(job for job, _, _ in items)
+            return [self._place(job, digest) for job, digest, _ in items]
+
+        for job, _, _ in items:
+            os.makedirs(os.path.dirname(job.dest), exist_ok=True)
+        tasks = [(job.source, job.dest, fmt) for job, _, fmt in items]
+        results = []
+        for (job, digest, fmt), converted in zip(items, transcode_many(tasks, self.transcode_workers)):
+            if converted:
+                results.append(Result(job, f"transcoded-{fmt}", os.path.getsize(job.dest), digest))
+            else:
+                self.unconverted.append(job)
+                results.append(self._place(job, digest))
+        return results
+
+    def _place_duplicate(self, job, original, digest):
+        if os.path.abspath(job.dest) == os.path.abspath(original.dest):
+            return Result(job, "duplicate-skipped", os.path.getsize(job.dest), digest)
+        os.makedirs(os.path.dirname(job.dest), exist_ok=True)
+        action = place_file(original.dest, job.dest, "link")
+        return Result(job, f"duplicate-{action}", os.path.getsize(job.dest), digest)
+
+    def _prune(self, jobs):
+        """Delete outputs left behind by sources that are gone or now go elsewhere"""
+        manifest = self.manifest
+        wanted = {job.dest for job in jobs}
+        queued = {job.source for job in jobs}
+        for source, row in list(manifest.rows.items()):
+            dest = row[4]
+            if source in queued or not os.path.exists(source):
+                if source not in queued:
+                    manifest.forget(source)
+                if dest not in wanted and os.path.lexists(dest):
+                    os.unlink(dest)
+                    self.removed.append(dest)
+                    self.report.note("removed", "source gone", dest=dest)
+
+    def _log(self, result):
+        phase = "encode" if result.action.startswith("transcoded") else "copy"
+        self.report.file(phase, result.action, result.size, result.job.source, result.job.dest,
+                         label=result.job.label)
+
+    def run(self, jobs):
+        """Place every job and return one Result per job, in job order"""
+        jobs = list(jobs)
+        manifest = self.manifest
+        report = self.report
+        self.removed = []
+        self.unconverted = []
+        results = {}
+        digests = {}
+        pending = []
+
+        with ThreadPoolExecutor(self.workers) as pool:
+            with report.phase("hash"):
+                stats = {job.source: os.stat(job.source) for job in jobs}
+                for job in jobs:
+                    st = stats[job.source]
+                    digest = manifest.unchanged(job, st) if manifest else None
+                    if digest is not None and os.path.exists(job.dest):
+                        digests[id(job)] = digest
+                        results[id(job)] = Result(job, "unchanged", st.st_size, digest)
+                        self._log(results[id(job)])
+                    else:
+                        pending.append(job)
+
+                def digest_for(job):
+                    known = manifest.known_digest(job.source, stats[job.source]) if manifest else None
+                    return (known, "cached") if known else (self._hash(job), "hashed")
+
+                for job, (digest, action) in zip(pending, pool.map(digest_for, pending)):
+                    digests[id(job)] = digest
+                    report.file("hash", action, stats[job.source].st_size, job.source)
+
+            with report.phase("copy"):
+                # Unchanged outputs count as already written for duplicate detection
+                first = {digests[id(job)]: job for job in jobs if id(job) in results}
+                primaries = []
+                duplicates = []
+                for job in pending:
+                    digest = digests[id(job)]
+                    if digest in first:
+                        duplicates.append((job, first[digest], digest))
+                    else:
+                        first[digest] = job
+                        primaries.append((job, digest))
+
+                formats = list(pool.map(lambda item: needs_transcode(item[0].source, item[0].dest), primaries))
+                conversions = [(job, digest, fmt) for (job, digest), fmt in zip(primaries, formats) if fmt]
+                copies = [item for item, fmt in zip(primaries, formats) if not fmt]
+
+                for result in pool.map(lambda item: self._place(*item), copies):
+                    results[id(result.job)] = result
+                    self._log(result)
+            if conversions:
+                with report.phase("encode"):
+                    for result in self._transcode(conversions):
+                        results[id(result.job)] = result
+                        self._log(result)
+            with report.phase("copy"):
+                for result in pool.map(lambda item: self._place_duplicate(*item), duplicates):
+                    results[id(result.job)] = result
+                    self._log(result)
+
+                if manifest:
+                    self._prune(jobs)
+                    for job in jobs:
+                        manifest.record(job, stats[job.source], digests[id(job)])
+                    # Unconverted files are retried next time, in case a decoder has been installed since
+                    for job in self.unconverted:
+                        manifest.mark_stale(job.source)
+                    manifest.save()
+        return [results[id(job)] for job in jobs]
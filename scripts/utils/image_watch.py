@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Photo Watcher for The Anchor Pub
+Watches the folders photos are dropped into (inotify on Linux, polling
+elsewhere), waits for each upload to finish, and hands finished files to a
+bounded queue so the rename pipeline only ever sees new or changed photos
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+
+from image_ingest import IMAGE_EXTENSIONS
+
+# inotify(7) event bits
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# A file is treated as finished once it has gone this long without changing
+SETTLE_SECONDS = 2.0
+
+# How often the polling watcher lists the folders
+POLL_SECONDS = 2.0
+
+# Finished files waiting for the pipeline; when it is full the watcher stops reading events
+QUEUE_SIZE = 256
+
+
+def wanted(name):
+    """Image files only, skipping hidden files such as macOS "._" sidecars and upload temporaries"""
+    return not name.startswith(".") and name.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def list_folder(directory):
+    """{path: (size, mtime_ns)} for every wanted file in a folder"""
+    found = {}
+    try:
+        with os.scandir(directory) as it:
+            for entry in it:
+                if wanted(entry.name) and entry.is_file():
+                    st = entry.stat()
+                    found[entry.path] = (st.st_size, st.st_mtime_ns)
+    except FileNotFoundError:
+        pass
+    return found
+
+
+class InotifyWatcher:
+    """Reports files written or moved into the watched folders, straight from the kernel"""
+
+    kind = "inotify"
+
+    def __init__(self, directories):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = libc.inotify_init1(IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.folders = {}
+        for directory in directories:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(error, f"cannot watch {directory}")
+            self.folders[wd] = directory
+
+    def changes(self, timeout):
+        """Paths touched since the last call (waiting up to timeout), or None if events were lost"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as error:
+            if error.errno == errno.EINTR:
+                return []
+            raise
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode(errors="surrogateescape")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if mask & IN_ISDIR or wd not in self.folders or not wanted(name):
+                continue
+            paths.append(os.path.join(self.folders[wd], name))
+        return paths
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """The same reports from listing each folder every few seconds, for systems without inotify"""
+
+    kind = "polling"
+
+    def __init__(self, directories, interval=POLL_SECONDS):
+        self.directories = list(directories)
+        self.interval = interval
+        self.last = self._snapshot()
+
+    def _snapshot(self):
+        found = {}
+        for directory in self.directories:
+            found.update(list_folder(directory))
+        return found
+
+    def changes(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        current = self._snapshot()
+        paths = [path for path, state in current.items() if self.last.get(path) != state]
+        self.last = current
+        return paths
+
+    def close(self):
+        pass
+
+
+def open_watcher(directories, poll=False):
+    """inotify where the platform has it, otherwise polling"""
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(directories)
+        except OSError as error:
+            print(f"⚠️ inotify unavailable ({error}); polling every {POLL_SECONDS:g}s instead")
+    return PollingWatcher(directories)
+
+
+class Debouncer:
+    """Holds back files until they stop changing, so half-uploaded photos are never ingested"""
+
+    def __init__(self, settle=SETTLE_SECONDS):
+        self.settle = settle
+        self.pending = {}
+
+    def touch(self, path, now):
+        self.pending[path] = (self._state(path), now)
+
+    @staticmethod
+    def _state(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def ready(self, now):
+        """Files that have settled since they were last touched"""
+        done = []
+        for path, (state, since) in list(self.pending.items()):
+            if now - since < self.settle:
+                continue
+            current = self._state(path)
+            if current is None:
+                # Deleted or renamed away (a temporary upload name, for instance)
+                del self.pending[path]
+            elif current != state or current[0] == 0:
+                self.pending[path] = (current, now)
+            else:
+                del self.pending[path]
+                done.append(path)
+        return done
+
+
+class PhotoWatcher(threading.Thread):
+    """Feeds finished, not yet ingested photos from directories into a bounded queue
+
+    Files already in the folders when it starts (or after the kernel drops
+    events) are compared with the manifest via seen(path, st), so anything
+    dropped while nothing was watching is picked up without reprocessing
+    the rest. When the queue is full the thread blocks, and new events wait
+    in the kernel until the pipeline catches up.
+    """
+
+    def __init__(self, directories, seen, settle=SETTLE_SECONDS, poll=False, size=QUEUE_SIZE):
+        super().__init__(name="photo-watcher", daemon=True)
+        self.directories = [d for d in directories if os.path.isdir(d)]
+        self.seen = seen
+        self.debouncer = Debouncer(settle)
+        self.queue = queue.Queue(size)
+        self.stopping = threading.Event()
+        self.watcher = open_watcher(self.directories, poll)
+
+    def catch_up(self):
+        """Queue files that changed while nothing was watching"""
+        now = time.monotonic()
+        for directory in self.directories:
+            for path in list_folder(directory):
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if not self.seen(path, st):
+                    self.debouncer.touch(path, now)
+
+    def run(self):
+        try:
+            self.catch_up()
+            tick = self.debouncer.settle / 2
+            while not self.stopping.is_set():
+                paths = self.watcher.changes(tick)
+                now = time.monotonic()
+                if paths is None:
+                    print("⚠️ Missed some file events; rescanning the watched folders")
+                    self.catch_up()
+                    continue
+                for path in paths:
+                    self.debouncer.touch(path, now)
+                for path in self.debouncer.ready(now):
+                    self.queue.put(path)
+        finally:
+            self.watcher.close()
+
+    def stop(self):
+        self.stopping.set()
+
+    def batch(self, limit, timeout=None):
+        """Up to limit finished paths: waits for the first, then takes whatever else is already queued"""
+        try:
+            paths = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+        while len(paths) < limit:
+            try:
+                paths.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return paths
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Blog Link Checker for The Anchor Pub
+Finds internal links and images in blog markdown that are broken or go
+through a redirect, with file and line, entirely offline: the site's routes,
+files and redirect rules are loaded once and every link is a lookup
+"""
+
+import argparse
+import os
+import re
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote, urljoin, urlsplit
+
+from blog_index import split_front_matter
+from check_redirects import ROOT_DIR, load_redirects, served_rules
+from site_routes import RouteTable
+from url_replay import APEX_HOST, CANONICAL_HOST, ORIGIN, Resolver, display, load_tracking_params
+
+# Markdown links and images, and HTML href/src attributes
+LINK_PATTERNS = [
+    re.compile(r"!?\[(?:[^\]\\]|\\.)*\]\(\s*<?([^)\s>]+)>?(?:\s+\"[^\"]*\")?\s*\)"),
+    re.compile(r"""\b(?:href|src)\s*=\s*["']([^"']+)["']""", re.IGNORECASE),
+]
+
+FENCE = re.compile(r"^\s*(```|~~~)")
+
+# Schemes that never point at a page on this site
+SKIPPED_SCHEMES = ("mailto:", "tel:", "sms:", "javascript:", "data:")
+
+# Below this many files a process pool costs more than it saves
+PARALLEL_THRESHOLD = 200
+
+Link = namedtuple("Link", "file line column url")
+
+# status is one of: ok, redirect, broken
+Checked = namedtuple("Checked", "link status target hops")
+
+
+def extract_links(path):
+    """Every link in a markdown file's body, with 1-based line and column"""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        text = f.read()
+    front, body = split_front_matter(text)
+    # Line numbers count from the top of the file, front matter included
+    offset = text[:len(text) - len(body)].count("\n") if front else 0
+
+    links = []
+    in_fence = False
+    for number, line in enumerate(body.split("\n"), start=offset + 1):
+        if FENCE.match(line):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            continue
+        for pattern in LINK_PATTERNS:
+            for match in pattern.finditer(line):
+                links.append(Link(path, number, match.start(1) + 1, match.group(1)))
+    links.sort(key=lambda link: (link.line, link.column))
+    return links
+
+
+def internal_url(url, page):
+    """Absolute URL on this site for a link found on page, or None for external and non-page links"""
+    url = url.strip()
+    if not url or url.startswith("#") or url.lower().startswith(SKIPPED_SCHEMES):
+        return None
+    absolute = urljoin(page, url)
+    parts = urlsplit(absolute)
+    if parts.hostname not in (CANONICAL_HOST, APEX_HOST):
+        return None
+    return absolute.split("#", 1)[0]
+
+
+class LinkChecker:
+    """Route table plus redirect resolver, built once and shared by every link"""
+
+    def __init__(self, root=ROOT_DIR):
+        self.routes = RouteTable(root)
+        self.resolver = Resolver(served_rules(load_redirects(root)), load_tracking_params(root))
+
+    def check(self, link, slug):
+        """Checked for one link, or None if it doesn't point into the site"""
+        url = internal_url(link.url, f"{ORIGIN}/blog/{slug}")
+        if url is None:
+            return None
+        replay = self.resolver.resolve(url)
+        if replay.status in ("loop", "too-many-hops"):
+            return Checked(link, "broken", replay.final, replay.hops)
+        if replay.status == "external":
+            return Checked(link, "redirect", replay.final, replay.hops)
+        exists = self.routes.exists(unquote(urlsplit(replay.final).path or "/"))
+        if not exists:
+            return Checked(link, "broken", replay.final, replay.hops)
+        return Checked(link, "redirect" if replay.hops else "ok", replay.final, replay.hops)
+
+
+def scan(blog_dir, workers=None):
+    """{markdown path: [Link]} for every index.md, parsed across a process pool when there are many"""
+    paths = []
+    with os.scandir(blog_dir) as it:
+        for entry in it:
+            path = os.path.join(entry.path, "index.md")
+            if entry.is_dir() and os.path.isfile(path):
+                paths.append(path)
+    paths.sort()
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(paths) >= PARALLEL_THRESHOLD:
+        with ProcessPoolExecutor(workers) as pool:
+            return dict(zip(paths, pool.map(extract_links, paths, chunksize=16)))
+    return {path: extract_links(path) for path in paths}
+
+
+def check_blog(root=ROOT_DIR, workers=None):
+    """Every internal link in the blog, checked"""
+    checker = LinkChecker(root)
+    results = []
+    for path, links in scan(os.path.join(root, "content", "blog"), workers).items():
+        slug = os.path.basename(os.path.dirname(path))
+        for link in links:
+            result = checker.check(link, slug)
+            if result is not None:
+                results.append(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check internal links in blog markdown without a network")
+    parser.add_argument("--root", default=ROOT_DIR, help="repository root (default: this checkout)")
+    parser.add_argument("--redirects", action="store_true", help="also list links that go through a redirect")
+    parser.add_argument("--workers", type=int, help="parser processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    results = check_blog(args.root, args.workers)
+    broken = [r for r in results if r.status == "broken"]
+    redirected = [r for r in results if r.status == "redirect"]
+
+    for result in broken + (redirected if args.redirects else []):
+        link = result.link
+        where = f"{os.path.relpath(link.file, args.root)}:{link.line}:{link.column}"
+        if result.status == "broken":
+            via = f" (via {result.hops} redirects to {display(result.target)})" if result.hops else ""
+            print(f"{where}: ❌ broken link {link.url}{via}")
+        else:
+            print(f"{where}: ⚠️  {link.url} redirects to {display(result.target)}")
+
+    print(f"\n{len(results)} internal links: {len(broken)} broken, {len(redirected)} through a redirect",
+          file=sys.stderr)
+    return 1 if broken else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
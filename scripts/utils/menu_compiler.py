@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Menu Compiler for The Anchor Pub
+Flattens content/menu/{drinks,food}.json into slug-indexed artifacts holding
+only the fields the menu pages render. Drinks that left the menu since the
+last build get /drinks/<slug> redirects generated for them, and drinks
+redirects that hide a real page are flagged
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import unicodedata
+
+from check_redirects import REDIRECT_FILES, load_redirects, served_rules
+from redirect_matcher import RedirectMatcher
+from repo_paths import ROOT_DIR, write_if_changed
+from site_routes import RouteTable
+
+MENU_DIR = os.path.join(ROOT_DIR, "content", "menu")
+MENUS = ("drinks", "food")
+
+# Where the compiled menus go: next to their sources, under a name lib/menu-parser.ts never reads
+ARTIFACT_SUFFIX = ".index.json"
+
+# Bump when the shape of the artifact changes
+ARTIFACT_VERSION = 1
+
+DRINKS_REDIRECTS = "config/redirects/drinks-redirects.json"
+DRINKS_PREFIX = "/drinks/"
+
+# Page-level fields lib/menu-parser.ts's MenuData declares, besides categories
+MENU_FIELDS = ("title", "description", "lastUpdated", "kitchenHours", "specialOffers", "responsibleDrinking")
+CATEGORY_FIELDS = ("id", "title", "emoji", "description")
+SECTION_FIELDS = ("title", "description", "style", "highlight")
+
+# MenuItem fields: the first three are always kept, the rest only when set
+ITEM_FIELDS = ("name", "price", "description")
+OPTIONAL_ITEM_FIELDS = ("vegetarian", "special", "allergens")
+
+
+def slugify(name):
+    """URL slug for a menu item: "Giorgio & Gianni Prosecco" -> "giorgio-and-gianni-prosecco" """
+    text = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode()
+    text = text.lower().replace("&", " and ")
+    text = re.sub(r"['’]", "", text)
+    return re.sub(r"[^a-z0-9]+", "-", text).strip("-")
+
+
+def _pick(data, fields):
+    return {field: data[field] for field in fields if data.get(field) not in (None, "", [], {})}
+
+
+def compile_menu(menu):
+    """(artifact, problems) for a parsed menu
+
+    The artifact keeps the category → section structure, but sections list
+    item slugs and the items themselves sit in one slug-keyed table. Two
+    different items with the same slug are a problem: the second gets a
+    numbered slug so nothing is lost.
+    """
+    items = {}
+    problems = []
+    categories = []
+    for category in menu.get("categories", []):
+        sections = []
+        for section in category.get("sections", []):
+            slugs = []
+            for item in section.get("items", []):
+                entry = {field: item.get(field, "") for field in ITEM_FIELDS}
+                entry.update(_pick(item, OPTIONAL_ITEM_FIELDS))
+                slug = base = slugify(entry["name"])
+                n = 1
+                while slug in items and items[slug] != entry:
+                    n += 1
+                    slug = f"{base}-{n}"
+                if n > 1:
+                    problems.append(f"{entry['name']} ({category.get('id')} / {section.get('title')}) "
+                                    f"clashes with another item called {items[base]['name']}; indexed as {slug}")
+                items[slug] = entry
+                slugs.append(slug)
+            sections.append({**_pick(section, SECTION_FIELDS), "items": slugs})
+        categories.append({**_pick(category, CATEGORY_FIELDS), "sections": sections})
+
+    artifact = {"version": ARTIFACT_VERSION, **_pick(menu, MENU_FIELDS), "categories": categories, "items": items}
+    return artifact, problems
+
+
+def artifact_path(name, menu_dir=MENU_DIR):
+    return os.path.join(menu_dir, name + ARTIFACT_SUFFIX)
+
+
+def load_artifact(path):
+    """A previously compiled menu, or None if it's missing or from another version"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return artifact if artifact.get("version") == ARTIFACT_VERSION else None
+
+
+def menu_at(revision, path, root=ROOT_DIR):
+    """A menu file as it was at a git revision, or None if it didn't exist there
+
+    Raises SystemExit if the revision can't be read at all (unknown, or root
+    is not a git checkout), rather than quietly comparing with nothing.
+    """
+    relative = os.path.relpath(path, root).replace(os.sep, "/")
+    check = subprocess.run(["git", "rev-parse", "--verify", "--quiet", f"{revision}^{{commit}}"],
+                           cwd=root, capture_output=True, text=True)
+    if check.returncode != 0:
+        raise SystemExit(f"❌ Can't read revision {revision!r} in {root}: "
+                         f"{check.stderr.strip() or 'unknown revision'}")
+    result = subprocess.run(["git", "show", f"{revision}:{relative}"], cwd=root, capture_output=True, text=True)
+    if result.returncode != 0:
+        if "exists on disk, but not in" in result.stderr or "does not exist in" in result.stderr:
+            return None
+        raise SystemExit(f"❌ git show {revision}:{relative} failed: {result.stderr.strip()}")
+    return json.loads(result.stdout)
+
+
+def retired_redirects(before, after, matcher):
+    """Rules for drinks that were in before but not after and no served rule already catches"""
+    rules = []
+    for slug in sorted(set(before) - set(after)):
+        source = DRINKS_PREFIX + slug
+        if matcher.match(source) is None:
+            rules.append({"source": source, "destination": "/drinks", "permanent": True})
+    return rules
+
+
+def live_redirects(rules, routes):
+    """(rule, why) for drinks redirects that hide a real page of their own
+
+    Drinks have no pages of their own (app/drinks/[slug] sends every slug
+    back to /drinks), so /drinks/<slug> -> /drinks is right even for a drink
+    still on the menu; only a rule over a static route shadows something.
+    """
+    found = []
+    for rule in rules:
+        if rule.file != DRINKS_REDIRECTS or not rule.source.lower().startswith(DRINKS_PREFIX):
+            continue
+        slug = rule.source[len(DRINKS_PREFIX):].rstrip("/")
+        if ":" in slug or "/" in slug:
+            continue
+        route = routes.route_for(rule.source)
+        if route is not None and all(kind == "static" for kind, _ in route.segments):
+            found.append((rule, f"hides its own page ({os.path.relpath(route.file, routes.root)})"))
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile the menus into slug-indexed JSON and check drinks redirects")
+    parser.add_argument("--root", default=ROOT_DIR, help="repository root (default: this checkout)")
+    parser.add_argument("--since", metavar="REV",
+                        help="git revision to diff drinks against (default: the last compiled artifact)")
+    parser.add_argument("--write-redirects", action="store_true",
+                        help=f"append the generated rules for retired drinks to {DRINKS_REDIRECTS}")
+    parser.add_argument("--strict", action="store_true", help="fail when a drinks redirect hides a page")
+    args = parser.parse_args(argv)
+
+    menu_dir = os.path.join(args.root, "content", "menu")
+    failed = False
+    drinks = drinks_before = None
+    for name in MENUS:
+        source = os.path.join(menu_dir, name + ".json")
+        if not os.path.exists(source):
+            continue
+        with open(source, encoding="utf-8") as f:
+            menu = json.load(f)
+        output = artifact_path(name, menu_dir)
+        artifact, problems = compile_menu(menu)
+        data = json.dumps(artifact, separators=(",", ":"), ensure_ascii=False)
+        sizes = f"{len(artifact['items'])} items, {os.path.getsize(source) // 1024} KB -> {len(data.encode()) // 1024} KB"
+
+        if name == "drinks":
+            # The last drinks artifact is the baseline for retired drinks, so it is written after the diff
+            drinks = (output, data, artifact["items"], sizes)
+            if args.since:
+                old = menu_at(args.since, source, args.root)
+                drinks_before = compile_menu(old)[0]["items"] if old else None
+            else:
+                previous = load_artifact(output)
+                drinks_before = previous["items"] if previous else None
+        else:
+            print(f"{'✓' if write_if_changed(output, data) else '='} {name}: {sizes} ({output})")
+        for problem in problems:
+            print(f"  ❌ {problem}")
+        failed = failed or bool(problems)
+
+    if drinks is None:
+        return 1 if failed else 0
+    output, data, drinks_after, sizes = drinks
+
+    rules = load_redirects(args.root)
+    served = served_rules(rules)
+
+    generated = []
+    if drinks_before is None:
+        print("\nNo earlier drinks menu to compare with (compile once, or pass --since REV)")
+    else:
+        added = sorted(set(drinks_after) - set(drinks_before))
+        print(f"\nDrinks since {args.since or 'the last build'}: "
+              f"{len(added)} added, {len(set(drinks_before) - set(drinks_after))} retired")
+        generated = retired_redirects(drinks_before, drinks_after, RedirectMatcher(served))
+        for rule in generated:
+            print(f"  + {rule['source']} -> {rule['destination']}")
+        if generated and args.write_redirects:
+            path = os.path.join(args.root, DRINKS_REDIRECTS)
+            with open(path, encoding="utf-8") as f:
+                existing = json.load(f)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(existing + generated, f, indent=2, ensure_ascii=False)
+                f.write("\n")
+            print(f"  Appended {len(generated)} rules to {DRINKS_REDIRECTS}")
+            generated = []
+        elif generated:
+            print("  Run with --write-redirects to add them")
+
+    # Until the rules are written, keep the old artifact so the next run still sees those drinks as retired
+    if generated and not args.since:
+        print(f"= drinks: {sizes} ({output} kept until the redirects are written)")
+    else:
+        print(f"{'✓' if write_if_changed(output, data) else '='} drinks: {sizes} ({output})")
+
+    flagged = live_redirects(rules, RouteTable(args.root))
+    if flagged:
+        print(f"\n=== DRINKS REDIRECTS THAT HIDE A PAGE ({len(flagged)}) ===")
+        for rule, why in flagged:
+            print(f"{rule.source} -> {rule.destination}: {why}")
+    if DRINKS_REDIRECTS not in REDIRECT_FILES:
+        print(f"⚠️ {DRINKS_REDIRECTS} is not served by next.config.js")
+    return 1 if failed or (flagged and args.strict) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
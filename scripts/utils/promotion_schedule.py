@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Promotion Schedule for The Anchor Pub
+Validates content/managers-special-promotions.json (and the old single-month
+legacy file), reports overlapping and gapped date ranges, and compiles the
+schedule into a small sorted interval index: finding the promotion for a
+date is a binary search over it. Web variants of each promotion's image are
+generated alongside
+
+Image variants need Pillow: pip install pillow
+"""
+
+import argparse
+import bisect
+import calendar
+import datetime
+import heapq
+import json
+import os
+import re
+import sys
+from urllib.parse import quote
+
+from image_derivatives import FORMATS, TARGET_BYTES, WIDTHS, available_formats, generate
+from repo_paths import ROOT_DIR, write_if_changed
+
+PROMOTIONS_PATH = os.path.join(ROOT_DIR, "content", "managers-special-promotions.json")
+LEGACY_PATH = os.path.join(ROOT_DIR, "content", "managers-special-legacy.json")
+SCHEDULE_PATH = os.path.join(ROOT_DIR, "content", "managers-special-schedule.json")
+IMAGES_DIR = os.path.join(ROOT_DIR, "public", "images", "managers-special")
+IMAGES_PREFIX = "/images/managers-special/"
+
+# Bump when the shape of the schedule changes
+SCHEDULE_VERSION = 1
+
+# Variants go in a subfolder so getPromotionImage's "any image in the folder" fallback never picks one
+VARIANTS_FOLDER = "web"
+
+# Same preference order as getPromotionImage in lib/managers-special.ts
+HERO_FILES = ("hero.webp", "hero.jpg", "hero.png")
+FOLDER_IMAGES = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+
+# What encodeURIComponent leaves alone, besides letters, digits and "-_."
+URL_SAFE = "!~*'()"
+
+DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+# (field path, type) that isValidPromotion in types/managers-special.ts insists on
+REQUIRED_FIELDS = [
+    (("id",), str), (("startDate",), str), (("endDate",), str), (("imageFolder",), str), (("active",), bool),
+    (("spirit", "name"), str), (("spirit", "category"), str), (("spirit", "originalPrice"), str),
+    (("spirit", "specialPrice"), str), (("promotion", "headline"), str), (("promotion", "metaTitle"), str),
+    (("promotion", "metaDescription"), str),
+]
+
+
+def _field(data, path):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+
+def _date(text):
+    if not isinstance(text, str) or not DATE.match(text):
+        return None
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def _price(text):
+    try:
+        return float(text.lstrip("£"))
+    except (AttributeError, ValueError):
+        return None
+
+
+def validate(promotions):
+    """(errors, valid) for the promotions list: every problem found, and the entries the site would use"""
+    errors = []
+    valid = []
+    seen = set()
+    for n, promo in enumerate(promotions):
+        name = promo.get("id") if isinstance(promo, dict) else None
+        label = name or f"promotion #{n + 1}"
+        missing = [".".join(path) for path, kind in REQUIRED_FIELDS if not isinstance(_field(promo, path), kind)]
+        if missing:
+            errors.append(f"{label}: missing or wrong type: {', '.join(missing)} (the site skips it)")
+            continue
+        if name in seen:
+            errors.append(f"{label}: duplicate id")
+        seen.add(name)
+
+        start, end = _date(promo["startDate"]), _date(promo["endDate"])
+        if start is None or end is None:
+            errors.append(f"{label}: dates must be real YYYY-MM-DD dates "
+                          f"({promo['startDate']} to {promo['endDate']})")
+            continue
+        if start > end:
+            errors.append(f"{label}: ends ({end}) before it starts ({start})")
+            continue
+
+        spirit = promo["spirit"]
+        for field in ("originalPrice", "specialPrice"):
+            if not spirit[field].startswith("£"):
+                errors.append(f"{label}: {field} missing £ symbol ({spirit[field]})")
+        original, special = _price(spirit["originalPrice"]), _price(spirit["specialPrice"])
+        if original is not None and special is not None and special >= original:
+            errors.append(f"{label}: special price {spirit['specialPrice']} is not below {spirit['originalPrice']}")
+        valid.append(promo)
+    return errors, valid
+
+
+def check_ranges(promotions):
+    """(overlaps, gaps) between active promotions, by a sweep over them in start order
+
+    overlaps are (earlier, later) pairs whose ranges share a day; gaps are
+    (before, after, first missing day, last missing day).
+    """
+    active = sorted((p for p in promotions if p["active"]), key=lambda p: (p["startDate"], p["endDate"]))
+    overlaps = []
+    gaps = []
+    # Every promotion still running at the current start, ordered by end date
+    running = []
+    latest = None
+    for n, promo in enumerate(active):
+        start = _date(promo["startDate"])
+        while running and running[0][0] < promo["startDate"]:
+            heapq.heappop(running)
+        overlaps.extend((other, promo) for _, _, other in running)
+        if latest is not None and _date(latest["endDate"]) + datetime.timedelta(days=1) < start:
+            gaps.append((latest, promo, _date(latest["endDate"]) + datetime.timedelta(days=1),
+                         start - datetime.timedelta(days=1)))
+        heapq.heappush(running, (promo["endDate"], n, promo))
+        if latest is None or promo["endDate"] > latest["endDate"]:
+            latest = promo
+    return overlaps, gaps
+
+
+def build_intervals(promotions):
+    """Disjoint (start, end, id) days, sorted, with the site's rule for overlaps applied
+
+    getCurrentPromotion picks the covering promotion with the latest start
+    date, so wherever ranges overlap the later-starting one owns the day.
+    Boundaries are swept once with a heap of covering promotions.
+    """
+    active = sorted((p for p in promotions if p["active"]), key=lambda p: p["startDate"])
+    boundaries = sorted({_date(p["startDate"]) for p in active}
+                        | {_date(p["endDate"]) + datetime.timedelta(days=1) for p in active})
+    intervals = []
+    covering = []
+    next_promo = 0
+    for day, following in zip(boundaries, boundaries[1:]):
+        while next_promo < len(active) and _date(active[next_promo]["startDate"]) <= day:
+            promo = active[next_promo]
+            # Latest start first; ties go to the later entry in the file
+            heapq.heappush(covering, (-_date(promo["startDate"]).toordinal(), -next_promo, promo))
+            next_promo += 1
+        while covering and _date(covering[0][2]["endDate"]) < day:
+            heapq.heappop(covering)
+        if not covering:
+            continue
+        owner = covering[0][2]["id"]
+        last = following - datetime.timedelta(days=1)
+        if intervals and intervals[-1][2] == owner and intervals[-1][1] + datetime.timedelta(days=1) == day:
+            intervals[-1] = (intervals[-1][0], last, owner)
+        else:
+            intervals.append((day, last, owner))
+    return [(start.isoformat(), end.isoformat(), owner) for start, end, owner in intervals]
+
+
+def promotion_on(schedule, day):
+    """Id of the promotion running on day (a YYYY-MM-DD string), or None"""
+    i = bisect.bisect_right(schedule["starts"], day) - 1
+    if i >= 0 and day <= schedule["ends"][i]:
+        return schedule["ids"][i]
+    return None
+
+
+def promotion_image(folder):
+    """The image getPromotionImage would show for a folder, or None"""
+    for name in HERO_FILES:
+        if os.path.isfile(os.path.join(folder, name)):
+            return os.path.join(folder, name)
+    try:
+        names = sorted(n for n in os.listdir(folder) if n.lower().endswith(FOLDER_IMAGES))
+    except FileNotFoundError:
+        return None
+    return os.path.join(folder, names[0]) if names else None
+
+
+def image_url(path, images_dir=IMAGES_DIR):
+    """Public URL of a file under images_dir, each segment encoded as encodeURIComponent would"""
+    segments = os.path.relpath(path, images_dir).split(os.sep)
+    return IMAGES_PREFIX + "/".join(quote(segment, safe=URL_SAFE) for segment in segments)
+
+
+def image_variants(promotions, images_dir=IMAGES_DIR, formats=FORMATS, workers=None):
+    """{imageFolder: entry} with each folder's chosen image and its web variants; warnings alongside"""
+    warnings = []
+    sources = {}
+    for promo in promotions:
+        folder = promo["imageFolder"]
+        if folder in sources:
+            continue
+        source = promotion_image(os.path.join(images_dir, folder))
+        if source is None:
+            warnings.append(f"{promo['id']}: no image in public/images/managers-special/{folder}")
+        sources[folder] = source
+
+    entries = {}
+    for folder, source in sources.items():
+        if source:
+            entries[folder] = {"image": image_url(source, images_dir)}
+
+    try:
+        formats = available_formats(formats)
+    except SystemExit:
+        warnings.append("Pillow is not installed: image variants were not generated (pip install pillow)")
+        return entries, warnings
+
+    jobs = [(source, os.path.join(os.path.dirname(source), VARIANTS_FOLDER))
+            for source in sources.values() if source]
+    for (source, _), results in zip(jobs, generate(jobs, WIDTHS, formats, workers=workers)):
+        folder = os.path.basename(os.path.dirname(source))
+        if not results:
+            warnings.append(f"{folder}: could not decode {os.path.basename(source)}")
+            continue
+        variants = []
+        srcset = {}
+        for result in sorted(results, key=lambda d: (FORMATS.index(d.format), d.width)):
+            src = image_url(result.path, images_dir)
+            variants.append({"src": src, "format": result.format, "width": result.width, "bytes": result.size})
+            srcset.setdefault(result.format, []).append(f"{src} {result.width}w")
+            if result.over_budget:
+                warnings.append(f"{folder}: {os.path.basename(result.path)} is {result.size // 1024} KB "
+                                f"(over {TARGET_BYTES // 1024} KB at minimum quality)")
+        entries[folder]["variants"] = variants
+        entries[folder]["srcset"] = {fmt: ", ".join(items) for fmt, items in srcset.items()}
+    return entries, warnings
+
+
+def check_legacy(legacy, promotions):
+    """Warnings where the old single-month file disagrees with the schedule"""
+    if not legacy or not legacy.get("active"):
+        return []
+    try:
+        month = datetime.datetime.strptime(legacy.get("month", ""), "%B %Y").date()
+    except ValueError:
+        return [f"legacy file: month {legacy.get('month')!r} is not like 'July 2025'"]
+    last = month.replace(day=calendar.monthrange(month.year, month.month)[1])
+    valid_until = _date(_field(legacy, ("promotion", "validUntil")))
+    if valid_until and not month <= valid_until <= last:
+        return [f"legacy file: validUntil {valid_until} is outside {legacy['month']}"]
+    name = _field(legacy, ("spirit", "name"))
+    scheduled = [p for p in promotions if p["active"] and p["startDate"] <= last.isoformat()
+                 and p["endDate"] >= month.isoformat()]
+    if not scheduled:
+        return [f"legacy file: {name} for {legacy['month']} is not in the schedule"]
+    if all(p["spirit"]["name"] != name for p in scheduled):
+        return [f"legacy file: {name} for {legacy['month']}, but the schedule has "
+                f"{', '.join(p['spirit']['name'] for p in scheduled)}"]
+    return []
+
+
+def london_today():
+    from zoneinfo import ZoneInfo
+
+    return datetime.datetime.now(ZoneInfo("Europe/London")).date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Validate the Manager's Special schedule and compile its index")
+    parser.add_argument("--promotions", default=PROMOTIONS_PATH, help="promotions file")
+    parser.add_argument("--legacy", default=LEGACY_PATH, help="old single-month file to cross-check ('' to skip)")
+    parser.add_argument("--output", default=SCHEDULE_PATH, help="where to write the compiled schedule")
+    parser.add_argument("--images-dir", default=IMAGES_DIR, help="public/images/managers-special")
+    parser.add_argument("--no-images", action="store_true", help="don't generate image variants")
+    parser.add_argument("--date", type=datetime.date.fromisoformat,
+                        help="check coverage as of this YYYY-MM-DD (default: today in London)")
+    parser.add_argument("--workers", type=int, help="encoder processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    with open(args.promotions, encoding="utf-8") as f:
+        promotions = json.load(f).get("promotions", [])
+    errors, valid = validate(promotions)
+    warnings = []
+
+    overlaps, gaps = check_ranges(valid)
+    for earlier, later in overlaps:
+        errors.append(f"{earlier['id']} ({earlier['startDate']} to {earlier['endDate']}) overlaps "
+                      f"{later['id']} ({later['startDate']} to {later['endDate']}); {later['id']} wins")
+    for before, after, first, last in gaps:
+        warnings.append(f"no promotion from {first} to {last} (between {before['id']} and {after['id']})")
+
+    if args.legacy and os.path.exists(args.legacy):
+        with open(args.legacy, encoding="utf-8") as f:
+            warnings.extend(check_legacy(json.load(f), valid))
+
+    intervals = build_intervals(valid)
+    schedule = {
+        "version": SCHEDULE_VERSION,
+        "starts": [start for start, _, _ in intervals],
+        "ends": [end for _, end, _ in intervals],
+        "ids": [owner for _, _, owner in intervals],
+    }
+    if not args.no_images:
+        images, image_warnings = image_variants([p for p in valid if p["active"]], args.images_dir,
+                                                workers=args.workers)
+        warnings.extend(image_warnings)
+        schedule["images"] = {p["id"]: images[p["imageFolder"]] for p in valid
+                              if p["active"] and p["imageFolder"] in images}
+
+    today = args.date or london_today()
+    current = promotion_on(schedule, today.isoformat())
+    first_next = (today.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+    upcoming = promotion_on(schedule, first_next.isoformat())
+    if current is None:
+        warnings.append(f"nothing is running on {today}")
+    if upcoming is None:
+        warnings.append(f"nothing is scheduled for {first_next:%B %Y}")
+
+    changed = write_if_changed(args.output, json.dumps(schedule, indent=2, ensure_ascii=False) + "\n")
+
+    print(f"{'✓' if changed else '='} {len(valid)}/{len(promotions)} promotions valid, {len(intervals)} intervals "
+          f"-> {os.path.relpath(args.output, ROOT_DIR)} ({os.path.getsize(args.output) // 1024} KB)")
+    print(f"   {today}: {current or 'none'}; {first_next:%B %Y}: {upcoming or 'none'}")
+    for warning in warnings:
+        print(f"  ⚠️ {warning}")
+    for error in errors:
+        print(f"  ❌ {error}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
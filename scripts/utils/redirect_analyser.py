@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Redirect Analyser for The Anchor Pub
+Finds redirect rules that can never fire (duplicates, conflicts, rules
+shadowed by an earlier wildcard) and flattens the live rules so every
+source reaches its final destination in one hop
+"""
+
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from redirect_graph import RedirectGraph
+from redirect_matcher import RedirectMatcher, compile_source, is_literal
+
+# kind is one of: duplicate, conflict, shadowed, trailing-slash
+DeadRule = namedtuple("DeadRule", "rule kind by")
+
+
+def find_dead_rules(rules):
+    """Every rule an earlier rule (or Next.js itself) always answers first
+
+    Coverage comes from the matcher's segment trie, which is keyed on each
+    source's literal prefix, so no rule is ever compared against every other.
+    """
+    matcher = RedirectMatcher(rules)
+    dead = []
+    for rule in rules:
+        # trailingSlash is off: Next.js redirects "/x/" to "/x" before custom rules run
+        if rule.source != "/" and rule.source.endswith("/"):
+            dead.append(DeadRule(rule, "trailing-slash", None))
+            continue
+        earlier = matcher.covering(rule)
+        if earlier is None:
+            continue
+        if earlier.source.lower() != rule.source.lower():
+            kind = "shadowed"
+        elif earlier.destination == rule.destination:
+            kind = "duplicate"
+        else:
+            kind = "conflict"
+        dead.append(DeadRule(rule, kind, earlier))
+    return dead
+
+
+def _expand_through(rule, literal_sources):
+    """Concrete sources of a parameterised rule whose destination is itself redirected
+
+    For "/post/:slug" -> "/blog/:slug" and a literal "/blog/foo" rule this
+    yields "/post/foo", so that chain can be collapsed with its own rule.
+    """
+    destination = urlsplit(rule.destination).path
+    if is_literal(destination):
+        return
+    regex, keys = compile_source(destination)
+    for source in literal_sources:
+        found = regex.match(source)
+        if not found:
+            continue
+        params = {name: found.group(f"p{i}") for i, (name, modifier) in enumerate(keys)}
+
+        def fill(segment):
+            name = segment[1:].rstrip("?*+")
+            if segment.startswith(":") and params.get(name):
+                return params[name]
+            return segment
+
+        yield "/".join(fill(segment) for segment in rule.source.split("/"))
+
+
+def config_entry(source, destination, rule):
+    """A next.config.js redirect: permanent for 307/308, statusCode alone otherwise (Next.js rejects both)"""
+    entry = {"source": source, "destination": destination}
+    if rule.status_code in (307, 308):
+        entry["permanent"] = rule.permanent
+    else:
+        entry["statusCode"] = rule.status_code
+    return entry
+
+
+# Status codes browsers and search engines treat as permanent
+PERMANENT_STATUSES = (301, 308)
+
+
+def chain_rule(rules):
+    """The first hop's rule with the status a collapsed chain of rules must answer with
+
+    One status for the whole chain when every hop shares it; otherwise 308,
+    or 307 as soon as any hop is temporary, so flattening never turns a
+    temporary redirect into a permanent one.
+    """
+    first = rules[0]
+    statuses = {rule.status_code for rule in rules}
+    if len(statuses) == 1:
+        return first
+    permanent = all(rule.status_code in PERMANENT_STATUSES for rule in rules)
+    return first._replace(permanent=permanent, status_code=308 if permanent else 307)
+
+
+def flatten(rules):
+    """Live rules with every chain collapsed to a single hop, as next.config.js entries
+
+    Returns (entries, loops) where loops lists sources left untouched because
+    they never settle.
+    """
+    dead = {id(d.rule) for d in find_dead_rules(rules)}
+    live = [r for r in rules if id(r) not in dead]
+    matcher = RedirectMatcher(live)
+    graph = RedirectGraph(live, matcher)
+    literal_sources = [s for s in graph.edges if is_literal(s) and s.startswith("/")]
+
+    entries = []
+    loops = []
+    emitted = set()
+
+    def emit(source, destination, rule):
+        key = source.lower()
+        if key in emitted:
+            return
+        emitted.add(key)
+        entries.append(config_entry(source, destination, rule))
+
+    def hops(path):
+        return [graph.rules[node] for node in path[:-1]]
+
+    for rule in live:
+        if is_literal(rule.source):
+            resolution = graph.resolve(rule.source)
+            if resolution is None:
+                continue
+            if resolution.loop:
+                loops.append(rule)
+                emit(rule.source, rule.destination, rule)
+            else:
+                emit(rule.source, resolution.final, chain_rule(hops(resolution.path)))
+            continue
+
+        # Collapse chains through a wildcard by adding its concrete sources first
+        for source in _expand_through(rule, literal_sources):
+            match = matcher.match(source)
+            if match is None or match.rule is not rule:
+                continue
+            hop = graph.resolve(match.destination)
+            if hop is not None and not hop.loop and hop.hops > 0:
+                emit(source, hop.final, chain_rule([rule] + hops(hop.path)))
+
+        destination = rule.destination
+        chain = [rule]
+        if is_literal(urlsplit(destination).path):
+            hop = graph.resolve(destination)
+            if hop is not None and not hop.loop:
+                destination = hop.final
+                chain += hops(hop.path)
+        emit(rule.source, destination, chain_rule(chain))
+    return entries, loops
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Redirect Compiler for The Anchor Pub
+Turns the served redirect rules into one precomputed lookup file: chains
+already collapsed, literal sources in a hash map and parameterised ones in
+a segment trie, so a URL is answered with a single lookup and one response
+"""
+
+import hashlib
+import json
+import re
+from collections import namedtuple
+from itertools import zip_longest
+from urllib.parse import urlsplit
+
+from redirect_analyser import chain_rule, flatten
+from redirect_matcher import SITE_HOSTS, RedirectMatcher, build_destination, compile_source, is_literal, split_url
+from url_replay import ORIGIN, Resolver, strip_tracking
+
+# Bump when the artifact's shape changes; readers must reject other versions
+ARTIFACT_VERSION = 2
+
+# Next.js matches sources case-insensitively; JavaScript needs the flag spelled out
+PATTERN_FLAGS = "i"
+
+# A JavaScript named group, as opposed to a lookbehind
+JS_NAMED_GROUP = re.compile(r"\(\?<(?![=!])")
+
+# Edge middleware has to load this on every cold start
+MAX_ARTIFACT_BYTES = 256 * 1024
+
+# The same fields as check_redirects.Redirect, for rules rebuilt from flattened entries
+Rule = namedtuple("Rule", "source destination permanent status_code file order")
+
+
+def _flat_rules(rules):
+    """Flattened one-hop rules, in first-match order"""
+    entries, loops = flatten(rules)
+    flat = []
+    for i, entry in enumerate(entries):
+        permanent = entry.get("permanent", True)
+        status = entry.get("statusCode") or (308 if permanent else 307)
+        flat.append(Rule(entry["source"], entry["destination"], permanent, status, "compiled", i))
+    return flat, loops
+
+
+def _js_pattern(regex):
+    """A Python source regex in JavaScript syntax (named groups are written differently)"""
+    return regex.pattern.replace("(?P<", "(?<")
+
+
+def _py_pattern(pattern, flags):
+    """An artifact's JavaScript regex and flags back in Python"""
+    return re.compile(JS_NAMED_GROUP.sub("(?P<", pattern), re.IGNORECASE if "i" in flags else 0)
+
+
+def _internal(destination):
+    return destination.startswith("/") or urlsplit(destination).hostname in SITE_HOSTS
+
+
+def normalise(destination, tracking_params):
+    """destination as the browser ends up at it: middleware.ts drops tracking parameters on the site's own URLs"""
+    if not _internal(destination) or "?" not in destination:
+        return destination
+    base, _, query = destination.partition("?")
+    kept = strip_tracking(urlsplit(base).path or "/", query, tracking_params)
+    if kept is None:
+        return destination
+    return base + ("?" + kept if kept else "")
+
+
+def _node():
+    return {}
+
+
+def _add_to_trie(root, plan, index):
+    """Insert one rule's plan (from RedirectMatcher._plan) into the JSON trie
+
+    Node keys: "c" literal children, "p" the parameter child, "e" rules that
+    end here, "t" [rule, needs-one-segment] for trailing :path*/:path+, and
+    "m" the lowest rule index below, so a lookup can stop early.
+    """
+    node = root
+    for step in plan:
+        node["m"] = min(node.get("m", index), index)
+        kind = step[0]
+        if kind == "literal":
+            node = node.setdefault("c", {}).setdefault(step[1], _node())
+        elif kind == "param":
+            node = node.setdefault("p", _node())
+        elif kind == "tail":
+            node.setdefault("t", []).append([index, 1 if step[2] else 0])
+            return
+        else:
+            # "/a/:b?" ends both here and one segment further down
+            node.setdefault("e", []).append(index)
+            node = node.setdefault("p", _node())
+            node["m"] = min(node.get("m", index), index)
+            node.setdefault("e", []).append(index)
+            return
+    node["m"] = min(node.get("m", index), index)
+    node.setdefault("e", []).append(index)
+
+
+def source_digest(rules, tracking_params):
+    """Hash of everything the artifact was built from, so a stale copy can be spotted"""
+    digest = hashlib.blake2b(digest_size=16)
+    for rule in rules:
+        digest.update(json.dumps([rule.source, rule.destination, rule.status_code]).encode())
+    digest.update(json.dumps(sorted(tracking_params)).encode())
+    return digest.hexdigest()
+
+
+def compile_rules(rules, tracking_params=()):
+    """(artifact dict, loops) for an ordered list of served rules"""
+    flat, loops = _flat_rules(rules)
+    matcher = RedirectMatcher(flat)
+
+    literals = {}
+    table = []
+    trie = _node()
+    patterns = []
+    for rule in flat:
+        if is_literal(rule.source):
+            key = rule.source.lower()
+            found = matcher.match(rule.source)
+            # A literal only goes in the map if it is what actually answers that path
+            if key not in literals and found is not None and found.rule is rule:
+                literals[key] = [rule.destination, rule.status_code]
+            continue
+
+        index = len(table)
+        plan = matcher._plan(rule.source)
+        if plan is None:
+            regex, keys = compile_source(rule.source)
+            names = [name for name, _ in keys]
+            patterns.append([_js_pattern(regex), PATTERN_FLAGS, index])
+        else:
+            names = [step[1] for step in plan if step[0] != "literal"]
+            _add_to_trie(trie, plan, index)
+        table.append([rule.source, rule.destination, rule.status_code, names])
+
+    artifact = {
+        "version": ARTIFACT_VERSION,
+        "digest": source_digest(rules, tracking_params),
+        # Request query strings are appended to the destination's own, like Next.js does, and
+        # tracking parameters are then dropped from destinations on the site, as middleware.ts would
+        "query": "merge",
+        "trackingParams": sorted(tracking_params),
+        "literals": dict(sorted(literals.items())),
+        "rules": table,
+        "trie": trie,
+        "patterns": patterns,
+    }
+    return artifact, loops
+
+
+def serialise(artifact):
+    return json.dumps(artifact, separators=(",", ":"), ensure_ascii=False)
+
+
+class CompiledLookup:
+    """Reads an artifact the way the middleware would; used to prove it matches the rules
+
+    Patterns are compiled from the artifact's own regex and flags, not
+    rebuilt from the rule sources, so an artifact that lost something in
+    translation fails verify.
+    """
+
+    def __init__(self, artifact):
+        if artifact.get("version") != ARTIFACT_VERSION:
+            raise ValueError(f"Unsupported redirect artifact version {artifact.get('version')}")
+        self.literals = artifact["literals"]
+        self.rules = artifact["rules"]
+        self.trie = artifact["trie"]
+        self.tracking_params = set(artifact["trackingParams"])
+        self.patterns = []
+        for pattern, flags, index in artifact["patterns"]:
+            _, keys = compile_source(self.rules[index][0])
+            self.patterns.append((_py_pattern(pattern, flags), keys, index))
+
+    def _params(self, index, captured, tail=None):
+        names = self.rules[index][3]
+        # An optional parameter that matched nothing is empty, not missing
+        params = dict(zip_longest(names, captured, fillvalue=""))
+        if tail is not None:
+            params[names[-1]] = tail
+        return params
+
+    def _walk(self, segments):
+        best = None
+        stack = [(self.trie, 0, ())]
+        while stack:
+            node, depth, captured = stack.pop()
+            if best is not None and node.get("m", best[0]) >= best[0]:
+                continue
+            for index, plus in node.get("t", ()):
+                rest = segments[depth:]
+                if (best is None or index < best[0]) and (rest or not plus) and all(rest):
+                    best = (index, self._params(index, captured, rest))
+            if depth == len(segments):
+                for index in node.get("e", ()):
+                    if best is None or index < best[0]:
+                        best = (index, self._params(index, captured))
+                continue
+            segment = segments[depth]
+            if "p" in node and segment:
+                stack.append((node["p"], depth + 1, captured + (segment,)))
+            child = node.get("c", {}).get(segment.lower())
+            if child is not None:
+                stack.append((child, depth + 1, captured))
+        return best
+
+    def lookup(self, url):
+        """(destination, status) for a URL, or None"""
+        split = split_url(url)
+        if split is None:
+            return None
+        path, query = split
+        literal = self.literals.get(path.lower())
+        if literal is not None:
+            return normalise(build_destination(literal[0], {}, query), self.tracking_params), literal[1]
+
+        best = self._walk(path.split("/")[1:])
+        for regex, keys, index in self.patterns:
+            if best is not None and index >= best[0]:
+                break
+            found = regex.match(path)
+            if found:
+                params = {}
+                for i, (name, modifier) in enumerate(keys):
+                    value = found.group(f"p{i}")
+                    if value is not None and modifier in ("*", "+"):
+                        value = value.split("/")
+                    params[name] = value if value is not None else ""
+                best = (index, params)
+                break
+        if best is None:
+            return None
+        rule = self.rules[best[0]]
+        return normalise(build_destination(rule[1], best[1], query), self.tracking_params), rule[2]
+
+
+# A query with tracking parameters around one that has to survive
+TRACKED_QUERY = "?utm_source=x&ref=keep&fbclid=y"
+
+
+def sample_urls(rules):
+    """URLs that exercise every rule: each literal source, and each pattern filled with test values
+
+    Each one also comes in mixed case and with tracking parameters, since
+    both are normalised before the visitor lands.
+    """
+    urls = []
+    for rule in rules:
+        source = rule.source
+        urls.append(source)
+        urls.append(source.upper())
+        if is_literal(source):
+            urls.append(_mixed_case(source) + TRACKED_QUERY)
+        else:
+            filled = "/".join(
+                "sample-value" if part.startswith(":") else part for part in source.split("/")
+            )
+            urls.extend([filled, filled + "/deeper/path", filled + "?utm_source=x",
+                         _mixed_case(filled), _mixed_case(filled) + TRACKED_QUERY])
+        urls.append(source.rstrip("/") + "/unmatched-child")
+    return urls
+
+
+def _mixed_case(path):
+    return "".join(c.upper() if i % 2 else c.lower() for i, c in enumerate(path))
+
+
+def _relative(destination):
+    """destination without the site's own origin, so absolute and relative forms compare equal"""
+    if destination.startswith(ORIGIN + "/"):
+        return destination[len(ORIGIN):]
+    return destination
+
+
+def replayed(resolver, url, by_reason):
+    """(destination, status) the served rules send url to, replayed hop by hop; None if no rule matches
+
+    A loop can't be collapsed, so it answers with its first hop, as the
+    artifact does. Next.js strips a trailing slash before any rule runs, so
+    those URLs never reach the lookup.
+    """
+    path = url.partition("?")[0]
+    if path != "/" and path.endswith("/"):
+        return None
+    first = resolver.matcher.match(url)
+    if first is None:
+        return None
+    replay = resolver.resolve(ORIGIN + url if url.startswith("/") else url)
+    hops = [(step, by_reason[step.reason]) for step in replay.steps if step.reason in by_reason]
+    if replay.status in ("loop", "too-many-hops") or not hops:
+        return _relative(normalise(first.destination, resolver.tracking_params)), first.rule.status_code
+    return (_relative(normalise(hops[-1][0].url, resolver.tracking_params)),
+            chain_rule([rule for _, rule in hops]).status_code)
+
+
+def verify(artifact, rules, urls=None):
+    """URLs where the artifact and a hop-by-hop replay of the rules disagree (empty when they are equivalent)
+
+    The expected answers come from url_replay following the original rules,
+    not from the flattening the artifact was built from, so a flattening bug
+    can't hide on both sides.
+    """
+    tracking_params = set(artifact["trackingParams"])
+    resolver = Resolver(rules, tracking_params, cache_size=0)
+    # Replay steps name the rule that fired as file#source; the first such rule is the one that fires
+    by_reason = {}
+    for rule in rules:
+        by_reason.setdefault(f"{rule.file}#{rule.source}", rule)
+    lookup = CompiledLookup(artifact)
+    mismatches = []
+    for url in urls if urls is not None else sample_urls(rules):
+        expected = replayed(resolver, url, by_reason)
+        got = lookup.lookup(url)
+        if got is not None:
+            got = (_relative(got[0]), got[1])
+        if got != expected:
+            mismatches.append((url, expected, got))
+    return mismatches
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Redirect Graph for The Anchor Pub
+Resolves every redirect source to its final destination and finds chains and
+loops of any length in a single linear pass
+"""
+
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from redirect_matcher import is_literal
+
+# Outcome of following one source to the end of its chain.
+# final is None when the chain runs into a loop.
+Resolution = namedtuple("Resolution", "source final hops path loop")
+
+
+class RedirectGraph:
+    """Directed graph of concrete URLs (one outgoing edge per source)
+
+    Without a matcher only literal rules become edges. With a RedirectMatcher
+    every literal source and concrete destination is followed through whichever
+    rule fires first, so chains through ":slug" and ":path*" rules show up too.
+    """
+
+    def __init__(self, rules, matcher=None):
+        self.edges = {}
+        self.rules = {}
+        if matcher is None:
+            self._add_literal(rules)
+        else:
+            self._follow(rules, matcher)
+        self.cycles = []
+        self.resolved = {}
+        self._resolve()
+
+    def _add_literal(self, rules):
+        for rule in rules:
+            # Next.js uses the first matching rule, so later duplicates never fire
+            if rule.source in self.edges or not is_literal(rule.source):
+                continue
+            self.edges[rule.source] = rule.destination
+            self.rules[rule.source] = rule
+
+    def _follow(self, rules, matcher):
+        pending = []
+        for rule in rules:
+            if is_literal(rule.source):
+                pending.append(rule.source)
+            if is_literal(urlsplit(rule.destination).path):
+                pending.append(rule.destination)
+
+        seen = set()
+        while pending:
+            node = pending.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            match = matcher.match(node)
+            if match is None:
+                continue
+            self.edges[node] = match.destination
+            self.rules[node] = match.rule
+            pending.append(match.destination)
+
+    def _strongly_connected_components(self):
+        """Iterative Tarjan SCC; components come out sinks first"""
+        edges = self.edges
+        index = {}
+        lowlink = {}
+        on_stack = set()
+        stack = []
+        components = []
+        counter = 0
+
+        for root in edges:
+            if root in index:
+                continue
+            work = [(root, False)]
+            while work:
+                node, returning = work.pop()
+                if not returning:
+                    if node in index:
+                        continue
+                    index[node] = lowlink[node] = counter
+                    counter += 1
+                    stack.append(node)
+                    on_stack.add(node)
+                    work.append((node, True))
+                    target = edges.get(node)
+                    if target is not None:
+                        if target not in index:
+                            work.append((target, False))
+                        elif target in on_stack:
+                            lowlink[node] = min(lowlink[node], index[target])
+                    continue
+
+                target = edges.get(node)
+                if target is not None and target in on_stack:
+                    lowlink[node] = min(lowlink[node], lowlink[target])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+        return components
+
+    def _resolve(self):
+        """Walk components sinks-first so every successor is resolved before its sources"""
+        edges = self.edges
+        final = {}
+        hops = {}
+        in_loop = set()
+
+        for component in self._strongly_connected_components():
+            node = component[0]
+            if len(component) > 1 or edges.get(node) == node:
+                # Order the loop members by following the edges
+                cycle = [node]
+                nxt = edges[node]
+                while nxt != node:
+                    cycle.append(nxt)
+                    nxt = edges[nxt]
+                self.cycles.append(cycle)
+                for member in component:
+                    in_loop.add(member)
+                    final[member] = None
+                    hops[member] = None
+                continue
+
+            target = edges.get(node)
+            if target is None:
+                final[node] = node
+                hops[node] = 0
+            elif target in in_loop:
+                in_loop.add(node)
+                final[node] = None
+                hops[node] = None
+            else:
+                final[node] = final[target]
+                hops[node] = hops[target] + 1
+
+        for source in edges:
+            self.resolved[source] = Resolution(
+                source=source,
+                final=final[source],
+                hops=hops[source],
+                path=None,
+                loop=source in in_loop,
+            )
+
+    def path(self, source):
+        """Full hop-by-hop path from source (stops when a loop repeats)"""
+        path = [source]
+        seen = {source}
+        node = self.edges.get(source)
+        while node is not None:
+            path.append(node)
+            if node in seen:
+                break
+            seen.add(node)
+            node = self.edges.get(node)
+        return path
+
+    def resolve(self, source):
+        """Final destination and hop count for a source, or None if it is not a redirect"""
+        resolution = self.resolved.get(source)
+        if resolution is None:
+            return None
+        return resolution._replace(path=self.path(source))
+
+    def chains(self):
+        """Every source that takes more than one hop to settle"""
+        for source, resolution in self.resolved.items():
+            if resolution.hops is not None and resolution.hops > 1:
+                yield resolution._replace(path=self.path(source))
+
+    def loops(self):
+        """Every source that never settles, including ones that feed into a loop"""
+        for source, resolution in self.resolved.items():
+            if resolution.loop:
+                yield resolution._replace(path=self.path(source))
+
+    def sources_by_destination(self):
+        """Reverse index: destination -> list of sources pointing straight at it"""
+        index = {}
+        for source, destination in self.edges.items():
+            index.setdefault(destination, []).append(source)
+        return index
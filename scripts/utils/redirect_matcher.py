@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Redirect Matcher for The Anchor Pub
+Matches URLs against redirect rules with the same path-to-regexp semantics
+Next.js uses (":slug", ":path*", ":rest+", ":page?"), indexed by a trie of
+path segments so a lookup costs O(path depth) instead of one regex per rule
+"""
+
+import re
+from collections import namedtuple
+from itertools import zip_longest
+from urllib.parse import urlsplit
+
+# Hosts whose paths the redirect rules apply to
+SITE_HOSTS = {"www.the-anchor.pub", "the-anchor.pub"}
+
+# Looked-up paths remembered before the cache is emptied
+CACHE_SIZE = 100000
+
+# Default pattern for a named parameter (path-to-regexp v6, delimiter "/")
+SEGMENT_PATTERN = r"[^/#?]+?"
+
+# :name, :name(pattern), (pattern) and escaped characters, each with an optional modifier
+TOKEN = re.compile(
+    r":(?P<name>\w+)(?:\((?P<pattern>(?:[^()\\]|\\.)*)\))?(?P<name_modifier>[?*+])?"
+    r"|\((?P<group>(?:[^()\\]|\\.)*)\)(?P<group_modifier>[?*+])?"
+    r"|\\(?P<escaped>.)"
+)
+
+# A whole path segment that is just a parameter
+SEGMENT_PARAM = re.compile(r"^:(\w+)([?*+])?$")
+
+# Anything that makes a path a pattern rather than a literal
+PATTERN_CHARS = re.compile(r":\w|[(){}*+?\\]")
+
+# Parameters in a destination, with the "/" prefix that disappears when a * param is empty
+DESTINATION_PARAM = re.compile(r"(/?):(\w+)([?*+])?")
+
+Match = namedtuple("Match", "rule params destination")
+
+
+def is_literal(path):
+    """True when a path has no path-to-regexp parameters, groups or modifiers"""
+    return not PATTERN_CHARS.search(path)
+
+
+def compile_source(source):
+    """Compile a Next.js source into a case-insensitive, strict regex plus its parameter names"""
+    parts = []
+    keys = []
+    position = 0
+    unnamed = 0
+
+    for token in TOKEN.finditer(source):
+        literal = source[position:token.start()]
+        position = token.end()
+
+        if token.group("escaped") is not None:
+            parts.append(re.escape(literal + token.group("escaped")))
+            continue
+
+        # path-to-regexp treats a directly preceding "/" as the parameter's prefix
+        prefix = ""
+        if literal.endswith("/"):
+            literal, prefix = literal[:-1], "/"
+        parts.append(re.escape(literal))
+
+        if token.group("name") is not None:
+            name = token.group("name")
+            pattern = token.group("pattern") or SEGMENT_PATTERN
+            modifier = token.group("name_modifier") or ""
+        else:
+            name = str(unnamed)
+            unnamed += 1
+            pattern = token.group("group")
+            modifier = token.group("group_modifier") or ""
+        keys.append((name, modifier))
+
+        group = f"(?P<p{len(keys) - 1}>"
+        prefix = re.escape(prefix)
+        if modifier in ("*", "+"):
+            repeated = f"(?:{pattern})(?:{prefix}(?:{pattern}))*"
+            body = f"{prefix}{group}{repeated})"
+            parts.append(f"(?:{body})?" if modifier == "*" else body)
+        elif modifier == "?":
+            parts.append(f"(?:{prefix}{group}{pattern}))?")
+        else:
+            parts.append(f"{prefix}{group}{pattern})")
+
+    parts.append(re.escape(source[position:]))
+    return re.compile("^" + "".join(parts) + "$", re.IGNORECASE), keys
+
+
+def split_url(url):
+    """Split a URL into (path, query); None for hosts the rules don't apply to"""
+    if "://" in url or url.startswith("//"):
+        parts = urlsplit(url)
+        if parts.hostname not in SITE_HOSTS:
+            return None
+        return parts.path or "/", parts.query
+    path, _, query = url.partition("?")
+    return path.split("#", 1)[0] or "/", query
+
+
+def build_destination(destination, params, query=""):
+    """Fill a destination's parameters and carry the request query across like Next.js"""
+    def replace(match):
+        prefix, name, modifier = match.groups()
+        if name not in params:
+            return match.group(0)
+        value = params[name]
+        if isinstance(value, (list, tuple)):
+            value = "/".join(value)
+        if not value:
+            return ""
+        return prefix + value
+
+    if "://" in destination:
+        parts = urlsplit(destination)
+        head = f"{parts.scheme}://{parts.netloc}"
+        path, own_query = parts.path, parts.query
+    else:
+        head = ""
+        path, _, own_query = destination.partition("?")
+
+    path = DESTINATION_PARAM.sub(replace, path) or "/"
+    own_query = DESTINATION_PARAM.sub(replace, own_query) if own_query else ""
+    merged = "&".join(q for q in (query, own_query) if q)
+    return head + path + ("?" + merged if merged else "")
+
+
+class _Node:
+    __slots__ = ("literal", "param", "rules", "tails", "min_order")
+
+    def __init__(self):
+        self.literal = {}
+        self.param = None
+        # (order, rule, param names) for rules ending exactly here
+        self.rules = []
+        # (order, rule, param names, tail name, needs at least one segment)
+        self.tails = []
+        self.min_order = float("inf")
+
+
+class RedirectMatcher:
+    """First-match redirect lookup over an ordered rule list"""
+
+    def __init__(self, rules, cache_size=CACHE_SIZE):
+        self.rules = list(rules)
+        self.root = _Node()
+        # Rules the trie can't express (groups, partial-segment params) fall back to regex
+        self.fallback = []
+        self._cache = {}
+        self.cache_size = cache_size
+        for rule in self.rules:
+            self._insert(rule)
+
+    def _plan(self, source):
+        """Trie steps for a source, or None if it needs the regex fallback"""
+        segments = source.split("/")[1:]
+        plan = []
+        for i, segment in enumerate(segments):
+            if is_literal(segment):
+                plan.append(("literal", segment.lower()))
+                continue
+            param = SEGMENT_PARAM.match(segment)
+            last = i == len(segments) - 1
+            if param and not param.group(2):
+                plan.append(("param", param.group(1)))
+            elif param and last and param.group(2) in ("*", "+"):
+                plan.append(("tail", param.group(1), param.group(2) == "+"))
+            elif param and last and param.group(2) == "?":
+                plan.append(("optional", param.group(1)))
+            else:
+                return None
+        return plan
+
+    def _insert(self, rule):
+        plan = self._plan(rule.source)
+        if plan is None:
+            regex, keys = compile_source(rule.source)
+            self.fallback.append((rule.order, rule, regex, keys))
+            return
+
+        node = self.root
+        names = []
+        for step in plan:
+            node.min_order = min(node.min_order, rule.order)
+            kind = step[0]
+            if kind == "literal":
+                node = node.literal.setdefault(step[1], _Node())
+            elif kind == "param":
+                names.append(step[1])
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+            elif kind == "tail":
+                node.tails.append((rule.order, rule, tuple(names), step[1], step[2]))
+                return
+            else:
+                # "/a/:b?" matches both "/a" and "/a/x"; on "/a" the parameter is empty, not missing
+                node.rules.append((rule.order, rule, tuple(names) + (step[1],)))
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+                node.min_order = min(node.min_order, rule.order)
+                node.rules.append((rule.order, rule, tuple(names) + (step[1],)))
+                return
+        node.min_order = min(node.min_order, rule.order)
+        node.rules.append((rule.order, rule, tuple(names)))
+
+    def _lookup(self, path):
+        """(rule, params) of the first rule matching path, in rule order"""
+        segments = path.split("/")[1:]
+        depth_total = len(segments)
+        best = None
+        best_order = float("inf")
+
+        stack = [(self.root, 0, ())]
+        while stack:
+            node, depth, captured = stack.pop()
+            if node.min_order >= best_order:
+                continue
+            for order, rule, names, tail, plus in node.tails:
+                if order >= best_order:
+                    continue
+                rest = segments[depth:]
+                if plus and not rest:
+                    continue
+                if all(rest):
+                    best_order = order
+                    best = (rule, dict(zip(names, captured), **{tail: rest}))
+            if depth == depth_total:
+                for order, rule, names in node.rules:
+                    if order < best_order:
+                        best_order = order
+                        best = (rule, dict(zip_longest(names, captured, fillvalue="")))
+                continue
+            segment = segments[depth]
+            if node.param is not None and segment:
+                stack.append((node.param, depth + 1, captured + (segment,)))
+            child = node.literal.get(segment.lower())
+            if child is not None:
+                stack.append((child, depth + 1, captured))
+
+        for order, rule, regex, keys in self.fallback:
+            if order >= best_order:
+                break
+            found = regex.match(path)
+            if found:
+                params = {}
+                for i, (name, modifier) in enumerate(keys):
+                    value = found.group(f"p{i}")
+                    # Repeated parameters are segment lists, like the trie's, even when empty
+                    if modifier in ("*", "+"):
+                        value = value.split("/") if value is not None else []
+                    params[name] = value if value is not None else ""
+                best_order = order
+                best = (rule, params)
+                break
+        return best
+
+    def covering(self, rule):
+        """First earlier rule that matches every URL rule matches, or None
+
+        Walks the trie with the rule's own segments: a literal segment can be
+        covered by the same literal or by a parameter, a parameter only by a
+        parameter, and anything left over only by a trailing ":path*"/":path+".
+        Regex fallback rules are never treated as covering anything.
+        """
+        plan = self._plan(rule.source)
+        if plan is None:
+            return None
+        best = None
+        best_order = rule.order
+
+        stack = [(self.root, 0)]
+        while stack:
+            node, i = stack.pop()
+            if node.min_order >= best_order:
+                continue
+            rest = plan[i:]
+            for order, other, names, tail, plus in node.tails:
+                if order >= best_order:
+                    continue
+                if any(step[0] == "literal" and not step[1] for step in rest):
+                    continue
+                if plus and not any(step[0] in ("literal", "param") or step[0] == "tail" and step[2] for step in rest):
+                    continue
+                best, best_order = other, order
+            if i == len(plan):
+                for order, other, names in node.rules:
+                    if order < best_order:
+                        best, best_order = other, order
+                continue
+            step = plan[i]
+            if step[0] == "literal":
+                child = node.literal.get(step[1])
+                if child is not None:
+                    stack.append((child, i + 1))
+                if step[1] and node.param is not None:
+                    stack.append((node.param, i + 1))
+            elif step[0] == "param" and node.param is not None:
+                stack.append((node.param, i + 1))
+        return best
+
+    def match(self, url):
+        """First matching rule for a URL with its filled-in destination, or None"""
+        split = split_url(url)
+        if split is None:
+            return None
+        path, query = split
+        found = self._cache.get(path, False)
+        if found is False:
+            found = self._lookup(path)
+            if self.cache_size:
+                if len(self._cache) >= self.cache_size:
+                    self._cache.clear()
+                self._cache[path] = found
+        if found is None:
+            return None
+        rule, params = found
+        return Match(rule, params, build_destination(rule.destination, params, query))
+
+    def match_many(self, urls):
+        """Bulk mode: yield (url, Match or None) for every URL"""
+        for url in urls:
+            yield url, self.match(url)
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Redirect Minimiser for The Anchor Pub
+Shrinks the rule files without changing where any known URL ends up: rules
+that can never fire or that a later pattern already answers are dropped,
+and families of literal rules sharing a destination are folded into one
+":slug" or "prefix-:rest" pattern. Every change is proved by replaying the
+known URLs through the old and new rule sets
+"""
+
+import os
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+from redirect_analyser import config_entry, find_dead_rules
+from redirect_compiler import sample_urls
+from redirect_matcher import RedirectMatcher, build_destination, is_literal
+from url_replay import ORIGIN, Resolver, iter_urls
+
+# Folding fewer rules than this isn't worth a less obvious pattern
+MIN_FAMILY = 2
+
+# Shortest shared slug prefix (at a word boundary) a "prefix-:rest" pattern may use
+MIN_PREFIX = 8
+
+# kind is one of: dead, redundant, folded
+Change = namedtuple("Change", "kind rules replacement")
+
+
+def known_urls(rules, routes, sitemap_paths=()):
+    """Every URL a change must not affect: rule sources and destinations, site routes, sitemap entries"""
+    urls = set(sample_urls(rules))
+    # Fill single-parameter patterns with real slugs too: "/post/:slug" must keep reaching every post
+    for rule in rules:
+        parts = rule.source.split("/")
+        params = [i for i, part in enumerate(parts) if part.startswith(":")]
+        if len(params) == 1 and is_literal("/".join(parts[:params[0]])):
+            for slug in routes.slugs:
+                parts[params[0]] = slug
+                urls.add("/".join(parts))
+    for rule in rules:
+        destination = rule.destination
+        if destination.startswith("/") and is_literal(urlsplit(destination).path):
+            urls.add(destination)
+    urls.update(routes.known_paths())
+    for path in sitemap_paths:
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                urls.update(iter_urls(f, "sitemap"))
+    return sorted(urls)
+
+
+def outcomes(rules, urls, tracking_params):
+    """Where every URL lands, hop by hop, under a rule set"""
+    resolver = Resolver(rules, tracking_params)
+    result = {}
+    for url in urls:
+        replay = resolver.resolve(url if "://" in url else ORIGIN + url)
+        result[url] = (replay.status, replay.final, tuple((s.status_code, s.url) for s in replay.steps))
+    return result
+
+
+def _renumber(rules):
+    return [rule._replace(order=i) for i, rule in enumerate(rules)]
+
+
+def _differences(baseline, rules, urls, tracking_params):
+    after = outcomes(rules, urls, tracking_params)
+    return [url for url in urls if after[url] != baseline[url]]
+
+
+def drop_dead(rules):
+    """(kept, changes) without rules that an earlier rule or Next.js always answers first"""
+    dead = find_dead_rules(rules)
+    gone = {id(d.rule) for d in dead}
+    return [r for r in rules if id(r) not in gone], [Change("dead", [d.rule], None) for d in dead]
+
+
+def drop_redundant(rules):
+    """(kept, changes) without literal rules a later pattern would answer identically"""
+    patterns = RedirectMatcher([r for r in rules if not is_literal(r.source)])
+    kept = []
+    changes = []
+    for rule in rules:
+        if is_literal(rule.source):
+            found = patterns.match(rule.source)
+            if (found is not None and found.rule.order > rule.order
+                    and found.destination == build_destination(rule.destination, {})
+                    and found.rule.status_code == rule.status_code):
+                changes.append(Change("redundant", [rule], found.rule))
+                continue
+        kept.append(rule)
+    return kept, changes
+
+
+def _word_prefix(leaves):
+    """Longest common prefix of the leaves that ends on a "-" boundary"""
+    prefix = os.path.commonprefix(leaves)
+    cut = prefix.rfind("-")
+    return prefix[:cut + 1] if cut != -1 else ""
+
+
+def _clusters(leaves):
+    """Groups of leaves with a long enough shared word prefix, largest first"""
+    leaves = sorted(leaves)
+    prefix = _word_prefix(leaves)
+    if len(prefix) >= MIN_PREFIX:
+        return [(prefix, leaves)]
+    by_word = {}
+    for leaf in leaves:
+        head = leaf.split("-", 1)[0]
+        by_word.setdefault(head, []).append(leaf)
+    found = []
+    for group in by_word.values():
+        if len(group) < MIN_FAMILY or len(group) == len(leaves):
+            continue
+        found.extend(_clusters(group))
+    return found
+
+
+def families(rules, routes):
+    """Candidate folds: (members, new source, new destination), biggest saving first
+
+    Literal rules from one file that share a parent path, status and
+    destination (or a destination that repeats their own last segment) form
+    a family. A family becomes "parent/:slug", or is split into clusters
+    sharing a slug prefix that each become "parent/prefix-:rest". Families
+    under a parent where a dynamic app route lives (like /drinks/[slug]) are
+    left alone: a pattern there could take over pages we can't enumerate.
+    """
+    groups = {}
+    for rule in rules:
+        if not is_literal(rule.source) or rule.source.count("/") < 2 or "?" in rule.destination:
+            continue
+        parent, leaf = rule.source.rsplit("/", 1)
+        if not leaf:
+            continue
+        destination = rule.destination
+        passthrough = destination.rsplit("/", 1)[-1] == leaf
+        template = destination.rsplit("/", 1)[0] + "/:slug" if passthrough else destination
+        key = (rule.file, parent.lower(), template, rule.status_code)
+        groups.setdefault(key, []).append(rule)
+
+    candidates = []
+    for (file, parent, template, status), members in groups.items():
+        if len(members) < MIN_FAMILY:
+            continue
+        parent = members[0].source.rsplit("/", 1)[0]
+        if routes.dynamic_under(parent):
+            continue
+        candidates.append((members, f"{parent}/:slug", template))
+        if template.endswith("/:slug"):
+            # A passthrough can't use a partial-segment pattern: :slug would only hold the tail
+            continue
+        by_leaf = {rule.source.rsplit("/", 1)[1]: rule for rule in members}
+        for prefix, leaves in _clusters(list(by_leaf)):
+            candidates.append(([by_leaf[leaf] for leaf in leaves], f"{parent}/{prefix}:rest", template))
+    candidates.sort(key=lambda c: (-len(c[0]), c[1]))
+    return candidates
+
+
+def fold(rules, members, source, destination):
+    """Rule sets with members replaced by one pattern, placed at the first member, then at the last"""
+    ids = {id(r) for r in members}
+    replacement = members[0]._replace(source=source, destination=destination)
+    for anchor in (members[0], members[-1]):
+        folded = []
+        for rule in rules:
+            if rule is anchor:
+                folded.append(replacement)
+            elif id(rule) not in ids:
+                folded.append(rule)
+        yield replacement, _renumber(folded)
+
+
+def minimise(rules, routes, tracking_params, urls=None, sitemap_paths=()):
+    """(minimised rules, changes, mismatched URLs) for an ordered served rule list
+
+    Each step is only kept if every known URL still resolves exactly as it
+    did (same status codes, same hops, same final URL), so the result is
+    equivalent to the input on everything we know the site is asked for.
+    """
+    urls = urls if urls is not None else known_urls(rules, routes, sitemap_paths)
+    baseline = outcomes(rules, urls, tracking_params)
+    changes = []
+
+    current, dead = drop_dead(_renumber(rules))
+    current = _renumber(current)
+    if not _differences(baseline, current, urls, tracking_params):
+        changes.extend(dead)
+    else:
+        current = _renumber(rules)
+
+    reduced, redundant = drop_redundant(current)
+    reduced = _renumber(reduced)
+    if not _differences(baseline, reduced, urls, tracking_params):
+        current = reduced
+        changes.extend(redundant)
+
+    used = set()
+    for members, source, destination in families(current, routes):
+        if any(id(m) in used for m in members):
+            continue
+        # Members may have been renumbered; look them up again by identity in the current list
+        live = [r for r in current if any(r.source == m.source and r.file == m.file for m in members)]
+        if len(live) < MIN_FAMILY:
+            continue
+        for replacement, folded in fold(current, live, source, destination):
+            if not _differences(baseline, folded, urls, tracking_params):
+                changes.append(Change("folded", live, replacement))
+                used.update(id(m) for m in members)
+                current = folded
+                break
+
+    return current, changes, _differences(baseline, current, urls, tracking_params)
+
+
+def by_file(rules):
+    """{file: [next.config.js entries]} in rule order"""
+    files = {}
+    for rule in rules:
+        files.setdefault(rule.file, []).append(config_entry(rule.source, rule.destination, rule))
+    return files
@@ -4,15 +4,23 @@ Complete Image Renaming Script for The Anchor Pub
 Handles all categories: events, food, drinks, venue, garden, logo
 """
 
+import argparse
 import os
-import re
-import shutil
-from pathlib import Path
+import signal
+import time
 from datetime import datetime
 
+from event_clusters import NIGHT_NAME, categorise_unknown, load_calendar
+from image_ingest import (
+    ASSETS_DIR, MANIFEST_NAME, NAME_NUMBER, Ingestor, Job, Manifest, NameIndex, match_series, scan_images,
+    sniff_format, source_entries, uuid_stem, warn_unconverted
+)
+from image_watch import SETTLE_SECONDS, PhotoWatcher
+from run_report import RunReport, default_path, read_events, render, summarise
+
 # Base directories
-BASE_DIR = "/Users/peterpitcher/Cursor/the-anchor.pub/assets/images"
-OUTPUT_DIR = "/Users/peterpitcher/Cursor/the-anchor.pub/assets/images/seo-renamed"
+BASE_DIR = ASSETS_DIR
+OUTPUT_DIR = os.path.join(ASSETS_DIR, "seo-renamed")
 
 # Image categories and their SEO focus
 CATEGORIES = {
@@ -51,230 +59,481 @@ CATEGORIES = {
     }
 }
 
+# Rename templates for numbered event shoots
+EVENT_TEMPLATES = {
+    "nikki-manfadge": ("drag-shows", [
+        "the-anchor-stanwell-moor-drag-show-nikki-manfadge-{:03d}",
+        "the-anchor-heathrow-lgbtq-friendly-pub-drag-entertainment-{:03d}",
+        "the-anchor-pub-drag-queen-performance-stanwell-moor-{:03d}",
+        "the-anchor-drag-bingo-nikki-manfadge-near-heathrow-{:03d}"
+    ]),
+    "tequila-tasting": ("tequila-tasting", [
+        "the-anchor-stanwell-moor-tequila-tasting-event-{:03d}",
+        "the-anchor-heathrow-premium-spirits-tasting-{:03d}",
+        "the-anchor-pub-tequila-masterclass-stanwell-moor-{:03d}"
+    ])
+}
+
+# Individually identified event photos
+EVENT_NAMES = {
+    "C6DF23AC-98EF-46CE-978C-343D8EF5A2C8": ("bingo", "the-anchor-stanwell-moor-monthly-cash-bingo-winner.jpg")
+}
+
+FOOD_NAMES = {
+    "0249C5BF-AAB7-488C-91BC-75147F150258": ("mains", "the-anchor-stanwell-moor-traditional-british-pie-gravy.jpg"),
+    "4F0FE513-072A-46A4-AF1B-0AA865DC9DAC": ("mains", "the-anchor-pub-main-course-hearty-meal-heathrow.jpg"),
+    "585F57AF-AC7A-41D7-8459-1C19FE9A69D8": ("pizza", "the-anchor-stone-baked-pizza-stanwell-moor.jpg"),
+    "6B2C2E09-CB23-4DFB-8125-B64AF3E8925F": ("burgers", "the-anchor-gourmet-burger-pub-food-heathrow.jpg"),
+    "6B7B6E28-3B87-490F-BE03-2FC369E60C25": ("sunday-roast", "the-anchor-sunday-roast-dinner-stanwell-moor.jpg"),
+    "C5FACCEA-EF31-4FE8-BDA2-4514ACF326DF": ("mains", "the-anchor-pub-food-traditional-british-cuisine.jpg"),
+    "FC602420-61A5-4CD4-81FE-74D2ECFC9501": ("desserts", "the-anchor-dessert-sweet-treats-stanwell-moor.jpg")
+}
+
+VENUE_NAMES = [
+    "the-anchor-pub-interior-traditional-british-stanwell-moor",
+    "the-anchor-bar-area-local-pub-near-heathrow",
+    "the-anchor-restaurant-seating-area-stanwell-moor",
+    "the-anchor-pub-atmosphere-welcoming-interior-surrey",
+    "the-anchor-venue-private-events-space-heathrow"
+]
+
+GARDEN_NAME = "the-anchor-beer-garden-under-heathrow-flight-path-stanwell-moor.jpg"
+
+LOGO_NAMES = {
+    "White Logo Transparent.png": "the-anchor-pub-logo-white-transparent.png",
+    "Black Logo Transparent.png": "the-anchor-pub-logo-black-transparent.png"
+}
+
+
 class CompleteImageRenamer:
-    def __init__(self):
+    def __init__(self, base_dir=BASE_DIR, output_dir=OUTPUT_DIR, mode="auto", workers=None, full=False,
+                 dedupe="off", derivatives="off", heic_format="jpg", calendar=None, report_path=None):
+        self.base_dir = base_dir
+        self.output_dir = output_dir
+        self.dedupe = dedupe
+        self.derivatives = derivatives
+        self.heic_format = heic_format
+        self.calendar = calendar
         self.create_directories()
+        # Remembers what was copied last time so reruns only touch new or changed files
+        self.manifest = Manifest(os.path.join(output_dir, MANIFEST_NAME), full=full)
+        # Timings and every file handled are streamed here; the Markdown report is rendered from it
+        self.report_path = report_path or default_path(output_dir, "rename-all-images")
+        self.report = RunReport(self.report_path, "rename-all-images", source=base_dir, dest=output_dir,
+                                mode=mode, full=full, dedupe=dedupe, derivatives=derivatives)
+        self.ingestor = Ingestor(mode=mode, workers=workers, manifest=self.manifest, report=self.report)
+        self.names = NameIndex(self.manifest)
+        self.counters = {}
+        # Numbers already in generated names, by category, so new photos are numbered past or between them
+        self.held = {}
+        # VENUE_NAMES already given to a photo
+        self.venue_held = set()
         self.processed = []
-        self.rename_log = []
+        self.jobs = []
+        self.copied = []
+        self.derived = []
         
+    def queue(self, section, label, filename, source, category, new_name):
+        """Record a rename; files are copied together once every directory is classified"""
+        directory = os.path.join(self.output_dir, section, category)
+        # The ingestor converts by destination extension, so this picks what iPhone photos become
+        if self.heic_format != "jpg" and sniff_format(source) == "heic":
+            new_name = os.path.splitext(new_name)[0] + "." + self.heic_format
+        new_name = self.names.claim(directory, new_name, source)
+        dest = os.path.join(directory, new_name)
+        self.jobs.append(Job(source, dest, f"{label}: {filename} -> {category}/{new_name}"))
+        print(f"  ✓ {category}: {new_name}")
+    
+    def next_number(self, category, source=None):
+        """Running number for generically named images in a category
+
+        A source numbered on an earlier run keeps its number; anything else
+        gets the lowest number no earlier photo holds.
+        """
+        previous = self.names.previous.get(source)
+        if previous and os.path.basename(os.path.dirname(previous)) == category:
+            match = NAME_NUMBER.search(os.path.basename(previous))
+            if match:
+                return int(match.group(1))
+        held = self.held.get(category, ())
+        number = self.counters.get(category, 0) + 1
+        while number in held:
+            number += 1
+        self.counters[category] = number
+        return number
+    
     def create_directories(self):
         """Create all output directories"""
         for main_cat, subcats in CATEGORIES.items():
             for subcat in subcats:
-                os.makedirs(os.path.join(OUTPUT_DIR, main_cat, subcat), exist_ok=True)
+                os.makedirs(os.path.join(self.output_dir, main_cat, subcat), exist_ok=True)
     
-    def process_events_directory(self):
-        """Handle all event images"""
-        events_dir = os.path.join(BASE_DIR, "events")
-        if not os.path.exists(events_dir):
+    def process_events_directory(self, entries=None):
+        """Handle all event images, or just entries (new files in watch mode)"""
+        events_dir = os.path.join(self.base_dir, "events")
+        if entries is None and not os.path.exists(events_dir):
             return
             
         print("\n📸 Processing EVENT images...")
         
-        for filename in os.listdir(events_dir):
-            if not filename.lower().endswith(('.jpg', '.jpeg', '.heic', '.png')):
-                continue
-                
-            source = os.path.join(events_dir, filename)
+        if entries is None:
+            with self.report.phase("scan"):
+                entries = scan_images(events_dir)
+        with self.report.phase("classify"):
+            self.classify_events(entries)
+    
+    def classify_events(self, entries):
+        """Name every event photo"""
+        shoots = self.categorise_by_night(entries)
+        for entry in entries:
+            filename = entry.name
             category = None
             new_name = None
+            series, num = match_series(filename)
+            uuid = uuid_stem(filename)
             
-            # Nikki Manfadge Drag Shows
-            if filename.startswith("Nikki Manfadge"):
-                match = re.match(r"Nikki Manfadge - (\d+)", filename)
-                if match:
-                    num = int(match.group(1))
-                    category = "drag-shows"
-                    templates = [
-                        "the-anchor-stanwell-moor-drag-show-nikki-manfadge-{:03d}",
-                        "the-anchor-heathrow-lgbtq-friendly-pub-drag-entertainment-{:03d}",
-                        "the-anchor-pub-drag-queen-performance-stanwell-moor-{:03d}",
-                        "the-anchor-drag-bingo-nikki-manfadge-near-heathrow-{:03d}"
-                    ]
-                    new_name = templates[num % len(templates)].format(num) + ".jpg"
+            # Nikki Manfadge Drag Shows / Tequila Tasting
+            if series in EVENT_TEMPLATES:
+                category, templates = EVENT_TEMPLATES[series]
+                new_name = templates[num % len(templates)].format(num) + ".jpg"
             
-            # Tequila Tasting
-            elif filename.startswith("Tequila Tasting"):
-                match = re.match(r"Tequila Tasting Night - (\d+)", filename)
-                if match:
-                    num = int(match.group(1))
-                    category = "tequila-tasting"
-                    templates = [
-                        "the-anchor-stanwell-moor-tequila-tasting-event-{:03d}",
-                        "the-anchor-heathrow-premium-spirits-tasting-{:03d}",
-                        "the-anchor-pub-tequila-masterclass-stanwell-moor-{:03d}"
-                    ]
-                    new_name = templates[num % len(templates)].format(num) + ".jpg"
+            # Cash Bingo Winner and other identified photos
+            elif uuid in EVENT_NAMES:
+                category, new_name = EVENT_NAMES[uuid]
             
-            # Cash Bingo Winner
-            elif filename == "C6DF23AC-98EF-46CE-978C-343D8EF5A2C8.jpeg":
-                category = "bingo"
-                new_name = "the-anchor-stanwell-moor-monthly-cash-bingo-winner.jpg"
+            # UUID files taken on a night the calendar knows
+            elif uuid and entry.path in shoots:
+                category = shoots[entry.path]
+                new_name = NIGHT_NAME.format(category, self.next_number(category, entry.path))
             
             # UUID files - need categorization
-            elif re.match(r"[A-F0-9]{8}-", filename.upper()):
+            elif uuid:
                 # Default to quiz-nights for now (would need manual review)
                 category = "quiz-nights"
-                new_name = f"the-anchor-pub-event-stanwell-moor-{len(self.processed):03d}.jpg"
+                new_name = f"the-anchor-pub-event-stanwell-moor-{self.next_number(category, entry.path):03d}.jpg"
             
             if category and new_name:
-                dest = os.path.join(OUTPUT_DIR, "events", category, new_name)
-                shutil.copy2(source, dest)
-                self.rename_log.append(f"Events: {filename} -> {category}/{new_name}")
-                print(f"  ✓ {category}: {new_name}")
+                self.queue("events", "Events", filename, entry.path, category, new_name)
     
-    def process_food_directory(self):
-        """Handle food images"""
-        food_dir = os.path.join(BASE_DIR, "food")
-        if not os.path.exists(food_dir):
+    def categorise_by_night(self, entries):
+        """{path: category} for UUID photos whose capture night is in the calendar"""
+        if not self.calendar:
+            return {}
+        paths = [entry.path for entry in entries
+                 if uuid_stem(entry.name) and uuid_stem(entry.name) not in EVENT_NAMES]
+        # Photos unchanged since the last run keep the night they were matched to then; only new ones are read
+        found, reused = categorise_unknown(paths, load_calendar(self.calendar), self.manifest)
+        # Only categories this script has folders for
+        found = {path: category for path, category in found.items() if category in CATEGORIES["events"]}
+        print(f"  {len(found)} of {len(paths)} unnamed photos matched to an event night ({reused} as last run)")
+        return found
+    
+    def process_food_directory(self, entries=None):
+        """Handle food images, or just entries"""
+        food_dir = os.path.join(self.base_dir, "food")
+        if entries is None and not os.path.exists(food_dir):
             return
             
         print("\n🍕 Processing FOOD images...")
         
-        food_names = {
-            "0249C5BF-AAB7-488C-91BC-75147F150258": ("mains", "the-anchor-stanwell-moor-traditional-british-pie-gravy.jpg"),
-            "4F0FE513-072A-46A4-AF1B-0AA865DC9DAC": ("mains", "the-anchor-pub-main-course-hearty-meal-heathrow.jpg"),
-            "585F57AF-AC7A-41D7-8459-1C19FE9A69D8": ("pizza", "the-anchor-stone-baked-pizza-stanwell-moor.jpg"),
-            "6B2C2E09-CB23-4DFB-8125-B64AF3E8925F": ("burgers", "the-anchor-gourmet-burger-pub-food-heathrow.jpg"),
-            "6B7B6E28-3B87-490F-BE03-2FC369E60C25": ("sunday-roast", "the-anchor-sunday-roast-dinner-stanwell-moor.jpg"),
-            "C5FACCEA-EF31-4FE8-BDA2-4514ACF326DF": ("mains", "the-anchor-pub-food-traditional-british-cuisine.jpg"),
-            "FC602420-61A5-4CD4-81FE-74D2ECFC9501": ("desserts", "the-anchor-dessert-sweet-treats-stanwell-moor.jpg")
-        }
-        
-        for filename in os.listdir(food_dir):
-            if not filename.lower().endswith(('.jpg', '.jpeg', '.heic', '.png')):
-                continue
+        if entries is None:
+            with self.report.phase("scan"):
+                entries = scan_images(food_dir)
+        with self.report.phase("classify"):
+            for entry in entries:
+                base_name = entry.name.split('_')[0].split('.')[0]
                 
-            source = os.path.join(food_dir, filename)
-            base_name = filename.split('_')[0].split('.')[0]
-            
-            if base_name in food_names:
-                category, new_name = food_names[base_name]
-            else:
-                category = "mains"
-                new_name = f"the-anchor-pub-food-stanwell-moor-{len(self.processed):03d}.jpg"
-            
-            dest = os.path.join(OUTPUT_DIR, "food", category, new_name)
-            shutil.copy2(source, dest)
-            self.rename_log.append(f"Food: {filename} -> {category}/{new_name}")
-            print(f"  ✓ {category}: {new_name}")
+                if base_name in FOOD_NAMES:
+                    category, new_name = FOOD_NAMES[base_name]
+                else:
+                    category = "mains"
+                    new_name = f"the-anchor-pub-food-stanwell-moor-{self.next_number(category, entry.path):03d}.jpg"
+                
+                self.queue("food", "Food", entry.name, entry.path, category, new_name)
     
-    def process_venue_directory(self):
-        """Handle venue images"""
-        venue_dir = os.path.join(BASE_DIR, "venue")
-        if not os.path.exists(venue_dir):
+    def process_venue_directory(self, entries=None):
+        """Handle venue images, or just entries"""
+        venue_dir = os.path.join(self.base_dir, "venue")
+        if entries is None and not os.path.exists(venue_dir):
             return
             
         print("\n🏠 Processing VENUE images...")
         
-        venue_names = [
-            "the-anchor-pub-interior-traditional-british-stanwell-moor",
-            "the-anchor-bar-area-local-pub-near-heathrow",
-            "the-anchor-restaurant-seating-area-stanwell-moor",
-            "the-anchor-pub-atmosphere-welcoming-interior-surrey",
-            "the-anchor-venue-private-events-space-heathrow"
-        ]
-        
-        for i, filename in enumerate(os.listdir(venue_dir)):
-            if not filename.lower().endswith(('.jpg', '.jpeg', '.heic', '.png')):
-                continue
-                
-            source = os.path.join(venue_dir, filename)
-            category = "interior"
-            new_name = f"{venue_names[i % len(venue_names)]}.jpg"
-            
-            dest = os.path.join(OUTPUT_DIR, "venue", category, new_name)
-            shutil.copy2(source, dest)
-            self.rename_log.append(f"Venue: {filename} -> {category}/{new_name}")
-            print(f"  ✓ {category}: {new_name}")
+        if entries is None:
+            with self.report.phase("scan"):
+                entries = scan_images(venue_dir)
+        with self.report.phase("classify"):
+            for entry in entries:
+                self.queue("venue", "Venue", entry.name, entry.path, "interior", self.venue_name(entry.path))
+    
+    def venue_name(self, source):
+        """A VENUE_NAMES name: the one source had before, else the first no other photo holds"""
+        previous = self.names.previous.get(source)
+        if previous and os.path.basename(os.path.dirname(previous)) == "interior":
+            return os.path.basename(previous)
+        free = [stem for stem in VENUE_NAMES if stem not in self.venue_held]
+        # Once every name is in use, rotate through them and let the name index add suffixes
+        stem = free[0] if free else VENUE_NAMES[(self.next_number("interior") - 1) % len(VENUE_NAMES)]
+        self.venue_held.add(stem)
+        return f"{stem}.jpg"
     
-    def process_garden_directory(self):
-        """Handle garden images"""
-        garden_dir = os.path.join(BASE_DIR, "garden")
-        if not os.path.exists(garden_dir):
+    def process_garden_directory(self, entries=None):
+        """Handle garden images, or just entries"""
+        garden_dir = os.path.join(self.base_dir, "garden")
+        if entries is None and not os.path.exists(garden_dir):
             return
             
         print("\n🌻 Processing GARDEN images...")
         
-        for filename in os.listdir(garden_dir):
-            if not filename.lower().endswith(('.jpg', '.jpeg', '.heic', '.png')):
-                continue
-                
-            source = os.path.join(garden_dir, filename)
-            category = "beer-garden"
-            new_name = "the-anchor-beer-garden-under-heathrow-flight-path-stanwell-moor.jpg"
-            
-            dest = os.path.join(OUTPUT_DIR, "garden", category, new_name)
-            shutil.copy2(source, dest)
-            self.rename_log.append(f"Garden: {filename} -> {category}/{new_name}")
-            print(f"  ✓ {category}: {new_name}")
+        if entries is None:
+            with self.report.phase("scan"):
+                entries = scan_images(garden_dir)
+        with self.report.phase("classify"):
+            for entry in entries:
+                self.queue("garden", "Garden", entry.name, entry.path, "beer-garden", GARDEN_NAME)
     
-    def process_logo_directory(self):
-        """Handle logo images"""
-        logo_dir = os.path.join(BASE_DIR, "logo")
-        if not os.path.exists(logo_dir):
+    def process_logo_directory(self, entries=None):
+        """Handle logo images, or just entries"""
+        logo_dir = os.path.join(self.base_dir, "logo")
+        if entries is None and not os.path.exists(logo_dir):
             return
             
         print("\n🎨 Processing LOGO images...")
         
-        logo_mapping = {
-            "White Logo Transparent.png": "the-anchor-pub-logo-white-transparent.png",
-            "Black Logo Transparent.png": "the-anchor-pub-logo-black-transparent.png"
-        }
-        
-        for filename in os.listdir(logo_dir):
-            if filename in logo_mapping:
-                source = os.path.join(logo_dir, filename)
-                category = "logos"
-                new_name = logo_mapping[filename]
-                
-                dest = os.path.join(OUTPUT_DIR, "branding", category, new_name)
-                shutil.copy2(source, dest)
-                self.rename_log.append(f"Logo: {filename} -> {category}/{new_name}")
-                print(f"  ✓ {category}: {new_name}")
+        if entries is None:
+            with self.report.phase("scan"):
+                entries = scan_images(logo_dir)
+        with self.report.phase("classify"):
+            for entry in entries:
+                if entry.name in LOGO_NAMES:
+                    self.queue("branding", "Logo", entry.name, entry.path, "logos", LOGO_NAMES[entry.name])
+    
+    def remove_duplicates(self):
+        """Report (or drop) near-identical burst frames before anything is copied"""
+        from image_dedup import find_duplicates
+
+        print(f"\n🔍 Checking {len(self.jobs)} images for duplicates...")
+        with self.report.phase("dedupe"):
+            # Hashes of sources unchanged since the last run come from the manifest
+            redundant = find_duplicates((job.source for job in self.jobs), cache=self.manifest)
+        for source, keeper in sorted(redundant.items()):
+            print(f"  ≈ {os.path.basename(source)} duplicates {os.path.basename(keeper)}")
+        if self.dedupe == "skip":
+            self.jobs = [job for job in self.jobs if job.source not in redundant]
+            for source in sorted(redundant):
+                self.report.note("skipped-duplicate", f"Skipped duplicate: {os.path.basename(source)} "
+                                                      f"(same shot as {os.path.basename(redundant[source])})")
+        print(f"  {len(redundant)} duplicates {'skipped' if self.dedupe == 'skip' else 'found'}")
+    
+    def copy_files(self):
+        """Copy every queued file in parallel, storing identical photos once"""
+        print(f"\n📦 Copying {len(self.jobs)} images...")
+        results = self.ingestor.run(self.jobs)
+        actions = {}
+        for result in results:
+            actions[result.action] = actions.get(result.action, 0) + 1
+        print("  " + ", ".join(f"{count} {action}" for action, count in sorted(actions.items())))
+        for path in self.ingestor.removed:
+            print(f"  🗑  removed {os.path.relpath(path, self.output_dir)} (source gone)")
+        warn_unconverted(self.ingestor)
+        self.copied = [result.job.dest for result in results]
+        self.jobs = []
+    
+    def generate_derivatives(self):
+        """Square-crop, resize and encode WebP/AVIF/JPEG versions of every copied image"""
+        from image_derivatives import TARGET_BYTES, generate
+
+        web_dir = os.path.join(self.output_dir, "web")
+        jobs = [
+            (path, os.path.join(web_dir, os.path.relpath(os.path.dirname(path), self.output_dir)))
+            for path in self.copied
+        ]
+        print(f"\n🖼  Generating web versions of {len(jobs)} images...")
+        written = over = total = 0
+        with self.report.phase("encode"):
+            for results in generate(jobs, square=self.derivatives == "square"):
+                for result in results:
+                    self.derived.append(result)
+                    total += 1
+                    self.report.file("encode", "encoded" if result.quality is not None else "unchanged",
+                                     result.size, result.source, result.path)
+                    if result.quality is not None:
+                        written += 1
+                    if result.over_budget:
+                        over += 1
+                        print(f"  ⚠️ {os.path.relpath(result.path, web_dir)} is {result.size // 1024} KB "
+                              f"(over {TARGET_BYTES // 1024} KB at minimum quality)")
+        print(f"  {written} written, {total - written} unchanged")
+    
+    def renaming_log(self):
+        """Log lines for the Markdown report, read back from the run report rather than kept in memory"""
+        self.report.flush()
+        for event in read_events(self.report_path):
+            if event["event"] == "file" and event.get("label"):
+                yield event["label"]
+            elif event["event"] == "note" and event["kind"] == "skipped-duplicate":
+                yield event["message"]
     
     def generate_report(self):
         """Generate comprehensive renaming report"""
-        report_path = os.path.join(OUTPUT_DIR, "seo-renaming-report.md")
+        report_path = os.path.join(self.output_dir, "seo-renaming-report.md")
         
         with open(report_path, "w") as f:
             f.write("# SEO Image Renaming Report\n")
             f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n")
             
             f.write("## Summary\n")
-            f.write(f"- Total images processed: {len(self.rename_log)}\n")
-            f.write(f"- Output directory: {OUTPUT_DIR}\n\n")
+            f.write(f"- Total images processed: {sum(1 for _ in self.renaming_log())}\n")
+            f.write(f"- Output directory: {self.output_dir}\n")
+            f.write(f"- Run report: {self.report_path}\n\n")
             
             f.write("## Renaming Log\n")
-            for entry in self.rename_log:
+            for entry in self.renaming_log():
                 f.write(f"- {entry}\n")
             
             f.write("\n## Next Steps\n")
             f.write("1. Review all renamed images\n")
             f.write("2. Select best 10-20 from each event category\n")
-            f.write("3. Square crop all selected images to 1:1 ratio\n")
-            f.write("4. Optimize file sizes (target: <200KB)\n")
-            f.write("5. Generate WebP versions\n")
-            f.write("6. Add alt text based on filenames\n")
+            if self.derived:
+                done = "cropped, resized" if self.derivatives == "square" else "resized"
+                f.write("3. Pick the web versions of the selected images from web/ "
+                        f"({len(self.derived)} files, already {done} and under 200KB)\n")
+            else:
+                f.write("3. Square crop all selected images to 1:1 ratio\n")
+                f.write("4. Optimize file sizes (target: <200KB)\n")
+                f.write("5. Generate WebP versions\n")
+            f.write(f"{4 if self.derived else 6}. Add alt text based on filenames\n")
         
         print(f"\n📄 Report saved to: {report_path}")
     
+    def sections(self):
+        """(source folder, handler) in processing order"""
+        return [
+            ("events", self.process_events_directory),
+            ("food", self.process_food_directory),
+            ("venue", self.process_venue_directory),
+            ("garden", self.process_garden_directory),
+            ("logo", self.process_logo_directory),
+        ]
+    
+    def place_queued(self):
+        """Dedupe, copy and optimise whatever has been queued"""
+        if self.dedupe != "off":
+            self.remove_duplicates()
+        self.copy_files()
+        if self.derivatives != "off":
+            self.generate_derivatives()
+    
+    def finish(self):
+        """Write the reports and close the manifest"""
+        with self.report.phase("report"):
+            self.generate_report()
+        self.manifest.close()
+        self.report.close()
+        
+        print("\n⏱  " + "\n".join(render(summarise(self.report_path))))
+        print(f"📄 Run report: {self.report_path}")
+    
     def run(self):
         """Execute all renaming operations"""
         print("🚀 Starting SEO Image Renaming Process")
         print("=" * 50)
         
-        self.process_events_directory()
-        self.process_food_directory()
-        self.process_venue_directory()
-        self.process_garden_directory()
-        self.process_logo_directory()
-        
-        self.generate_report()
+        self.seed_counters()
+        for _, handler in self.sections():
+            handler()
+        self.place_queued()
+        self.finish()
         
         print("\n✅ COMPLETE! All images have been renamed for SEO")
-        print(f"📁 Check: {OUTPUT_DIR}")
+        print(f"📁 Check: {self.output_dir}")
+    
+    def seed_counters(self):
+        """Note the numbers already handed out, so new photos get fresh numbers rather than hash suffixes"""
+        self.counters = {}
+        self.held = {}
+        self.venue_held = set()
+        for row in self.manifest.rows.values():
+            category = os.path.basename(os.path.dirname(row[4]))
+            match = NAME_NUMBER.search(os.path.basename(row[4]))
+            if match:
+                self.held.setdefault(category, set()).add(int(match.group(1)))
+            if category == "interior":
+                self.venue_held.add(os.path.splitext(NameIndex.family(os.path.basename(row[4])))[0])
+    
+    def ingest(self, paths):
+        """Categorise, rename and optimise just these source files and return how many were queued"""
+        by_folder = {}
+        for path in paths:
+            by_folder.setdefault(os.path.basename(os.path.dirname(path)), []).append(path)
+        for folder, handler in self.sections():
+            if folder in by_folder:
+                handler(source_entries(by_folder[folder]))
+        queued = len(self.jobs)
+        if queued:
+            self.place_queued()
+        return queued
+    
+    def watch(self, settle, poll=False, batch=64):
+        """Ingest photos as they land in the source folders, until interrupted"""
+        folders = [os.path.join(self.base_dir, folder) for folder, _ in self.sections()]
+        watcher = PhotoWatcher(folders, self.manifest.seen, settle=settle, poll=poll)
+        # Manifest rows are only read from the watcher thread; all writes stay on this one
+        self.seed_counters()
+        print(f"👀 Watching {', '.join(os.path.basename(d) for d in watcher.directories)} "
+              f"({watcher.watcher.kind}); Ctrl-C to stop")
+        # Stop as cleanly on a service manager's SIGTERM as on Ctrl-C
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        watcher.start()
+        try:
+            while watcher.is_alive():
+                paths = watcher.batch(batch, timeout=1.0)
+                if not paths:
+                    continue
+                started = time.perf_counter()
+                queued = self.ingest(paths)
+                print(f"⚡ {queued} of {len(paths)} new files ready in {time.perf_counter() - started:.1f}s")
+        except KeyboardInterrupt:
+            print("\nStopping...")
+        finally:
+            watcher.stop()
+        self.finish()
+
+def main():
+    parser = argparse.ArgumentParser(description="Rename images with SEO-friendly filenames")
+    parser.add_argument("--source", default=BASE_DIR, help="folder holding events/, food/, venue/, garden/ and logo/")
+    parser.add_argument("--dest", default=OUTPUT_DIR, help="output folder")
+    parser.add_argument("--mode", choices=["auto", "reflink", "link", "copy"], default="auto",
+                        help="how files are placed (default: reflink where supported, else copy)")
+    parser.add_argument("--workers", type=int, help="copy threads (default: 4 per core)")
+    parser.add_argument("--full", action="store_true", help="copy everything again, keeping the names handed out before")
+    parser.add_argument("--dedupe", choices=["off", "report", "skip"], default="off",
+                        help="find near-identical photos and report or skip them (needs Pillow and NumPy)")
+    parser.add_argument("--derivatives", choices=["off", "square", "original"],
+                        help="also write resized WebP/AVIF/JPEG versions under web/, square-cropped or not "
+                             "(needs Pillow; default: original with --watch, otherwise off)")
+    parser.add_argument("--heic-format", choices=["jpg", "webp"], default="jpg",
+                        help="what iPhone HEIC photos are converted to (needs Pillow and pillow-heif)")
+    parser.add_argument("--calendar", help="date→category JSON or exported what's-on events; UUID-named event "
+                                           "photos are filed by the night they were taken (needs Pillow)")
+    parser.add_argument("--watch", action="store_true",
+                        help="keep running and ingest new photos as they are dropped into the source folders")
+    parser.add_argument("--poll", action="store_true", help="with --watch, poll the folders instead of using inotify")
+    parser.add_argument("--settle", type=float, default=SETTLE_SECONDS,
+                        help=f"with --watch, seconds a file must stay unchanged before it is ingested "
+                             f"(default {SETTLE_SECONDS:g})")
+    parser.add_argument("--report", help="JSON-lines run report (default: runs/rename-all-images-<time>.jsonl "
+                                         "in the output folder)")
+    args = parser.parse_args()
+    derivatives = args.derivatives or ("original" if args.watch else "off")
+
+    renamer = CompleteImageRenamer(args.source, args.dest, mode=args.mode, workers=args.workers, full=args.full,
+                                   dedupe=args.dedupe, derivatives=derivatives,
+                                   heic_format=args.heic_format, calendar=args.calendar, report_path=args.report)
+    if args.watch:
+        renamer.watch(args.settle, poll=args.poll)
+    else:
+        renamer.run()
 
 if __name__ == "__main__":
-    renamer = CompleteImageRenamer()
-    renamer.run()
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -4,19 +4,18 @@ Image Renaming Script for The Anchor Pub
 Renames images with SEO-optimized filenames
 """
 
+import argparse
 import os
-import shutil
-from pathlib import Path
 import re
 
+from image_ingest import ASSETS_DIR, Ingestor, Job, scan_images, warn_unconverted
+from run_report import RunReport, render, summarise
+
 # Base directory for images
-BASE_DIR = "/Users/peterpitcher/Cursor/the-anchor.pub/assets/images/events"
-OUTPUT_DIR = "/Users/peterpitcher/Cursor/the-anchor.pub/assets/images/renamed"
+BASE_DIR = os.path.join(ASSETS_DIR, "events")
+OUTPUT_DIR = os.path.join(ASSETS_DIR, "renamed")
 
-# Create output directories
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-for subdir in ["drag-shows", "tequila-tasting", "bingo", "british-celebrations", "karaoke", "general"]:
-    os.makedirs(os.path.join(OUTPUT_DIR, subdir), exist_ok=True)
+SUBDIRS = ["drag-shows", "tequila-tasting", "bingo", "british-celebrations", "karaoke", "general"]
 
 # Mapping of image patterns to SEO-friendly names
 RENAME_MAPPINGS = {
@@ -78,7 +77,7 @@ def get_seo_name(filename, index=1):
                 variant_index = (int(match.group(1)) - 1) % len(config["variants"])
                 return config["category"], config["variants"][variant_index].format(int(match.group(1)))
             else:
-                return config["category"], config["base_name"].format(int(match.group(1)))
+                return config["category"], config["base_name"].format(*map(int, match.groups()))
     
     # For UUID-style names, categorize based on visual inspection results
     if re.match(r"[A-F0-9]{8}-[A-F0-9]{4}-[A-F0-9]{4}-[A-F0-9]{4}-[A-F0-9]{12}", filename.upper()):
@@ -90,27 +89,48 @@ def get_seo_name(filename, index=1):
 
 def main():
     """Main renaming function"""
+    parser = argparse.ArgumentParser(description="Rename event images with SEO-friendly filenames")
+    parser.add_argument("--source", default=BASE_DIR, help="folder of event photos")
+    parser.add_argument("--dest", default=OUTPUT_DIR, help="output folder")
+    parser.add_argument("--mode", choices=["auto", "reflink", "link", "copy"], default="auto",
+                        help="how files are placed (default: reflink where supported, else copy)")
+    parser.add_argument("--workers", type=int, help="copy threads (default: 4 per core)")
+    parser.add_argument("--report", help="also write a JSON-lines run report with timings and every file copied")
+    args = parser.parse_args()
+    report = RunReport(args.report, "rename-images", source=args.source, dest=args.dest, mode=args.mode)
+
+    # Create output directories
+    for subdir in SUBDIRS:
+        os.makedirs(os.path.join(args.dest, subdir), exist_ok=True)
     
     # Counter for general images
     general_counter = 1
+    jobs = []
     
-    # Process all images
-    for filename in os.listdir(BASE_DIR):
-        if filename.lower().endswith(('.jpeg', '.jpg', '.heic')):
-            source_path = os.path.join(BASE_DIR, filename)
-            
-            # Get SEO-friendly name
-            category, new_name = get_seo_name(filename, general_counter)
-            
-            # Create destination path
-            dest_path = os.path.join(OUTPUT_DIR, category, new_name)
-            
-            # Copy file with new name
-            print(f"Renaming: {filename} -> {category}/{new_name}")
-            shutil.copy2(source_path, dest_path)
-            
-            if category == "general":
-                general_counter += 1
+    # Work out every new name first, then copy them all in parallel
+    with report.phase("scan"):
+        entries = scan_images(args.source, ('.jpeg', '.jpg', '.heic'))
+    for entry in entries:
+        filename = entry.name
+        
+        # Get SEO-friendly name
+        category, new_name = get_seo_name(filename, general_counter)
+        
+        # Create destination path
+        dest_path = os.path.join(args.dest, category, new_name)
+        
+        print(f"Renaming: {filename} -> {category}/{new_name}")
+        jobs.append(Job(entry.path, dest_path, filename))
+        
+        if category == "general":
+            general_counter += 1
+
+    ingestor = Ingestor(mode=args.mode, workers=args.workers, report=report)
+    ingestor.run(jobs)
+    warn_unconverted(ingestor)
+    report.close()
+    if args.report:
+        print("\n" + "\n".join(render(summarise(args.report))))
 
     print("\nRenaming complete! Check the 'renamed' directory for your SEO-optimized images.")
     print("\nNext steps:")
@@ -121,4 +141,4 @@ def main():
     print("5. Generate WebP versions")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,25 @@
+"""
+Repository Paths for The Anchor Pub
+Where the checkout is, and how generated files are written into it, for
+every script in scripts/utils. Kept free of other imports so any tool can
+use it without loading the redirect or image tooling
+"""
+
+import os
+
+# Repository root (this file lives in scripts/utils)
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+
+def write_if_changed(path, data):
+    """Write data unless the file already holds it, so its mtime only moves on real changes"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            if f.read() == data:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path + ".part", "w", encoding="utf-8") as f:
+        f.write(data)
+    os.replace(path + ".part", path)
+    return True
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Run Reports for The Anchor Pub tooling
+Per-phase timers, per-file byte counters and cache-hit counts, streamed to a
+JSON-lines file as the work happens. The human summary is rendered from that
+file afterwards, so runs can be compared without parsing prose
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+# File actions that mean the work was already done
+CACHE_HITS = ("unchanged", "cached")
+
+
+class RunReport:
+    """Writes one JSON object per line; safe to share between threads
+
+    Every line has an "event" and "t", seconds since the run started:
+
+    run     the tool and anything that identifies the run (first line)
+    phase   one timed block of work: phase, seconds
+    file    one file handled: phase, action, bytes, source/dest when known
+    count   a named counter: name, n
+    note    anything else worth keeping: kind, message
+    end     total seconds and exit code (last line)
+
+    A phase may run several times (copying happens before and after
+    transcoding, for instance); the summary adds them up. With no path
+    nothing is written, so callers never need to check whether reporting
+    is on.
+    """
+
+    def __init__(self, path=None, tool=None, **details):
+        self.path = path
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.stream = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self.stream = open(path, "w", encoding="utf-8")
+            self.write("run", tool=tool, started=datetime.now().isoformat(timespec="seconds"), **details)
+
+    def write(self, event, flush=True, **fields):
+        if self.stream is None:
+            return
+        line = json.dumps({"event": event, "t": round(time.perf_counter() - self.started, 4), **fields})
+        with self.lock:
+            self.stream.write(line + "\n")
+            # File lines are left to the buffer; everything else is visible to `tail -f` straight away
+            if flush:
+                self.stream.flush()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.write("phase", phase=name, seconds=round(time.perf_counter() - started, 4))
+
+    def file(self, phase, action, size, source=None, dest=None, **fields):
+        self.write("file", flush=False, phase=phase, action=action, bytes=size, source=source, dest=dest, **fields)
+
+    def count(self, name, n=1):
+        self.write("count", name=name, n=n)
+
+    def note(self, kind, message, **fields):
+        self.write("note", kind=kind, message=message, **fields)
+
+    def flush(self):
+        if self.stream is not None:
+            with self.lock:
+                self.stream.flush()
+
+    def close(self, exit_code=0):
+        if self.stream is None:
+            return
+        self.write("end", seconds=round(time.perf_counter() - self.started, 4), exit_code=exit_code)
+        self.stream.close()
+        self.stream = None
+
+
+def default_path(directory, tool):
+    """A timestamped report file in directory/runs, so earlier runs are kept for comparison
+
+    Microseconds and the process id keep back-to-back or concurrent runs from sharing a file.
+    """
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    return os.path.join(directory, "runs", f"{tool}-{stamp}-{os.getpid()}.jsonl")
+
+
+def read_events(path):
+    """Each event in a report file, in order; a line cut short by a crash is skipped"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def summarise(path):
+    """Totals from a report file
+
+    {"run": {...}, "end": {...} or None, "counts": {name: n}, "notes": {kind: n},
+     "phases": {name: {"seconds", "runs", "files", "bytes", "hits", "hit_bytes", "actions"}}}
+    with phases in the order they first started; hit_bytes is the part of bytes
+    that belongs to cache hits, which were never read or written
+    """
+    summary = {"run": {}, "end": None, "counts": {}, "notes": {}, "phases": {}}
+    phases = summary["phases"]
+    starts = {}
+
+    def totals(name):
+        if name not in phases:
+            phases[name] = {"seconds": 0.0, "runs": 0, "files": 0, "bytes": 0, "hits": 0, "hit_bytes": 0,
+                            "actions": {}}
+        return phases[name]
+
+    for event in read_events(path):
+        kind = event.get("event")
+        if kind == "run":
+            summary["run"] = event
+        elif kind == "end":
+            summary["end"] = event
+        elif kind == "phase":
+            phase = totals(event["phase"])
+            phase["seconds"] += event["seconds"]
+            phase["runs"] += 1
+            starts.setdefault(event["phase"], event["t"] - event["seconds"])
+        elif kind == "file":
+            phase = totals(event["phase"])
+            phase["files"] += 1
+            phase["bytes"] += event.get("bytes") or 0
+            action = event.get("action")
+            phase["actions"][action] = phase["actions"].get(action, 0) + 1
+            if action in CACHE_HITS:
+                phase["hits"] += 1
+                phase["hit_bytes"] += event.get("bytes") or 0
+        elif kind == "count":
+            summary["counts"][event["name"]] = summary["counts"].get(event["name"], 0) + event["n"]
+        elif kind == "note":
+            summary["notes"][event["kind"]] = summary["notes"].get(event["kind"], 0) + 1
+    # File lines for a phase are written before the phase line that closes it
+    order = sorted(phases, key=lambda name: starts.get(name, float("inf")))
+    summary["phases"] = {name: phases[name] for name in order}
+    return summary
+
+
+def _mb(size):
+    return size / (1024 * 1024)
+
+
+def render(summary):
+    """Human-readable lines for a summary"""
+    run = summary["run"]
+    end = summary["end"]
+    title = f"{run.get('tool') or 'run'} started {run.get('started', '?')}"
+    if end:
+        title += f", {end['seconds']:.2f}s, exit {end['exit_code']}"
+    else:
+        title += " (did not finish)"
+    lines = [title, f"  {'phase':<10} {'time':>9} {'files':>7} {'MB':>9} {'MB/s':>8} {'cached':>7}"]
+    for name, phase in summary["phases"].items():
+        seconds = phase["seconds"]
+        # Throughput counts only bytes actually handled, not outputs left alone as unchanged
+        moved = phase["bytes"] - phase.get("hit_bytes", 0)
+        rate = f"{_mb(moved) / seconds:.1f}" if moved and seconds > 0 else ""
+        size = f"{_mb(phase['bytes']):.1f}" if phase["bytes"] else ""
+        hits = f"{phase['hits'] / phase['files']:.0%}" if phase["files"] else ""
+        lines.append(f"  {name:<10} {seconds:>8.3f}s {phase['files'] or '':>7} {size:>9} {rate:>8} {hits:>7}")
+    for name, phase in summary["phases"].items():
+        actions = ", ".join(f"{n} {action}" for action, n in sorted(phase["actions"].items()))
+        if actions:
+            lines.append(f"  {name}: {actions}")
+    for name, n in sorted(summary["counts"].items()):
+        lines.append(f"  {name}: {n}")
+    for kind, n in sorted(summary["notes"].items()):
+        lines.append(f"  {kind}: {n} noted")
+    return lines
+
+
+def _change(new, old):
+    if not old:
+        return ""
+    return f"{(new - old) / old * 100:+.0f}%"
+
+
+def render_diff(before, after):
+    """Lines comparing phase times, files and bytes of two summaries"""
+    lines = [f"  {'phase':<10} {'before':>9} {'after':>9} {'change':>7} {'files':>13} {'MB':>15}"]
+    names = list(before["phases"]) + [name for name in after["phases"] if name not in before["phases"]]
+    empty = {"seconds": 0.0, "files": 0, "bytes": 0}
+    for name in names:
+        old = before["phases"].get(name, empty)
+        new = after["phases"].get(name, empty)
+        lines.append(f"  {name:<10} {old['seconds']:>8.3f}s {new['seconds']:>8.3f}s "
+                     f"{_change(new['seconds'], old['seconds']):>7} "
+                     f"{old['files']:>6}→{new['files']:<6} {_mb(old['bytes']):>7.1f}→{_mb(new['bytes']):<7.1f}")
+    old_end, new_end = before["end"], after["end"]
+    if old_end and new_end:
+        lines.append(f"  {'total':<10} {old_end['seconds']:>8.3f}s {new_end['seconds']:>8.3f}s "
+                     f"{_change(new_end['seconds'], old_end['seconds']):>7}")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise a run report, or compare it with an earlier one")
+    parser.add_argument("report", help="JSON-lines report written by one of the tools")
+    parser.add_argument("--diff", metavar="EARLIER", help="an earlier report to compare with")
+    parser.add_argument("--json", action="store_true", help="print the summary as JSON")
+    args = parser.parse_args(argv)
+
+    summary = summarise(args.report)
+    if args.json:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+        return 0
+    if args.diff:
+        print("\n".join(render_diff(summarise(args.diff), summary)))
+        return 0
+    print("\n".join(render(summary)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Site Routes for The Anchor Pub
+Every path the site answers itself, without a redirect: app/ pages and
+route handlers, files in public/, blog posts and their images
+"""
+
+import os
+import re
+from collections import namedtuple
+
+from repo_paths import ROOT_DIR
+
+# Files that turn an app/ folder into a route
+ROUTE_FILES = re.compile(r"^(page|route)\.(tsx?|jsx?|mdx)$")
+
+# Metadata files Next.js serves at a fixed URL
+METADATA_ROUTES = {
+    "sitemap": "/sitemap.xml",
+    "robots": "/robots.txt",
+    "manifest": "/manifest.webmanifest",
+    "icon": "/icon",
+    "apple-icon": "/apple-icon",
+    "opengraph-image": "/opengraph-image",
+}
+
+# segments: ("static", name), ("param", name), ("catch-all", name) or ("optional-catch-all", name)
+Route = namedtuple("Route", "path segments file")
+
+
+def _segment(name):
+    if name.startswith("[[...") and name.endswith("]]"):
+        return ("optional-catch-all", name[5:-2])
+    if name.startswith("[...") and name.endswith("]"):
+        return ("catch-all", name[4:-1])
+    if name.startswith("[") and name.endswith("]"):
+        return ("param", name[1:-1])
+    return ("static", name)
+
+
+def app_routes(root=ROOT_DIR):
+    """Every page and route handler under app/, with its URL segments"""
+    app_dir = os.path.join(root, "app")
+    routes = []
+    stack = [(app_dir, ())]
+    while stack:
+        directory, segments = stack.pop()
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_dir():
+                name = entry.name
+                # _private folders aren't routable; (groups) and @slots add no segment
+                if name.startswith("_"):
+                    continue
+                if (name.startswith("(") and name.endswith(")")) or name.startswith("@"):
+                    stack.append((entry.path, segments))
+                else:
+                    stack.append((entry.path, segments + (_segment(name),)))
+                continue
+            stem = os.path.splitext(entry.name)[0]
+            if ROUTE_FILES.match(entry.name):
+                path = "/" + "/".join(
+                    name if kind == "static" else f"[...{name}]" if kind == "catch-all"
+                    else f"[[...{name}]]" if kind == "optional-catch-all" else f"[{name}]"
+                    for kind, name in segments
+                )
+                routes.append(Route(path, segments, entry.path))
+            elif not segments and stem in METADATA_ROUTES:
+                target = METADATA_ROUTES[stem]
+                routes.append(Route(target, (("static", target[1:]),), entry.path))
+    routes.sort(key=lambda r: r.path)
+    return routes
+
+
+def public_files(root=ROOT_DIR):
+    """URL paths of every file in public/ (Next.js serves them from the site root)"""
+    public_dir = os.path.join(root, "public")
+    paths = []
+    for directory, dirs, files in os.walk(public_dir):
+        relative = os.path.relpath(directory, public_dir)
+        prefix = "" if relative == "." else "/" + relative.replace(os.sep, "/")
+        paths.extend(f"{prefix}/{name}" for name in files)
+    paths.sort()
+    return paths
+
+
+def blog_slugs(root=ROOT_DIR):
+    """Post folder names in content/blog, which are the /blog/<slug> URLs"""
+    blog_dir = os.path.join(root, "content", "blog")
+    try:
+        with os.scandir(blog_dir) as it:
+            return sorted(e.name for e in it if e.is_dir() and os.path.isfile(os.path.join(e.path, "index.md")))
+    except FileNotFoundError:
+        return []
+
+
+class RouteTable:
+    """Answers "does the site serve this path itself?" with set lookups
+
+    Static routes, public files and blog assets are hashed; dynamic app
+    routes are kept as segment lists and only consulted on a miss. The
+    /blog/[slug] route only counts for slugs that have a post.
+    """
+
+    def __init__(self, root=ROOT_DIR):
+        self.root = root
+        self.routes = app_routes(root)
+        self.slugs = blog_slugs(root)
+        self.static = {r.path.lower() for r in self.routes if all(kind == "static" for kind, _ in r.segments)}
+        self.files = set(public_files(root))
+        self.dynamic = [r for r in self.routes if r.path.lower() not in self.static]
+        self.blog_assets = set()
+        blog_dir = os.path.join(root, "content", "blog")
+        for directory, dirs, files in os.walk(blog_dir):
+            relative = os.path.relpath(directory, blog_dir).replace(os.sep, "/")
+            prefix = "/content/blog" + ("" if relative == "." else "/" + relative)
+            self.blog_assets.update(f"{prefix}/{name}" for name in files)
+        self._slug_set = {slug.lower() for slug in self.slugs}
+
+    def _match_dynamic(self, route, parts):
+        segments = route.segments
+        for i, (kind, name) in enumerate(segments):
+            if kind in ("catch-all", "optional-catch-all"):
+                return len(parts) > i or kind == "optional-catch-all"
+            if i >= len(parts):
+                return False
+            if kind == "static" and parts[i].lower() != name.lower():
+                return False
+        return len(parts) == len(segments)
+
+    def route_for(self, path):
+        """The app route that serves path (only for page routes, not public files), or None"""
+        path = path.rstrip("/") or "/"
+        if path.lower() in self.static:
+            return next(r for r in self.routes if r.path.lower() == path.lower())
+        parts = [p for p in path.split("/") if p]
+        for route in self.dynamic:
+            if self._match_dynamic(route, parts):
+                return route
+        return None
+
+    def exists(self, path):
+        """True when the site answers path with a page, handler or file"""
+        path = path.split("?", 1)[0].split("#", 1)[0]
+        if path in self.files or path in self.blog_assets:
+            return True
+        lowered = path.rstrip("/").lower() or "/"
+        if lowered in self.static:
+            return True
+        if lowered.startswith("/blog/") and lowered.count("/") == 2:
+            return lowered[len("/blog/"):] in self._slug_set
+        if lowered.startswith("/content/blog/"):
+            return path in self.blog_assets
+        return self.route_for(path) is not None
+
+    def dynamic_under(self, prefix):
+        """Dynamic routes that would answer some one-segment path under prefix"""
+        parts = [p for p in prefix.split("/") if p]
+        found = []
+        for route in self.dynamic:
+            segments = route.segments
+            if len(segments) <= len(parts):
+                # A catch-all higher up still reaches below prefix
+                if segments and segments[-1][0].endswith("catch-all") and all(
+                    kind != "static" or (i < len(parts) and parts[i].lower() == name.lower())
+                    for i, (kind, name) in enumerate(segments[:-1])
+                ):
+                    found.append(route)
+                continue
+            if all(kind != "static" or parts[i].lower() == name.lower()
+                   for i, (kind, name) in enumerate(segments[:len(parts)])):
+                if segments[len(parts)][0] != "static":
+                    found.append(route)
+        return found
+
+    def known_paths(self):
+        """Every concrete path the site serves, for replays"""
+        paths = set(r.path for r in self.routes if r.path.lower() in self.static)
+        paths.update(self.files)
+        paths.update(f"/blog/{slug}" for slug in self.slugs)
+        return sorted(paths)
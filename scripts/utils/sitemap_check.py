@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Sitemap Checker for The Anchor Pub
+Streams public/sitemap-priority.xml and follows every <loc> through the
+redirect rules and middleware, reporting entries that redirect, loop or
+point at pages that don't exist, and optionally writes a corrected sitemap
+"""
+
+import argparse
+import os
+import sys
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from urllib.parse import urlsplit
+from xml.sax.saxutils import escape
+
+from check_redirects import ROOT_DIR, load_redirects, served_rules
+from site_routes import RouteTable
+from url_replay import Resolver, display, load_tracking_params
+
+SITEMAP_PATH = os.path.join(ROOT_DIR, "public", "sitemap-priority.xml")
+
+NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
+
+# Child elements of <url>, in the order the sitemap protocol lists them
+FIELDS = ("loc", "lastmod", "changefreq", "priority")
+
+Entry = namedtuple("Entry", "loc lastmod changefreq priority")
+
+# status is one of: ok, redirect, loop, missing-post, not-found, external
+Checked = namedtuple("Checked", "entry status final hops")
+
+MESSAGES = {
+    "redirect": "redirects to",
+    "loop": "loops, last at",
+    "missing-post": "has no content/blog post:",
+    "not-found": "is not a page:",
+    "external": "leaves the site for",
+}
+
+
+def iter_entries(source):
+    """Yield each <url> as an Entry, discarding parsed elements so memory stays flat"""
+    tag = f"{{{NAMESPACE}}}url"
+    context = ET.iterparse(source, events=("start", "end"))
+    root = None
+    for event, element in context:
+        if event == "start":
+            if root is None:
+                root = element
+            continue
+        if element.tag != tag:
+            continue
+        values = {}
+        for child in element:
+            name = child.tag.rsplit("}", 1)[-1]
+            if name in FIELDS:
+                values[name] = (child.text or "").strip()
+        yield Entry(*(values.get(field) for field in FIELDS))
+        # Drop the finished <url> and anything the root still holds
+        element.clear()
+        root.clear()
+
+
+def check_entries(entries, resolver, routes):
+    """One Checked per entry, following redirects and then checking the page exists"""
+    for entry in entries:
+        if not entry.loc:
+            continue
+        replay = resolver.resolve(entry.loc)
+        final_path = urlsplit(replay.final).path or "/"
+        if replay.status in ("loop", "too-many-hops"):
+            status = "loop"
+        elif replay.status == "external":
+            status = "external"
+        elif final_path.startswith("/blog/") and final_path.count("/") == 2 and not routes.exists(final_path):
+            status = "missing-post"
+        elif not routes.exists(final_path):
+            status = "not-found"
+        elif replay.hops:
+            status = "redirect"
+        else:
+            status = "ok"
+        yield Checked(entry, status, replay.final, replay.hops)
+
+
+def print_problems(checked, counts):
+    """Pass every result through, printing problems to stderr as they go by and counting them in counts"""
+    for result in checked:
+        counts["entries"] += 1
+        if result.status != "ok":
+            counts["problems"] += 1
+            print(f"⚠️  {display(result.entry.loc)} {MESSAGES[result.status]} {display(result.final)}"
+                  + (f" ({result.hops} hops)" if result.hops else ""), file=sys.stderr)
+        yield result
+
+
+def write_sitemap(checked, out):
+    """Write a sitemap of the entries worth keeping: redirects replaced by where they land, dead ones dropped"""
+    out.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    out.write(f'<urlset xmlns="{NAMESPACE}">\n')
+    seen = set()
+    written = 0
+    for result in checked:
+        if result.status not in ("ok", "redirect"):
+            continue
+        entry = result.entry._replace(loc=result.final) if result.status == "redirect" else result.entry
+        if entry.loc in seen:
+            continue
+        seen.add(entry.loc)
+        out.write("  <url>\n")
+        for field in FIELDS:
+            value = getattr(entry, field)
+            if value:
+                out.write(f"    <{field}>{escape(value)}</{field}>\n")
+        out.write("  </url>\n")
+        written += 1
+    out.write("</urlset>\n")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check sitemap entries against the redirects and routes")
+    parser.add_argument("--root", default=ROOT_DIR, help="repository root (default: this checkout)")
+    parser.add_argument("--sitemap", default=SITEMAP_PATH, help="sitemap to check")
+    parser.add_argument("--write", metavar="FILE", help="write a corrected sitemap here ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    # Every <loc> is different, so caching resolutions would only hold the whole sitemap in memory
+    resolver = Resolver(served_rules(load_redirects(args.root)), load_tracking_params(args.root), cache_size=0)
+    routes = RouteTable(args.root)
+
+    # One pass over the sitemap: each entry is checked, reported and written before the next is read
+    counts = {"entries": 0, "problems": 0}
+    results = print_problems(check_entries(iter_entries(args.sitemap), resolver, routes), counts)
+    if args.write:
+        if args.write == "-":
+            written = write_sitemap(results, sys.stdout)
+        else:
+            # The sitemap is still being read while this is written, so --write may name the same file
+            partial = args.write + ".part"
+            try:
+                with open(partial, "w", encoding="utf-8") as out:
+                    written = write_sitemap(results, out)
+            except BaseException:
+                if os.path.exists(partial):
+                    os.remove(partial)
+                raise
+            os.replace(partial, args.write)
+    else:
+        for _ in results:
+            pass
+    print(f"\n{counts['entries']} sitemap entries, {counts['problems']} with problems", file=sys.stderr)
+    if args.write:
+        print(f"📄 Wrote {written} entries to {args.write}", file=sys.stderr)
+    return 1 if counts["problems"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
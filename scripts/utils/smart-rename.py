@@ -4,15 +4,20 @@ Smart Image Renaming for The Anchor Pub
 Handles all image types with SEO-optimized names
 """
 
+import argparse
 import os
-import re
-import shutil
-from pathlib import Path
 from datetime import datetime
 
+from event_clusters import NIGHT_NAME, categorise_unknown, load_calendar
+from image_ingest import (
+    ASSETS_DIR, IMAGE_EXTENSIONS, MANIFEST_NAME, NAME_NUMBER, Ingestor, Job, Manifest, NameIndex, match_series,
+    scan_images, uuid_stem, warn_unconverted
+)
+from run_report import RunReport, default_path, read_events, render, summarise
+
 # Configuration
-SOURCE_DIR = "/Users/peterpitcher/Cursor/the-anchor.pub/assets/images/events"
-DEST_BASE = "/Users/peterpitcher/Cursor/the-anchor.pub/assets/images/seo-optimized"
+SOURCE_DIR = os.path.join(ASSETS_DIR, "events")
+DEST_BASE = os.path.join(ASSETS_DIR, "seo-optimized")
 
 # Create destination structure
 CATEGORIES = {
@@ -26,14 +31,50 @@ CATEGORIES = {
     "venue-atmosphere": "Venue & Atmosphere"
 }
 
-for cat in CATEGORIES:
-    os.makedirs(os.path.join(DEST_BASE, cat), exist_ok=True)
-
 class ImageRenamer:
-    def __init__(self):
-        self.counters = {cat: 1 for cat in CATEGORIES}
-        self.processed = []
+    def __init__(self, source_dir=SOURCE_DIR, dest_base=DEST_BASE, mode="auto", workers=None, shoots=None,
+                 report=None):
+        self.source_dir = source_dir
+        self.dest_base = dest_base
+        for cat in CATEGORIES:
+            os.makedirs(os.path.join(self.dest_base, cat), exist_ok=True)
+        # The manifest remembers which source owns which name between runs
+        self.manifest = Manifest(os.path.join(self.dest_base, MANIFEST_NAME))
+        # Timings and every file handled are streamed here; the text report is rendered from it
+        self.report = report or RunReport(default_path(dest_base, "smart-rename"), "smart-rename",
+                                          source=source_dir, dest=dest_base)
+        self.ingestor = Ingestor(mode=mode, workers=workers, manifest=self.manifest, report=self.report)
+        self.names = NameIndex(self.manifest)
+        self.counters = {}
+        # Numbers already in generated names, by category, so new photos are numbered past or between them
+        self.held = {}
+        for row in self.manifest.rows.values():
+            match = NAME_NUMBER.search(os.path.basename(row[4]))
+            if match:
+                self.held.setdefault(os.path.basename(os.path.dirname(row[4])), set()).add(int(match.group(1)))
+        self.processed = 0
+        self.jobs = []
+        # {path: category} for photos matched to an event night by capture time
+        self.shoots = shoots or {}
         
+    def next_number(self, category, source):
+        """Running number for generically named images in a category
+
+        A source numbered on an earlier run keeps its number; anything else
+        gets the lowest number no earlier photo holds.
+        """
+        previous = self.names.previous.get(source)
+        if previous and os.path.basename(os.path.dirname(previous)) == category:
+            match = NAME_NUMBER.search(os.path.basename(previous))
+            if match:
+                return int(match.group(1))
+        held = self.held.get(category, ())
+        number = self.counters.get(category, 0) + 1
+        while number in held:
+            number += 1
+        self.counters[category] = number
+        return number
+    
     def get_nikki_name(self, number):
         """Generate varied names for Nikki Manfadge drag show images"""
         templates = [
@@ -73,118 +114,156 @@ class ImageRenamer:
             # Add more specific mappings as identified
         }
         
-        uuid_part = filename.split('_')[0].split('.')[0]
+        uuid_part = uuid_stem(filename)
         if uuid_part in known_mappings:
             return known_mappings[uuid_part]
         
+        # Taken on a night the calendar knows
+        source_path = os.path.join(self.source_dir, filename)
+        category = self.shoots.get(source_path)
+        if category in CATEGORIES:
+            return category, NIGHT_NAME.format(category, self.next_number(category, source_path))
+        
         # Default categorization for unknown UUIDs
         # These would need manual review
         return "general-events", None
     
     def process_image(self, filename):
-        """Process a single image file"""
-        source_path = os.path.join(SOURCE_DIR, filename)
+        """Work out the category and name for a single image file"""
+        source_path = os.path.join(self.source_dir, filename)
         
         # Skip non-image files
-        if not filename.lower().endswith(('.jpeg', '.jpg', '.heic', '.png')):
+        if not filename.lower().endswith(IMAGE_EXTENSIONS):
             return
         
         # Determine category and new name
         category = None
         new_name = None
+        series, number = match_series(filename)
         
         # Nikki Manfadge series
-        if filename.startswith("Nikki Manfadge"):
-            match = re.match(r"Nikki Manfadge - (\d+)\.", filename)
-            if match:
-                number = int(match.group(1))
-                category = "drag-shows"
-                new_name = self.get_nikki_name(number)
+        if series == "nikki-manfadge":
+            category = "drag-shows"
+            new_name = self.get_nikki_name(number)
         
         # Tequila Tasting series
-        elif filename.startswith("Tequila Tasting Night"):
-            match = re.match(r"Tequila Tasting Night - (\d+)\.", filename)
-            if match:
-                number = int(match.group(1))
-                category = "tequila-tasting"
-                new_name = self.get_tequila_name(number)
+        elif series == "tequila-tasting":
+            category = "tequila-tasting"
+            new_name = self.get_tequila_name(number)
         
         # UUID-style names
-        elif re.match(r"[A-F0-9]{8}-[A-F0-9]{4}", filename.upper()):
+        elif uuid_stem(filename):
             category, new_name = self.categorize_uuid_image(filename)
             if not new_name:
-                new_name = f"the-anchor-pub-event-stanwell-moor-{self.counters[category]:03d}.jpg"
-                self.counters[category] += 1
+                new_name = f"the-anchor-pub-event-stanwell-moor-{self.next_number(category, source_path):03d}.jpg"
         
         # Default handling
         else:
             category = "general-events"
-            new_name = f"the-anchor-stanwell-moor-pub-event-{self.counters[category]:03d}.jpg"
-            self.counters[category] += 1
+            new_name = f"the-anchor-stanwell-moor-pub-event-{self.next_number(category, source_path):03d}.jpg"
         
-        # Copy file with new name
+        # Queue the copy with a unique, stable name
         if category and new_name:
-            dest_path = os.path.join(DEST_BASE, category, new_name)
-            
-            # Ensure unique filenames
-            if os.path.exists(dest_path):
-                base, ext = os.path.splitext(new_name)
-                counter = 2
-                while os.path.exists(dest_path):
-                    new_name = f"{base}-v{counter}{ext}"
-                    dest_path = os.path.join(DEST_BASE, category, new_name)
-                    counter += 1
+            directory = os.path.join(self.dest_base, category)
+            new_name = self.names.claim(directory, new_name, source_path)
+            dest_path = os.path.join(directory, new_name)
             
             print(f"Processing: {filename} -> {category}/{new_name}")
-            shutil.copy2(source_path, dest_path)
-            
-            self.processed.append({
-                "original": filename,
-                "category": category,
-                "new_name": new_name
-            })
+            self.jobs.append(Job(source_path, dest_path, filename))
+            self.processed += 1
+    
+    def copy_files(self):
+        """Copy every queued image in parallel"""
+        results = self.ingestor.run(self.jobs)
+        duplicates = sum(1 for r in results if r.action.startswith("duplicate"))
+        unchanged = sum(1 for r in results if r.action == "unchanged")
+        transcoded = sum(1 for r in results if r.action.startswith("transcoded"))
+        print(f"\n📦 Copied {len(results) - unchanged} images, {unchanged} unchanged "
+              f"({duplicates} identical files stored once, {transcoded} converted from HEIC/PNG)")
+        warn_unconverted(self.ingestor)
+        self.jobs = []
     
     def generate_report(self):
         """Generate a report of all renamed images"""
-        report_path = os.path.join(DEST_BASE, "renaming-report.txt")
+        report_path = os.path.join(self.dest_base, "renaming-report.txt")
+        # Read back from the run report: only the examples and a count per category are held
+        examples = {cat: [] for cat in CATEGORIES}
+        totals = dict.fromkeys(CATEGORIES, 0)
+        self.report.flush()
+        for event in read_events(self.report.path):
+            if event["event"] != "file" or not event.get("label"):
+                continue
+            cat = os.path.basename(os.path.dirname(event["dest"]))
+            if cat in totals:
+                totals[cat] += 1
+                if len(examples[cat]) < 10:  # Show first 10 as examples
+                    examples[cat].append(os.path.basename(event["dest"]))
         with open(report_path, "w") as f:
             f.write("IMAGE RENAMING REPORT\n")
             f.write(f"Generated: {datetime.now()}\n")
             f.write("=" * 80 + "\n\n")
             
             for cat in CATEGORIES:
-                cat_images = [p for p in self.processed if p["category"] == cat]
-                if cat_images:
-                    f.write(f"\n{CATEGORIES[cat]} ({len(cat_images)} images)\n")
+                if totals[cat]:
+                    f.write(f"\n{CATEGORIES[cat]} ({totals[cat]} images)\n")
                     f.write("-" * 40 + "\n")
-                    for img in cat_images[:10]:  # Show first 10 as examples
-                        f.write(f"  {img['new_name']}\n")
-                    if len(cat_images) > 10:
-                        f.write(f"  ... and {len(cat_images) - 10} more\n")
+                    for name in examples[cat]:
+                        f.write(f"  {name}\n")
+                    if totals[cat] > 10:
+                        f.write(f"  ... and {totals[cat] - 10} more\n")
             
-            f.write(f"\n\nTotal images processed: {len(self.processed)}\n")
+            f.write(f"\n\nTotal images processed: {sum(totals.values())}\n")
         
         print(f"\nReport saved to: {report_path}")
 
 def main():
     """Main execution"""
-    renamer = ImageRenamer()
+    parser = argparse.ArgumentParser(description="Rename event images with SEO-friendly filenames")
+    parser.add_argument("--source", default=SOURCE_DIR, help="folder of event photos")
+    parser.add_argument("--dest", default=DEST_BASE, help="output folder")
+    parser.add_argument("--mode", choices=["auto", "reflink", "link", "copy"], default="auto",
+                        help="how files are placed (default: reflink where supported, else copy)")
+    parser.add_argument("--workers", type=int, help="copy threads (default: 4 per core)")
+    parser.add_argument("--calendar", help="date→category JSON or exported what's-on events; UUID-named photos "
+                                           "are filed by the night they were taken (needs Pillow)")
+    parser.add_argument("--report", help="JSON-lines run report (default: runs/smart-rename-<time>.jsonl "
+                                         "in the output folder)")
+    args = parser.parse_args()
+
+    report_path = args.report or default_path(args.dest, "smart-rename")
+    report = RunReport(report_path, "smart-rename", source=args.source, dest=args.dest, mode=args.mode)
+    
+    # Get all images in source directory
+    with report.phase("scan"):
+        entries = scan_images(args.source)
     
-    # Get all files in source directory
-    files = os.listdir(SOURCE_DIR)
-    total = len([f for f in files if f.lower().endswith(('.jpeg', '.jpg', '.heic', '.png'))])
+    renamer = ImageRenamer(args.source, args.dest, mode=args.mode, workers=args.workers, report=report)
+    if args.calendar:
+        paths = [e.path for e in entries if uuid_stem(e.name)]
+        # Photos unchanged since the last run keep the night they were matched to then; only new ones are read
+        with report.phase("classify"):
+            renamer.shoots, reused = categorise_unknown(paths, load_calendar(args.calendar), renamer.manifest)
+        print(f"{len(renamer.shoots)} of {len(paths)} unnamed photos matched to an event night "
+              f"({reused} as last run)")
     
-    print(f"Found {total} images to process\n")
+    print(f"Found {len(entries)} images to process\n")
     
     # Process each file
-    for filename in sorted(files):
-        renamer.process_image(filename)
+    with report.phase("classify"):
+        for entry in entries:
+            renamer.process_image(entry.name)
+    renamer.copy_files()
     
     # Generate report
-    renamer.generate_report()
+    with report.phase("report"):
+        renamer.generate_report()
+    renamer.manifest.close()
+    report.close()
     
-    print(f"\n✅ Successfully processed {len(renamer.processed)} images!")
-    print(f"📁 Check {DEST_BASE} for your SEO-optimized images")
+    print("\n⏱  " + "\n".join(render(summarise(report_path))))
+    print(f"📄 Run report: {report_path}")
+    print(f"\n✅ Successfully processed {renamer.processed} images!")
+    print(f"📁 Check {args.dest} for your SEO-optimized images")
     print("\n🎯 Next steps:")
     print("1. Review the categorized images")
     print("2. Select the best from each category")
@@ -0,0 +1,112 @@
+"""NameIndex must hand every source the same output name run after run"""
+
+import os
+import shutil
+
+from image_ingest import Ingestor, Job, Manifest, NameIndex, file_digest
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def ingest(manifest, source, dest):
+    """Record a source as copied to dest, as Ingestor does after a copy"""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    shutil.copyfile(source, dest)
+    manifest.record(Job(source, dest, ""), os.stat(source), file_digest(source))
+
+
+def test_unowned_copy_of_the_same_photo_is_reclaimed(tmp_path):
+    out = str(tmp_path / "out")
+    source = write(str(tmp_path / "src" / "IMG_1.jpg"), b"same photo")
+    # On disk from an earlier run whose manifest was lost
+    write(os.path.join(out, "quiz-night.jpg"), b"same photo")
+
+    names = NameIndex(Manifest(str(tmp_path / "manifest.sqlite")))
+    assert names.claim(out, "quiz-night.jpg", source) == "quiz-night.jpg"
+
+
+def test_unowned_different_photo_gets_a_suffix(tmp_path):
+    out = str(tmp_path / "out")
+    source = write(str(tmp_path / "src" / "IMG_1.jpg"), b"new photo")
+    write(os.path.join(out, "quiz-night.jpg"), b"someone else's photo")
+
+    names = NameIndex(Manifest(str(tmp_path / "manifest.sqlite")))
+    name = names.claim(out, "quiz-night.jpg", source)
+    assert name != "quiz-night.jpg"
+    assert NameIndex.family(name) == "quiz-night.jpg"
+    # The suffix comes from the source's name, so it is the same next run
+    assert NameIndex(Manifest(str(tmp_path / "manifest.sqlite"))).claim(out, "quiz-night.jpg", source) == name
+
+
+def test_names_follow_sources_not_run_order(tmp_path):
+    out = str(tmp_path / "out")
+    path = str(tmp_path / "manifest.sqlite")
+    first = write(str(tmp_path / "src" / "a.jpg"), b"a")
+    second = write(str(tmp_path / "src" / "b.jpg"), b"b")
+    manifest = Manifest(path)
+    names = NameIndex(manifest)
+    for source in (first, second):
+        ingest(manifest, source, os.path.join(out, names.claim(out, "photo.jpg", source)))
+    manifest.save()
+    given = {source: manifest.rows[source][4] for source in (first, second)}
+
+    names = NameIndex(Manifest(path))
+    for source in (second, first):
+        assert os.path.join(out, names.claim(out, "photo.jpg", source)) == given[source]
+
+
+def test_full_copies_again_but_keeps_the_names(tmp_path):
+    out = str(tmp_path / "out")
+    path = str(tmp_path / "manifest.sqlite")
+    source = write(str(tmp_path / "src" / "a.jpg"), b"a")
+    other = write(str(tmp_path / "src" / "b.jpg"), b"b")
+    manifest = Manifest(path)
+    ingest(manifest, source, os.path.join(out, "photo.jpg"))
+    manifest.save()
+
+    full = Manifest(path, full=True)
+    job = Job(source, os.path.join(out, "photo.jpg"), "")
+    assert full.unchanged(job, os.stat(source)) is None
+    assert full.known_digest(source, os.stat(source)) is None
+    names = NameIndex(full)
+    # Another source asking first still can't take the name
+    assert names.claim(out, "photo.jpg", other) != "photo.jpg"
+    assert names.claim(out, "photo.jpg", source) == "photo.jpg"
+
+
+def test_each_run_reports_only_its_own_removals(tmp_path):
+    out = str(tmp_path / "out")
+    path = str(tmp_path / "manifest.sqlite")
+    first = write(str(tmp_path / "src" / "a.jpg"), b"a")
+    second = write(str(tmp_path / "src" / "b.jpg"), b"b")
+    ingestor = Ingestor(mode="copy", manifest=Manifest(path))
+    jobs = [Job(source, os.path.join(out, os.path.basename(source)), "") for source in (first, second)]
+    ingestor.run(jobs)
+
+    os.unlink(second)
+    ingestor.run(jobs[:1])
+    assert ingestor.removed == [os.path.join(out, "b.jpg")]
+    # A watch batch reuses the same Ingestor and must not report the removal again
+    ingestor.run(jobs[:1])
+    assert ingestor.removed == []
+
+
+def test_rotating_names_stay_with_their_sources(tmp_path):
+    out = str(tmp_path / "out")
+    path = str(tmp_path / "manifest.sqlite")
+    source = write(str(tmp_path / "src" / "b.jpg"), b"b")
+    manifest = Manifest(path)
+    ingest(manifest, source, os.path.join(out, NameIndex(manifest).claim(out, "bar-area.jpg", source)))
+    manifest.save()
+
+    # A photo sorting first now takes the first name in the list, and this one is offered another
+    names = NameIndex(Manifest(path))
+    assert names.claim(out, "pub-interior.jpg", str(tmp_path / "src" / "a.jpg")) == "pub-interior.jpg"
+    assert names.claim(out, "seating-area.jpg", source) == "bar-area.jpg"
+    # Converting to another format keeps the name and changes the extension
+    assert NameIndex(Manifest(path)).claim(out, "seating-area.webp", source) == "bar-area.webp"
@@ -0,0 +1,68 @@
+"""The interval index must pick the same promotion as getCurrentPromotion on every day"""
+
+import datetime
+import random
+
+from promotion_schedule import build_intervals, check_ranges, promotion_on
+
+
+def promo(id, start, end, active=True):
+    return {"id": id, "startDate": start, "endDate": end, "active": active}
+
+
+def schedule_for(promotions):
+    intervals = build_intervals(promotions)
+    return {"starts": [s for s, _, _ in intervals], "ends": [e for _, e, _ in intervals],
+            "ids": [i for _, _, i in intervals]}
+
+
+def current(promotions, day):
+    """getCurrentPromotion: the covering active promotion with the latest start, the later entry on a tie"""
+    best = None
+    for p in promotions:
+        if p["active"] and p["startDate"] <= day <= p["endDate"]:
+            if best is None or p["startDate"] >= best["startDate"]:
+                best = p
+    return best and best["id"]
+
+
+def days(first, last):
+    day = datetime.date.fromisoformat(first)
+    while day <= datetime.date.fromisoformat(last):
+        yield day.isoformat()
+        day += datetime.timedelta(days=1)
+
+
+def test_later_start_owns_the_overlap():
+    promotions = [promo("march", "2026-03-01", "2026-03-31"), promo("easter", "2026-03-20", "2026-04-06"),
+                  promo("april", "2026-04-01", "2026-04-30"), promo("off", "2026-04-10", "2026-04-12", False)]
+    assert build_intervals(promotions) == [
+        ("2026-03-01", "2026-03-19", "march"),
+        ("2026-03-20", "2026-03-31", "easter"),
+        ("2026-04-01", "2026-04-30", "april"),
+    ]
+
+
+def test_gaps_and_overlaps():
+    promotions = [promo("a", "2026-01-01", "2026-01-10"), promo("b", "2026-01-05", "2026-01-12"),
+                  promo("c", "2026-01-20", "2026-01-31")]
+    overlaps, gaps = check_ranges(promotions)
+    assert [(x["id"], y["id"]) for x, y in overlaps] == [("a", "b")]
+    assert [(x["id"], y["id"], str(first), str(last)) for x, y, first, last in gaps] == \
+        [("b", "c", "2026-01-13", "2026-01-19")]
+    schedule = schedule_for(promotions)
+    assert promotion_on(schedule, "2026-01-15") is None
+    assert promotion_on(schedule, "2025-12-31") is None
+
+
+def test_lookup_matches_scanning_every_promotion():
+    shuffler = random.Random(5)
+    start = datetime.date(2026, 1, 1)
+    promotions = []
+    for n in range(60):
+        first = start + datetime.timedelta(days=shuffler.randrange(300))
+        last = first + datetime.timedelta(days=shuffler.randrange(40))
+        promotions.append(promo(f"p{n}", first.isoformat(), last.isoformat(), shuffler.random() > 0.1))
+    schedule = schedule_for(promotions)
+    for day in days("2025-12-25", "2027-01-15"):
+        assert promotion_on(schedule, day) == current(promotions, day), day
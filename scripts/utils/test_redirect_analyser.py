@@ -0,0 +1,29 @@
+"""A flattened chain must answer with a status every hop agrees with"""
+
+from check_redirects import Redirect
+from redirect_analyser import flatten
+
+
+def rules(*hops):
+    return [Redirect(source, destination, status in (301, 308), status, "test", i)
+            for i, (source, destination, status) in enumerate(hops)]
+
+
+def entry_for(entries, source):
+    return next(entry for entry in entries if entry["source"] == source)
+
+
+def test_temporary_hop_keeps_the_chain_temporary():
+    entries, _ = flatten(rules(("/a", "/b", 308), ("/b", "/c", 307), ("/x/:slug", "/a", 308)))
+    assert entry_for(entries, "/a") == {"source": "/a", "destination": "/c", "permanent": False}
+    assert entry_for(entries, "/x/:slug") == {"source": "/x/:slug", "destination": "/c", "permanent": False}
+
+
+def test_permanent_chain_of_mixed_codes_is_permanent():
+    entries, _ = flatten(rules(("/a", "/b", 301), ("/b", "/c", 308)))
+    assert entry_for(entries, "/a") == {"source": "/a", "destination": "/c", "permanent": True}
+
+
+def test_chain_sharing_one_code_keeps_it():
+    entries, _ = flatten(rules(("/a", "/b", 302), ("/b", "/c", 302)))
+    assert entry_for(entries, "/a") == {"source": "/a", "destination": "/c", "statusCode": 302}
@@ -0,0 +1,31 @@
+"""verify checks the artifact against a replay of the rules, not against the flattening it was built from"""
+
+from unittest import mock
+
+from check_redirects import Redirect
+from redirect_compiler import compile_rules, verify
+
+
+def rules(*hops):
+    return [Redirect(source, destination, status in (301, 308), status, "test", i)
+            for i, (source, destination, status) in enumerate(hops)]
+
+
+CHAIN = rules(("/a", "/b", 308), ("/b", "/c", 307), ("/post/:slug", "/blog/:slug", 308), ("/blog/old", "/blog/new", 308))
+
+
+def test_compiled_chain_matches_the_replay():
+    artifact, _ = compile_rules(CHAIN)
+    assert artifact["literals"]["/a"] == ["/c", 307]
+    assert verify(artifact, CHAIN) == []
+
+
+def test_flattening_bug_is_caught():
+    # A flatten that forgot to collapse chains would agree with itself
+    def one_hop(served):
+        return [{"source": r.source, "destination": r.destination, "permanent": r.permanent} for r in served], []
+
+    with mock.patch("redirect_compiler.flatten", one_hop):
+        artifact, _ = compile_rules(CHAIN)
+        mismatches = verify(artifact, CHAIN, ["/a", "/b", "/post/old", "/post/other"])
+    assert [url for url, _, _ in mismatches] == ["/a", "/post/old"]
@@ -0,0 +1,48 @@
+"""Chains and loops found by the Tarjan pass, checked against walking each chain by hand"""
+
+from check_redirects import Redirect
+from redirect_graph import RedirectGraph
+
+
+def graph(*edges):
+    return RedirectGraph([Redirect(source, destination, True, 308, "test", i)
+                          for i, (source, destination) in enumerate(edges)])
+
+
+def walk(edges, source):
+    """(final, hops) by following edges one at a time; final is None on a loop"""
+    seen = [source]
+    node = source
+    while node in edges:
+        node = edges[node]
+        if node in seen:
+            return None, None
+        seen.append(node)
+    return node, len(seen) - 1
+
+
+def test_chain_resolves_to_its_end():
+    g = graph(("/a", "/b"), ("/b", "/c"), ("/c", "/d"))
+    resolved = g.resolve("/a")
+    assert (resolved.final, resolved.hops, resolved.path) == ("/d", 3, ["/a", "/b", "/c", "/d"])
+    assert {r.source for r in g.chains()} == {"/a", "/b"}
+
+
+def test_loops_and_what_feeds_them():
+    g = graph(("/a", "/b"), ("/b", "/c"), ("/c", "/a"), ("/in", "/a"), ("/self", "/self"), ("/ok", "/x"))
+    assert {r.source for r in g.loops()} == {"/a", "/b", "/c", "/in", "/self"}
+    assert sorted(sorted(cycle) for cycle in g.cycles) == [["/a", "/b", "/c"], ["/self"]]
+    assert g.resolve("/ok").final == "/x"
+
+
+def test_first_rule_wins():
+    g = graph(("/a", "/b"), ("/a", "/c"))
+    assert g.resolve("/a").final == "/b"
+
+
+def test_matches_walking_every_chain():
+    edges = {f"/{i}": f"/{(i * 7 + 3) % 40}" for i in range(0, 60, 2)}
+    g = graph(*edges.items())
+    for source in edges:
+        resolved = g.resolve(source)
+        assert (resolved.final, resolved.hops) == walk(edges, source), source
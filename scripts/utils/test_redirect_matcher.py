@@ -0,0 +1,80 @@
+"""The segment trie must answer exactly like the path-to-regexp fallback it replaces"""
+
+import random
+
+from check_redirects import Redirect
+from redirect_matcher import RedirectMatcher, compile_source, is_literal
+
+
+class RegexOnly(RedirectMatcher):
+    """Every rule through the regex fallback, as before the trie existed"""
+
+    def _plan(self, source):
+        return None
+
+
+SOURCES = [
+    "/menu",
+    "/Menu/Drinks",
+    "/blog/:slug",
+    "/blog/:slug/amp",
+    "/events/:id?",
+    "/docs/:path*",
+    "/shop/:rest+",
+    "/a/:b/c/:d",
+    "/a/fixed/:x",
+    "/old-:slug",
+    "/files/(.*)",
+    "/events/:id/tickets/:rest*",
+]
+
+DESTINATIONS = {
+    "/events/:id?": "/whats-on/:id",
+    "/docs/:path*": "/help/:path*",
+    "/shop/:rest+": "/store/:rest+?from=shop",
+    "/old-:slug": "/new/:slug",
+}
+
+PATHS = [
+    "", "/", "/menu", "/MENU", "/menu/", "/menu/drinks", "/blog", "/blog/", "/blog/hello", "/blog/Hello/amp",
+    "/blog/hello/other", "/events", "/events/", "/events/42", "/events/42/tickets", "/events/42/tickets/a/b",
+    "/docs", "/docs/", "/docs/a", "/docs/a/b/c", "/docs//a", "/shop", "/shop/x", "/shop/x/y", "/a/1/c/2",
+    "/a/fixed/c/2", "/a/fixed/x", "/old-page", "/old-", "/files/x/y", "/unknown",
+]
+
+
+def rules_in(order):
+    return [Redirect(source, DESTINATIONS.get(source, "/to" + source.replace(":", "_")), True, 308, "test", i)
+            for i, source in enumerate(order)]
+
+
+def test_every_rule_kind_takes_the_trie_or_falls_back():
+    matcher = RedirectMatcher(rules_in(SOURCES))
+    fallback = {rule.source for _, rule, _, _ in matcher.fallback}
+    assert fallback == {"/old-:slug", "/files/(.*)"}
+    assert not any(is_literal(source) for source in fallback)
+
+
+def test_trie_agrees_with_regex_fallback():
+    urls = PATHS + [path + "?utm_source=x" for path in PATHS] + ["https://www.the-anchor.pub/blog/x"]
+    # Rule order decides the winner, so try the rules in several orders
+    shuffler = random.Random(2)
+    for _ in range(50):
+        order = shuffler.sample(SOURCES, len(SOURCES))
+        rules = rules_in(order)
+        trie, regex = RedirectMatcher(rules), RegexOnly(rules)
+        for url in urls:
+            assert trie.match(url) == regex.match(url), (url, order)
+
+
+def test_missing_optional_parameter_is_empty():
+    found = RedirectMatcher(rules_in(SOURCES)).match("/events")
+    assert found.params == {"id": ""}
+    assert found.destination == "/whats-on"
+
+
+def test_regex_fallback_is_case_insensitive_and_strict():
+    regex, keys = compile_source("/blog/:slug")
+    assert keys == [("slug", "")]
+    assert regex.match("/BLOG/post")
+    assert not regex.match("/blog/post/")
@@ -0,0 +1,48 @@
+"""Adding a photo must not rename or delete the outputs of the photos already ingested"""
+
+import importlib.util
+import os
+
+spec = importlib.util.spec_from_file_location(
+    "rename_all_images", os.path.join(os.path.dirname(__file__), "rename-all-images.py"))
+rename_all_images = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(rename_all_images)
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def run(source, dest):
+    rename_all_images.CompleteImageRenamer(source, dest, mode="copy",
+                                           report_path=os.path.join(dest, "report.jsonl")).run()
+
+
+def outputs(dest):
+    """{output name: content} in the venue folder"""
+    folder = os.path.join(dest, "venue", "interior")
+    result = {}
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), "rb") as f:
+            result[name] = f.read()
+    return result
+
+
+def test_venue_photo_sorting_first_leaves_the_others_alone(tmp_path):
+    source = str(tmp_path / "src")
+    dest = str(tmp_path / "out")
+    write(os.path.join(source, "venue", "IMG_2.jpg"), b"bar")
+    write(os.path.join(source, "venue", "IMG_3.jpg"), b"seating")
+    run(source, dest)
+    before = outputs(dest)
+
+    write(os.path.join(source, "venue", "IMG_1.jpg"), b"new")
+    run(source, dest)
+    after = outputs(dest)
+
+    assert {name: after[name] for name in before} == before
+    # The new photo gets a name nobody holds rather than a hash-suffixed copy of one
+    assert len(after) == 3
+    assert {os.path.splitext(name)[0] for name in after} <= set(rename_all_images.VENUE_NAMES)
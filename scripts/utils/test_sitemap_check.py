@@ -0,0 +1,24 @@
+"""Writing the corrected sitemap over the one being checked"""
+
+import shutil
+
+import sitemap_check
+
+
+def test_write_in_place_matches_writing_elsewhere(tmp_path):
+    # Pad the sitemap past the parser's read buffer so it is still reading when the output is opened
+    with open(sitemap_check.SITEMAP_PATH, encoding="utf-8") as f:
+        original = f.read()
+    padding = "".join(f"  <url>\n    <loc>https://www.the-anchor.pub/padding-{i}</loc>\n  </url>\n"
+                      for i in range(1000))
+    sitemap = tmp_path / "sitemap.xml"
+    sitemap.write_text(original.replace("</urlset>", padding + "</urlset>"), encoding="utf-8")
+    elsewhere = tmp_path / "elsewhere.xml"
+    shutil.copy(sitemap, tmp_path / "copy.xml")
+
+    sitemap_check.main(["--sitemap", str(tmp_path / "copy.xml"), "--write", str(elsewhere)])
+    sitemap_check.main(["--sitemap", str(sitemap), "--write", str(sitemap)])
+
+    assert sitemap.read_text(encoding="utf-8") == elsewhere.read_text(encoding="utf-8")
+    assert "<loc>https://www.the-anchor.pub/</loc>" in sitemap.read_text(encoding="utf-8")
+    assert not (tmp_path / "sitemap.xml.part").exists()
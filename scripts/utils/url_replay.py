@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+URL Replay for The Anchor Pub
+Streams a crawl, GSC or access-log export through every redirect the site
+applies (vercel.json apex rule, Next.js trailing slash and redirect rules,
+then middleware.ts) and reports where each URL finally lands
+"""
+
+import csv
+import json
+import os
+import re
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from redirect_matcher import CACHE_SIZE, RedirectMatcher
+
+CANONICAL_HOST = "www.the-anchor.pub"
+APEX_HOST = "the-anchor.pub"
+ORIGIN = f"https://{CANONICAL_HOST}"
+
+# Give up after this many hops, like browsers do
+MAX_HOPS = 10
+
+# Lines handed to each worker at a time
+CHUNK_SIZE = 2000
+
+# Column headers used by GSC, Screaming Frog and sitemap exports
+URL_COLUMNS = {"url", "urls", "address", "page", "top pages", "loc", "landing page"}
+
+REQUEST_LINE = re.compile(r'"(?:GET|HEAD|POST) (\S+) HTTP/[\d.]+"')
+SITEMAP_LOC = re.compile(r"<loc>\s*([^<\s]+)\s*</loc>")
+TRACKING_PARAMS_BLOCK = re.compile(r"const TRACKING_PARAMS = \[(.*?)\]", re.S)
+
+Step = namedtuple("Step", "status_code url reason")
+Replay = namedtuple("Replay", "url status hops final steps")
+
+
+def load_tracking_params(root):
+    """Read TRACKING_PARAMS straight from middleware.ts so the two never drift"""
+    with open(os.path.join(root, "middleware.ts"), "r") as f:
+        block = TRACKING_PARAMS_BLOCK.search(f.read())
+    if not block:
+        raise ValueError("TRACKING_PARAMS not found in middleware.ts")
+    return frozenset(re.findall(r"'([^']+)'", block.group(1)))
+
+
+def display(url):
+    """Shorten canonical URLs to their path for compact output"""
+    if url.startswith(ORIGIN + "/"):
+        return url[len(ORIGIN):]
+    return url
+
+
+def strip_tracking(path, query, tracking_params):
+    """The query middleware.ts leaves once tracking parameters are dropped, or None if it leaves it alone"""
+    pairs = parse_qsl(query, keep_blank_values=True)
+    kept = [(k, v) for k, v in pairs if k not in tracking_params]
+    if path == "/blog" and ("page", "1") in kept:
+        kept = [(k, v) for k, v in kept if (k, v) != ("page", "1")]
+    if len(kept) == len(pairs):
+        return None
+    return urlencode(kept)
+
+
+class Resolver:
+    """Follows a URL hop by hop through the site's redirect layers"""
+
+    def __init__(self, rules, tracking_params, cache_size=CACHE_SIZE):
+        self.matcher = RedirectMatcher(rules, cache_size)
+        self.tracking_params = tracking_params
+        # Access logs repeat the same URLs constantly; keep a bounded cache (0 turns it off)
+        self._cache = {}
+        self.cache_size = cache_size
+
+    def step(self, url):
+        """The single redirect the site would answer url with, or None"""
+        parts = urlsplit(url)
+        host = parts.hostname
+        if host not in (CANONICAL_HOST, APEX_HOST):
+            return None
+
+        # vercel.json sends the apex domain to www before Next.js runs
+        if host == APEX_HOST:
+            return Step(308, urlunsplit(("https", CANONICAL_HOST, parts.path, parts.query, "")), "apex")
+
+        # trailingSlash is off, so Next.js strips it before custom redirects
+        path = parts.path or "/"
+        if path != "/" and path.endswith("/"):
+            return Step(308, urlunsplit((parts.scheme, host, path.rstrip("/") or "/", parts.query, "")), "trailing-slash")
+
+        match = self.matcher.match(path + ("?" + parts.query if parts.query else ""))
+        if match is not None:
+            destination = match.destination
+            if destination.startswith("/"):
+                destination = f"{parts.scheme}://{host}{destination}"
+            return Step(match.rule.status_code, destination, f"{match.rule.file}#{match.rule.source}")
+
+        # middleware.ts: force HTTPS, then strip tracking parameters
+        if parts.scheme == "http":
+            return Step(301, urlunsplit(("https", CANONICAL_HOST, path, parts.query, "")), "https")
+
+        if parts.query:
+            kept = strip_tracking(path, parts.query, self.tracking_params)
+            if kept is not None:
+                return Step(301, urlunsplit((parts.scheme, host, path, kept, "")), "tracking-params")
+        return None
+
+    def resolve(self, url):
+        """Follow url to where it settles"""
+        cached = self._cache.get(url)
+        if cached is None:
+            cached = self._resolve(url)
+            if self.cache_size:
+                if len(self._cache) >= self.cache_size:
+                    self._cache.clear()
+                self._cache[url] = cached
+        return cached
+
+    def _resolve(self, url):
+        if url.startswith("/"):
+            url = ORIGIN + url
+        elif "://" not in url:
+            url = "https://" + url
+
+        steps = []
+        seen = {url}
+        current = url
+        status = "ok"
+        while True:
+            step = self.step(current)
+            if step is None:
+                break
+            steps.append(step)
+            current = step.url
+            if current in seen:
+                status = "loop"
+                break
+            seen.add(current)
+            if urlsplit(current).hostname not in (CANONICAL_HOST, APEX_HOST):
+                status = "external"
+                break
+            if len(steps) >= MAX_HOPS:
+                status = "too-many-hops"
+                break
+
+        if status == "ok" and steps:
+            status = "redirect" if len(steps) == 1 else "chain"
+        return Replay(url, status, len(steps), current, steps)
+
+
+def detect_format(path):
+    """Guess the export format from the file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".ndjson", ".jsonl"):
+        return "ndjson"
+    if extension in (".csv", ".tsv"):
+        return "csv"
+    if extension == ".xml":
+        return "sitemap"
+    return "lines"
+
+
+def iter_urls(stream, fmt):
+    """Yield one URL per record without reading the whole export into memory"""
+    if fmt == "csv":
+        reader = csv.reader(stream)
+        column = 0
+        for row in reader:
+            if not row:
+                continue
+            headers = [cell.strip().lower() for cell in row]
+            named = [i for i, header in enumerate(headers) if header in URL_COLUMNS]
+            if named:
+                column = named[0]
+                break
+            # No header row: the first row is already data
+            if len(row) > column:
+                yield row[column].strip()
+            break
+        for row in reader:
+            if len(row) > column and row[column].strip():
+                yield row[column].strip()
+        return
+
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        if fmt == "ndjson":
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict):
+                record = record.get("url") or record.get("loc") or record.get("page")
+            if isinstance(record, str):
+                yield record
+        elif fmt == "sitemap":
+            yield from SITEMAP_LOC.findall(line)
+        else:
+            request = REQUEST_LINE.search(line)
+            yield request.group(1) if request else line.split()[0]
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+_resolver = None
+
+
+def _init_worker(rules, tracking_params):
+    global _resolver
+    _resolver = Resolver(rules, tracking_params)
+
+
+def _resolve_chunk(urls):
+    # Steps stay in the worker; only the compact result crosses the process boundary
+    return [_resolver.resolve(url)._replace(steps=None) for url in urls]
+
+
+def replay(urls, rules, tracking_params, workers=None, chunk_size=CHUNK_SIZE):
+    """Resolve a stream of URLs in order, across a process pool when workers > 1
+
+    At most two chunks per worker are in flight, so memory stays flat no
+    matter how long the input is.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        resolver = Resolver(rules, tracking_params)
+        for url in urls:
+            yield resolver.resolve(url)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(rules, tracking_params)) as pool:
+        pending = deque()
+        for chunk in chunked(urls, chunk_size):
+            pending.append(pool.submit(_resolve_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def summarise(results, out):
+    """Write one compact line per URL and return aggregate counts"""
+    counts = Counter()
+    hops = Counter()
+    for result in results:
+        counts[result.status] += 1
+        hops[result.hops] += 1
+        out.write(f"{result.status}\t{result.hops}\t{display(result.url)}\t{display(result.final)}\n")
+    return counts, hops